@@ -13,8 +13,16 @@ CREATE OR REPLACE TABLE your_dataset.repo_analysis (
     language STRING OPTIONS(description="The programming language of the file."),
     overall_compliance_score INT64 OPTIONS(description="An integer score from 0-100, sourced from the evaluation_data, representing the code's overall compliance."),
     evaluation_data JSON OPTIONS(description="A JSON object containing the results of the code evaluation."),
+    criteria_breakdown ARRAY<STRUCT<
+        criterion_name STRING,
+        score INT64,
+        weight FLOAT64,
+        assessment STRING
+    >> OPTIONS(description="The criteria_breakdown from evaluation_data as typed columns, written alongside the JSON."),
     region_tags ARRAY<STRING> OPTIONS(description="An array of region tags extracted from the code."),
-    raw_code STRING OPTIONS(description="The complete raw source code of the file."),
+    region_hash STRING OPTIONS(description="For region-level rows (--by-region), the SHA-256 of the region body. NULL for whole-file rows."),
+    raw_code STRING OPTIONS(description="The complete raw source code of the file. NULL when stored by hash in repo_analysis_raw_code."),
+    raw_code_hash STRING OPTIONS(description="With CONTENT_ADDRESSED_BLOBS, the SHA-256 of raw_code, keying repo_analysis_raw_code."),
 
     -- Timestamps and Versioning
     evaluation_date TIMESTAMP OPTIONS(description="The timestamp when the analysis was performed."),
@@ -22,6 +30,36 @@ CREATE OR REPLACE TABLE your_dataset.repo_analysis (
     branch_name STRING OPTIONS(description="The name of the git branch."),
     
     -- Commit History and File Metadata
-    commit_history JSON OPTIONS(description="A JSON array of the file's commit history."),
-    metadata JSON OPTIONS(description="A JSON object containing file metadata (size, created, modified).")
-);
+    commit_history JSON OPTIONS(description="A JSON array of the file's commit history. NULL when stored by hash in repo_analysis_commit_history."),
+    commit_history_hash STRING OPTIONS(description="With CONTENT_ADDRESSED_BLOBS, the SHA-256 of commit_history, keying repo_analysis_commit_history."),
+    metadata JSON OPTIONS(description="A JSON object containing file metadata (size, created, modified)."),
+
+    -- Validation
+    validation_details JSON OPTIONS(description="A JSON object containing the results of the evaluation validation step."),
+    Generated BOOL OPTIONS(description="Whether the sample was produced by the code generation pipeline."),
+    is_deleted BOOL OPTIONS(description="TRUE for a tombstone written by --delta when the file was deleted from the repository. The tombstone becomes the file's latest row.")
+)
+-- Queries always filter on github_link and usually on evaluation_date, so
+-- partitioning and clustering let BigQuery scan only the relevant blocks.
+-- Existing unpartitioned tables can be migrated with `main.py --migrate-schema`.
+PARTITION BY DATE(evaluation_date)
+CLUSTER BY github_link, github_repo;
+
+
+-- Side tables holding each distinct raw_code and commit_history once, keyed by
+-- the SHA-256 stored in the main table's *_hash columns. Only written when
+-- CONTENT_ADDRESSED_BLOBS is enabled; repo_analysis_full (see create_view.sql)
+-- joins them back for readers that expect the inline columns.
+CREATE TABLE IF NOT EXISTS your_dataset.repo_analysis_raw_code (
+    content_hash STRING NOT NULL OPTIONS(description="SHA-256 of raw_code."),
+    raw_code STRING OPTIONS(description="The raw source code."),
+    stored_at TIMESTAMP OPTIONS(description="When the content was first stored.")
+)
+CLUSTER BY content_hash;
+
+CREATE TABLE IF NOT EXISTS your_dataset.repo_analysis_commit_history (
+    content_hash STRING NOT NULL OPTIONS(description="SHA-256 of commit_history."),
+    commit_history JSON OPTIONS(description="A JSON array of a file's commit history."),
+    stored_at TIMESTAMP OPTIONS(description="When the content was first stored.")
+)
+CLUSTER BY content_hash;
@@ -1,11 +1,36 @@
+CREATE OR REPLACE VIEW `panoply-ai-dev.Samples_Health.repo_analysis_full` AS
+-- The repo_analysis history with raw_code and commit_history filled in from the
+-- content-addressed side tables, for rows written with CONTENT_ADDRESSED_BLOBS.
+-- Has the same columns as the table, so existing queries can switch to it
+-- unchanged. The side tables are grouped by hash so a blob stored twice by
+-- racing writers cannot duplicate history rows.
+SELECT
+    t.* REPLACE (
+        COALESCE(t.raw_code, rc.raw_code) AS raw_code,
+        COALESCE(t.commit_history, ch.commit_history) AS commit_history
+    )
+FROM
+    `panoply-ai-dev.Samples_Health.repo_analysis` AS t
+LEFT JOIN (
+    SELECT content_hash, ANY_VALUE(raw_code) AS raw_code
+    FROM `panoply-ai-dev.Samples_Health.repo_analysis_raw_code`
+    GROUP BY content_hash
+) AS rc
+    ON rc.content_hash = t.raw_code_hash
+LEFT JOIN (
+    SELECT content_hash, ANY_VALUE(commit_history) AS commit_history
+    FROM `panoply-ai-dev.Samples_Health.repo_analysis_commit_history`
+    GROUP BY content_hash
+) AS ch
+    ON ch.content_hash = t.commit_history_hash;
+
+
+
+
 CREATE OR REPLACE VIEW `panoply-ai-dev.Samples_Health.repo_analysis_view` AS
-WITH RankedAnalysis AS (
-    SELECT
-        *,
-        ROW_NUMBER() OVER(PARTITION BY github_link ORDER BY evaluation_date DESC) as rn
-    FROM
-        `panoply-ai-dev.Samples_Health.repo_analysis`
-)
+-- Reads the repo_analysis_latest snapshot, which main.py MERGEs the newest
+-- evaluation of each github_link into at the end of every run, instead of
+-- windowing over the full history table.
 SELECT
     -- Direct columns from the new table
     t.region_tags,
@@ -14,9 +39,9 @@ SELECT
     t.product_name,
     t.product_category,
     t.github_link,
-    t.commit_history AS git_info_raw_json, -- Renaming for consistency with old view
+    COALESCE(t.commit_history, ch.commit_history) AS git_info_raw_json, -- Renaming for consistency with old view
     t.evaluation_data AS evaluation_data_raw_json, -- Renaming for consistency
-    t.raw_code,
+    COALESCE(t.raw_code, rc.raw_code) AS raw_code,
     t.overall_compliance_score,
     t.language AS sample_language,
     t.validation_details,
@@ -25,97 +50,108 @@ SELECT
     -- Extract identified generic problem categories from the JSON
     JSON_EXTRACT_ARRAY(t.evaluation_data, '$.identified_generic_problem_categories') AS identified_generic_problem_categories,
 
-    -- Unnest and extract scores & assessments for each criterion from the JSON
+    -- Scores & assessments for each criterion, read from the typed criteria_breakdown
+    -- column written by the tool (run `main.py --migrate-schema` to backfill old rows)
     -- Runnability & Configuration
     (
-        SELECT CAST(JSON_EXTRACT_SCALAR(criterion, '$.score') AS INT64)
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'runnability_and_configuration'
+        SELECT criterion.score
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'runnability_and_configuration'
     ) AS runnability_and_configuration_score,
     (
-        SELECT JSON_EXTRACT_SCALAR(criterion, '$.assessment')
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'runnability_and_configuration'
+        SELECT criterion.assessment
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'runnability_and_configuration'
     ) AS runnability_and_configuration_assessment,
 
     -- API Effectiveness & Correctness
     (
-        SELECT CAST(JSON_EXTRACT_SCALAR(criterion, '$.score') AS INT64)
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'api_effectiveness_and_correctness'
+        SELECT criterion.score
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'api_effectiveness_and_correctness'
     ) AS api_effectiveness_and_correctness_score,
     (
-        SELECT JSON_EXTRACT_SCALAR(criterion, '$.assessment')
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'api_effectiveness_and_correctness'
+        SELECT criterion.assessment
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'api_effectiveness_and_correctness'
     ) AS api_effectiveness_and_correctness_assessment,
 
     -- Comments & Code Clarity
     (
-        SELECT CAST(JSON_EXTRACT_SCALAR(criterion, '$.score') AS INT64)
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'comments_and_code_clarity'
+        SELECT criterion.score
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'comments_and_code_clarity'
     ) AS comments_and_code_clarity_score,
     (
-        SELECT JSON_EXTRACT_SCALAR(criterion, '$.assessment')
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'comments_and_code_clarity'
+        SELECT criterion.assessment
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'comments_and_code_clarity'
     ) AS comments_and_code_clarity_assessment,
 
     -- Formatting & Consistency
     (
-        SELECT CAST(JSON_EXTRACT_SCALAR(criterion, '$.score') AS INT64)
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'formatting_and_consistency'
+        SELECT criterion.score
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'formatting_and_consistency'
     ) AS formatting_and_consistency_score,
     (
-        SELECT JSON_EXTRACT_SCALAR(criterion, '$.assessment')
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'formatting_and_consistency'
+        SELECT criterion.assessment
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'formatting_and_consistency'
     ) AS formatting_and_consistency_assessment,
 
     -- Language Best Practices
     (
-        SELECT CAST(JSON_EXTRACT_SCALAR(criterion, '$.score') AS INT64)
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'language_best_practices'
+        SELECT criterion.score
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'language_best_practices'
     ) AS language_best_practices_score,
     (
-        SELECT JSON_EXTRACT_SCALAR(criterion, '$.assessment')
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'language_best_practices'
+        SELECT criterion.assessment
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'language_best_practices'
     ) AS language_best_practices_assessment,
 
     -- LLM Training Fitness & Explicitness
     (
-        SELECT CAST(JSON_EXTRACT_SCALAR(criterion, '$.score') AS INT64)
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'llm_training_fitness_and_explicitness'
+        SELECT criterion.score
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'llm_training_fitness_and_explicitness'
     ) AS llm_training_fitness_and_explicitness_score,
     (
-        SELECT JSON_EXTRACT_SCALAR(criterion, '$.assessment')
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'llm_training_fitness_and_explicitness'
+        SELECT criterion.assessment
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'llm_training_fitness_and_explicitness'
     ) AS llm_training_fitness_and_explicitness_assessment
 FROM
-    RankedAnalysis AS t
+    `panoply-ai-dev.Samples_Health.repo_analysis_latest` AS t
+-- Rows written with CONTENT_ADDRESSED_BLOBS keep only the hashes inline; the
+-- side tables are grouped by hash so a duplicated blob adds no rows.
+LEFT JOIN (
+    SELECT content_hash, ANY_VALUE(raw_code) AS raw_code
+    FROM `panoply-ai-dev.Samples_Health.repo_analysis_raw_code`
+    GROUP BY content_hash
+) AS rc
+    ON rc.content_hash = t.raw_code_hash
+LEFT JOIN (
+    SELECT content_hash, ANY_VALUE(commit_history) AS commit_history
+    FROM `panoply-ai-dev.Samples_Health.repo_analysis_commit_history`
+    GROUP BY content_hash
+) AS ch
+    ON ch.content_hash = t.commit_history_hash
 WHERE
-    t.rn = 1
-    AND t.region_tags IS NOT NULL
+    t.region_tags IS NOT NULL
     AND ARRAY_LENGTH(t.region_tags) > 0
-    AND t.Generated IS NOT TRUE;
+    AND t.Generated IS NOT TRUE
+    AND t.is_deleted IS NOT TRUE;
 
 
 
 
 CREATE OR REPLACE VIEW `panoply-ai-dev.Samples_Health.repo_analysis_view_gen` AS
-WITH RankedAnalysis AS (
-    SELECT
-        *,
-        ROW_NUMBER() OVER(PARTITION BY github_link ORDER BY evaluation_date DESC) as rn
-    FROM
-        `panoply-ai-dev.Samples_Health.repo_analysis`
-)
+-- Reads the repo_analysis_latest snapshot, which main.py MERGEs the newest
+-- evaluation of each github_link into at the end of every run, instead of
+-- windowing over the full history table.
 SELECT
     -- Direct columns from the new table
     t.region_tags,
@@ -124,9 +160,9 @@ SELECT
     t.product_name,
     t.product_category,
     t.github_link,
-    t.commit_history AS git_info_raw_json, -- Renaming for consistency with old view
+    COALESCE(t.commit_history, ch.commit_history) AS git_info_raw_json, -- Renaming for consistency with old view
     t.evaluation_data AS evaluation_data_raw_json, -- Renaming for consistency
-    t.raw_code,
+    COALESCE(t.raw_code, rc.raw_code) AS raw_code,
     t.overall_compliance_score,
     t.language AS sample_language,
     t.validation_details,
@@ -135,82 +171,97 @@ SELECT
     -- Extract identified generic problem categories from the JSON
     JSON_EXTRACT_ARRAY(t.evaluation_data, '$.identified_generic_problem_categories') AS identified_generic_problem_categories,
 
-    -- Unnest and extract scores & assessments for each criterion from the JSON
+    -- Scores & assessments for each criterion, read from the typed criteria_breakdown
+    -- column written by the tool (run `main.py --migrate-schema` to backfill old rows)
     -- Runnability & Configuration
     (
-        SELECT CAST(JSON_EXTRACT_SCALAR(criterion, '$.score') AS INT64)
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'runnability_and_configuration'
+        SELECT criterion.score
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'runnability_and_configuration'
     ) AS runnability_and_configuration_score,
     (
-        SELECT JSON_EXTRACT_SCALAR(criterion, '$.assessment')
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'runnability_and_configuration'
+        SELECT criterion.assessment
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'runnability_and_configuration'
     ) AS runnability_and_configuration_assessment,
 
     -- API Effectiveness & Correctness
     (
-        SELECT CAST(JSON_EXTRACT_SCALAR(criterion, '$.score') AS INT64)
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'api_effectiveness_and_correctness'
+        SELECT criterion.score
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'api_effectiveness_and_correctness'
     ) AS api_effectiveness_and_correctness_score,
     (
-        SELECT JSON_EXTRACT_SCALAR(criterion, '$.assessment')
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'api_effectiveness_and_correctness'
+        SELECT criterion.assessment
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'api_effectiveness_and_correctness'
     ) AS api_effectiveness_and_correctness_assessment,
 
     -- Comments & Code Clarity
     (
-        SELECT CAST(JSON_EXTRACT_SCALAR(criterion, '$.score') AS INT64)
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'comments_and_code_clarity'
+        SELECT criterion.score
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'comments_and_code_clarity'
     ) AS comments_and_code_clarity_score,
     (
-        SELECT JSON_EXTRACT_SCALAR(criterion, '$.assessment')
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'comments_and_code_clarity'
+        SELECT criterion.assessment
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'comments_and_code_clarity'
     ) AS comments_and_code_clarity_assessment,
 
     -- Formatting & Consistency
     (
-        SELECT CAST(JSON_EXTRACT_SCALAR(criterion, '$.score') AS INT64)
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'formatting_and_consistency'
+        SELECT criterion.score
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'formatting_and_consistency'
     ) AS formatting_and_consistency_score,
     (
-        SELECT JSON_EXTRACT_SCALAR(criterion, '$.assessment')
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'formatting_and_consistency'
+        SELECT criterion.assessment
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'formatting_and_consistency'
     ) AS formatting_and_consistency_assessment,
 
     -- Language Best Practices
     (
-        SELECT CAST(JSON_EXTRACT_SCALAR(criterion, '$.score') AS INT64)
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'language_best_practices'
+        SELECT criterion.score
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'language_best_practices'
     ) AS language_best_practices_score,
     (
-        SELECT JSON_EXTRACT_SCALAR(criterion, '$.assessment')
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'language_best_practices'
+        SELECT criterion.assessment
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'language_best_practices'
     ) AS language_best_practices_assessment,
 
     -- LLM Training Fitness & Explicitness
     (
-        SELECT CAST(JSON_EXTRACT_SCALAR(criterion, '$.score') AS INT64)
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'llm_training_fitness_and_explicitness'
+        SELECT criterion.score
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'llm_training_fitness_and_explicitness'
     ) AS llm_training_fitness_and_explicitness_score,
     (
-        SELECT JSON_EXTRACT_SCALAR(criterion, '$.assessment')
-        FROM UNNEST(JSON_EXTRACT_ARRAY(t.evaluation_data, '$.criteria_breakdown')) AS criterion
-        WHERE JSON_EXTRACT_SCALAR(criterion, '$.criterion_name') = 'llm_training_fitness_and_explicitness'
+        SELECT criterion.assessment
+        FROM UNNEST(t.criteria_breakdown) AS criterion
+        WHERE criterion.criterion_name = 'llm_training_fitness_and_explicitness'
     ) AS llm_training_fitness_and_explicitness_assessment
 FROM
-    RankedAnalysis AS t
+    `panoply-ai-dev.Samples_Health.repo_analysis_latest` AS t
+-- Rows written with CONTENT_ADDRESSED_BLOBS keep only the hashes inline; the
+-- side tables are grouped by hash so a duplicated blob adds no rows.
+LEFT JOIN (
+    SELECT content_hash, ANY_VALUE(raw_code) AS raw_code
+    FROM `panoply-ai-dev.Samples_Health.repo_analysis_raw_code`
+    GROUP BY content_hash
+) AS rc
+    ON rc.content_hash = t.raw_code_hash
+LEFT JOIN (
+    SELECT content_hash, ANY_VALUE(commit_history) AS commit_history
+    FROM `panoply-ai-dev.Samples_Health.repo_analysis_commit_history`
+    GROUP BY content_hash
+) AS ch
+    ON ch.content_hash = t.commit_history_hash
 WHERE
-    t.rn = 1
-    AND t.region_tags IS NOT NULL
+    t.region_tags IS NOT NULL
     AND ARRAY_LENGTH(t.region_tags) > 0
-    AND t.Generated = TRUE;
+    AND t.Generated = TRUE
+    AND t.is_deleted IS NOT TRUE;
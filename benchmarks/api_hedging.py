@@ -0,0 +1,129 @@
+"""
+Compares analysis API latency with and without request hedging.
+
+A local stub server stands in for the analysis API. Most requests take
+`--latency` seconds, but a `--straggler-rate` share of them stall for
+`--straggler-latency` seconds, like a request stuck behind a slow model
+replica. The same requests are sent from `--workers` threads with:
+
+  - no hedging
+  - hedging at `--percentile` with a `--budget` share of extra requests
+
+and the p50/p99 latency, the makespan and the number of requests the server
+received are reported.
+
+Run from the repository root:
+
+    uv run python benchmarks/api_hedging.py [--workers 16] [--requests 800]
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from tools.api_client import ApiClient  # noqa: E402
+from utils.hedging import Hedger  # noqa: E402
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.requests += 1
+        if random.random() < self.server.straggler_rate:
+            time.sleep(self.server.straggler_latency)
+        else:
+            time.sleep(random.uniform(0.5, 1.5) * self.server.latency)
+        data = b'{"analysis": {}}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def run(client, hedger, url, requests_count, workers):
+    def task(i):
+        start = time.monotonic()
+        hedger.call(
+            lambda: client.post_json(url, {"code": f"x = {i}"}, timeout=30).json()
+        )
+        return time.monotonic() - start
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        latencies = list(executor.map(task, range(requests_count)))
+    return latencies, time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=800)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--straggler-rate", type=float, default=0.02)
+    parser.add_argument("--straggler-latency", type=float, default=2.0)
+    parser.add_argument("--percentile", type=float, default=95)
+    parser.add_argument("--budget", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.latency = args.latency
+    server.straggler_rate = args.straggler_rate
+    server.straggler_latency = args.straggler_latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/analyze"
+
+    settings = MagicMock(API_GZIP_REQUESTS=False, API_MAX_RETRIES=0)
+    scenarios = [
+        ("no hedging", Hedger(percentile=0)),
+        (
+            f"hedged at p{args.percentile:g}",
+            Hedger(
+                percentile=args.percentile,
+                budget=args.budget,
+                max_workers=3 * args.workers,
+            ),
+        ),
+    ]
+
+    print(f"{args.requests} requests from {args.workers} threads")
+    try:
+        for description, hedger in scenarios:
+            client = ApiClient(settings, pool_size=2 * args.workers)
+            server.requests = 0
+            latencies, makespan = run(client, hedger, url, args.requests, args.workers)
+            print(
+                f"{description:<16} p50 {percentile(latencies, 50):>6.3f} s  "
+                f"p99 {percentile(latencies, 99):>6.3f} s  "
+                f"makespan {makespan:>6.2f} s  {server.requests:>5} requests sent"
+            )
+            hedger.close()
+            client.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Compares the analysis API client before and after pool sizing and gzip.
+
+A local stub server stands in for the analysis API, counting the connections
+it accepts (each one a TCP handshake, plus TLS in production) and the request
+bytes it receives. Each task also waits a random "think time" after its API
+call, standing in for the git and BigQuery stages, so that more connections
+sit idle at once than requests' default pool keeps. The same requests,
+carrying real source files from this repository, are sent from `--workers`
+threads with:
+
+  - baseline: requests' default HTTPAdapter (pool_maxsize=10), plain JSON
+  - ApiClient: pool sized to the workers, gzip-compressed bodies
+
+Run from the repository root:
+
+    uv run python benchmarks/api_pool.py [--workers 32] [--requests 1000]
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from tools.api_client import ApiClient  # noqa: E402
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.bytes_received += len(body)
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        json.loads(body)
+        # Simulated analysis latency.
+        time.sleep(self.server.latency)
+        data = b'{"analysis": {}}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def run(post, payloads, workers, think_time):
+    def task(data):
+        post(data)
+        # The rest of a file's pipeline (git, BigQuery write) between API
+        # calls, during which the thread's connection sits idle in the pool.
+        time.sleep(random.uniform(0, 2 * think_time))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(task, payloads))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--think-time", type=float, default=0.05)
+    args = parser.parse_args()
+
+    sources = []
+    for path in sorted(
+        glob.glob(os.path.join(REPO_ROOT, "**", "*.py"), recursive=True)
+    ):
+        with open(path, "r") as f:
+            sources.append(
+                {"github_link": path, "code": f.read(), "language": "Python"}
+            )
+    payloads = [sources[i % len(sources)] for i in range(args.requests)]
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.latency = args.latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/analyze"
+
+    baseline_session = requests.Session()
+    client = ApiClient(
+        MagicMock(API_GZIP_REQUESTS=True, API_MAX_RETRIES=3), pool_size=args.workers
+    )
+    scenarios = [
+        (
+            "baseline (pool 10, plain)",
+            lambda data: baseline_session.post(url, json=data, timeout=30),
+        ),
+        (
+            f"ApiClient (pool {args.workers}, gzip)",
+            lambda data: client.post_json(url, data, timeout=30),
+        ),
+    ]
+
+    print(f"{args.requests} requests from {args.workers} threads")
+    try:
+        for description, post in scenarios:
+            server.connections = 0
+            server.bytes_received = 0
+            start = time.perf_counter()
+            run(post, payloads, args.workers, args.think_time)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{description:<28} {server.connections:>6} connections  "
+                f"{server.bytes_received / 1e6:>8.2f} MB received  {elapsed:>6.2f} s"
+            )
+    finally:
+        baseline_session.close()
+        client.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Measures git-stage throughput with the thread-only executor and with the
+hybrid executor (CPU_WORKERS processes behind the worker threads).
+
+A throwaway repository is generated with a long commit history per file, so
+`git log --follow` output parsing dominates, and every file's git metadata is
+extracted through `CodeProcessor._get_git_info` from a pool of worker threads,
+as `main.py` does. Run from the repository root:
+
+    uv run python benchmarks/cpu_stage_scaling.py [--files 200] [--commits 40]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.code_processor import CodeProcessor  # noqa: E402
+
+
+def build_repo(directory, files, commits):
+    def git(*args):
+        subprocess.check_call(
+            ["git", "-C", directory, *args], stdout=subprocess.DEVNULL
+        )
+
+    git("init", "-q")
+    git("config", "user.name", "Benchmark")
+    git("config", "user.email", "benchmark@example.com")
+    git("remote", "add", "origin", "https://github.com/bench/repo.git")
+    paths = [os.path.join(directory, f"sample_{i}.py") for i in range(files)]
+    for commit in range(commits):
+        for path in paths:
+            with open(path, "a") as f:
+                f.write(f"print({commit})  # {'x' * 200}\n")
+        git("add", "-A")
+        git("commit", "-q", "-m", f"Change {commit}: " + "detail " * 40)
+    return paths
+
+
+def run(paths, threads, cpu_workers):
+    settings = MagicMock(CPU_WORKERS=cpu_workers, API_URL="http://localhost")
+    processor = CodeProcessor(settings, None, {})
+    try:
+        if processor.cpu_pool is not None:
+            # Start the worker processes outside the timed section.
+            list(processor.cpu_pool.map(abs, range(cpu_workers)))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(processor._get_git_info, paths))
+        return time.perf_counter() - start
+    finally:
+        processor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--commits", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = build_repo(directory, args.files, args.commits)
+        cores = os.cpu_count() or 1
+        configurations = [0] + sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+
+        print(
+            f"{len(paths)} files x {args.commits} commits, {args.threads} threads, {cores} cores"
+        )
+        baseline = None
+        for cpu_workers in configurations:
+            elapsed = run(paths, args.threads, cpu_workers)
+            baseline = baseline or elapsed
+            label = "threads only" if not cpu_workers else f"{cpu_workers} CPU workers"
+            print(
+                f"{label:<16} {elapsed:>7.2f} s  {len(paths) / elapsed:>7.1f} files/s  "
+                f"{baseline / elapsed:>5.2f}x"
+            )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
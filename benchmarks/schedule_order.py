@@ -0,0 +1,68 @@
+"""
+Compares the makespan of discovery order and longest-first order.
+
+Simulates `--workers` threads taking files from a queue, as the bounded
+window does, where each file takes time proportional to its size. File sizes
+follow a heavy-tailed (Pareto) distribution, like a samples repository with
+many short snippets and a few very large files. Files are shuffled to stand in
+for discovery order. Repeated over `--trials` random inventories, the mean and
+worst makespan of each order are reported relative to a perfect split of the
+total work.
+
+Run from the repository root:
+
+    uv run python benchmarks/schedule_order.py [--workers 10] [--files 2000]
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from utils.scheduling import longest_first  # noqa: E402
+
+
+def makespan(durations, workers):
+    # Each job goes to whichever worker frees up first.
+    finish_times = [0.0] * workers
+    for duration in durations:
+        heapq.heappush(finish_times, heapq.heappop(finish_times) + duration)
+    return max(finish_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--trials", type=int, default=200)
+    parser.add_argument("--pareto-shape", type=float, default=1.2)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    ratios = {"discovery": [], "longest-first": []}
+    for _ in range(args.trials):
+        durations = [rng.paretovariate(args.pareto_shape) for _ in range(args.files)]
+        rng.shuffle(durations)
+        # No schedule beats the longest file or an even split of the work.
+        lower_bound = max(max(durations), sum(durations) / args.workers)
+        ratios["discovery"].append(makespan(durations, args.workers) / lower_bound)
+        ratios["longest-first"].append(
+            makespan(longest_first(durations, float), args.workers) / lower_bound
+        )
+
+    print(
+        f"{args.files} files, {args.workers} workers, {args.trials} trials "
+        f"(makespan / lower bound)"
+    )
+    for order, values in ratios.items():
+        print(
+            f"{order:<14} mean {sum(values) / len(values):.3f}  worst {max(values):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Reports interpreter import cost for each main.py mode using `-X importtime`.
+
+Each scenario imports exactly what the corresponding mode loads at startup and
+fails if a heavy dependency that the mode should not need shows up. Run from
+the repository root with the `.env` variables available:
+
+    uv run python benchmarks/startup_importtime.py
+"""
+
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each scenario: (description, code to import, modules that must not load).
+SCENARIOS = [
+    (
+        "main.py --help",
+        "import main",
+        ["config", "google.genai", "google.cloud.bigquery", "tqdm"],
+    ),
+    (
+        "--eval-only / --categorize-only",
+        "import main, config, tools.code_processor; config.settings",
+        ["google.genai", "google.cloud.bigquery"],
+    ),
+    (
+        "full run",
+        "import main, config, tools.code_processor, tools.bigquery, tqdm; config.settings",
+        ["google.genai"],
+    ),
+    (
+        "eager (pre-lazy-import baseline)",
+        "import main, config, tools.code_processor, tools.bigquery, tqdm, tools.evaluate_code_file; from google import genai; config.settings",
+        [],
+    ),
+]
+
+
+def measure(code):
+    """
+    Runs `code` in a fresh interpreter and returns the total import time in
+    milliseconds and the set of top-level modules imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": REPO_ROOT},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    total_us = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # Header line.
+        modules.add(name.strip())
+        # Only top-level entries (no indentation) contribute to the total,
+        # since cumulative times already include nested imports.
+        if not name.startswith("  "):
+            total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def main():
+    failures = []
+    results = []
+    for description, code, forbidden in SCENARIOS:
+        total_ms, modules = measure(code)
+        loaded = [m for m in forbidden if m in modules]
+        results.append((description, total_ms))
+        status = "ok" if not loaded else f"LOADED {', '.join(loaded)}"
+        print(f"{description:<36} {total_ms:>9.1f} ms  {status}")
+        if loaded:
+            failures.append(description)
+
+    baseline_ms = results[-1][1]
+    print()
+    for description, total_ms in results[:-1]:
+        print(f"{description:<36} saves {baseline_ms - total_ms:>9.1f} ms vs eager")
+
+    if failures:
+        sys.exit(f"Import regression in: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,55 @@ class Settings(BaseSettings):
     API_TIMEOUT: int = 900
     API_MAX_RETRIES: int = 3
     GOOGLE_GENAI_USE_VERTEXAI: bool = True
+    PROMPT_CACHE_ENABLED: bool = True
+    PROMPT_CACHE_TTL_SECONDS: int = 3600
+    CATEGORIZE_FLUSH_ROWS: int = 100
+    CATEGORIZE_FLUSH_SECONDS: float = 5.0
+    CATEGORIZE_HEURISTICS_ENABLED: bool = True
+    REGION_TAG_INDEX_ENABLED: bool = True
+    SNIPPET_CONTEXT_LINES: int = 5
+    STORE_FULL_RAW_CODE: bool = True
+    UPDATE_LATEST_SNAPSHOT: bool = True
+    CONTENT_ADDRESSED_BLOBS: bool = False
+    QUEUE_LEASE_SECONDS: int = 1800
+    QUEUE_MAX_ATTEMPTS: int = 3
+    CPU_WORKERS: int = 0
+    API_POOL_SIZE: int = 0
+    API_GZIP_REQUESTS: bool = False
+    API_HEDGE_PERCENTILE: float = 0
+    API_HEDGE_BUDGET: float = 0.05
+    API_HEDGE_MIN_SAMPLES: int = 50
+    API_SINGLE_FLIGHT: bool = True
+    MAX_IN_FLIGHT_FILES: int = 0
+    MAX_IN_FLIGHT_BYTES: int = 256 * 1024 * 1024
+    MAX_FILE_BYTES: int = 2 * 1024 * 1024
+    RETRY_MAX_ATTEMPTS: int = 3
+    RETRY_BUDGET: int = 500
+    RETRY_BASE_DELAY_SECONDS: float = 5.0
+    RETRY_MAX_DELAY_SECONDS: float = 120.0
+    BREAKER_FAILURE_THRESHOLD: int = 20
+    BREAKER_RESET_SECONDS: float = 30.0
+    BREAKER_MAX_OUTAGE_SECONDS: float = 1800.0
+    WATCH_INTERVAL_SECONDS: int = 300
+    WATCH_STATUS_PORT: int = 8765
+    SCHEDULE_ORDER: str = "discovery"
+    API_LATENCY_HISTORY_PATH: str = "logs/api_latency.json"
+    MODEL_TOKENS_PER_MINUTE: int = 0
+    MODEL_REQUESTS_PER_MINUTE: int = 0
+    MODEL_CHARS_PER_TOKEN: float = 4.0
+    MODEL_OUTPUT_TOKENS: int = 2000
 
 
-settings = Settings()
+_settings = None
+
+
+def __getattr__(name):
+    # `settings` is built (and the environment validated) on first access rather
+    # than at import time, so code paths that never touch configuration, such as
+    # `main.py --help`, start without loading it.
+    global _settings
+    if name == "settings":
+        if _settings is None:
+            _settings = Settings()
+        return _settings
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,34 +1,62 @@
+from __future__ import annotations
+
 import argparse
 import os
 import logging
 import json
 import csv
 import re
+import socket
 import subprocess
+import sys
 import threading
+import time
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from collections import defaultdict
+from typing import TYPE_CHECKING
 from urllib.parse import urlparse
-from tqdm import tqdm
-from config import settings
-from google import genai
-from tools.code_processor import CodeProcessor
-from tools.bigquery import BigQueryRepository
+from utils.collectors import RunStats, StreamingCsvWriter, read_completed
+from utils.exceptions import BigQueryError
 from utils.logger import logger
+from utils.retry import CIRCUIT_OPEN, RetryQueue, classify_failure
+from utils.scheduling import bounded_as_completed, file_cost
+
+# Heavy dependencies (pydantic settings, the genai SDK, the BigQuery client and
+# tqdm) are imported inside the mode that needs them so that `--help`,
+# `--eval-only` and `--categorize-only` only pay for what they use.
+if TYPE_CHECKING:
+    from tools.code_processor import CodeProcessor
 
 
-def get_files_from_csv(csv_path, max_workers):
+def parse_line_range(link):
     """
-    Reads a CSV file containing GitHub links, clones or updates the source 
-    repositories in parallel, and returns a comprehensive list of resolved 
+    Returns the (start, end) line range from a GitHub link fragment such as
+    `#L15-L55` or `#L15`, or None if the link has no line range.
+    """
+    match = re.fullmatch(r"L(\d+)(?:-L(\d+))?", urlparse(link).fragment)
+    if not match:
+        return None
+    start = int(match.group(1))
+    end = int(match.group(2) or start)
+    return min(start, end), max(start, end)
+
+
+def get_files_from_csv(csv_path, max_workers, line_ranges=None):
+    """
+    Reads a CSV file containing GitHub links, clones or updates the source
+    repositories in parallel, and returns a comprehensive list of resolved
     local file paths for analysis.
-    
+
     This function handles:
     1. CSV parsing and deduplication of URLs.
     2. Parallel repository cloning/updating using a ThreadPoolExecutor.
     3. Dynamic default branch detection (main/master/etc).
     4. Mapping GitHub shallow links to local filesystem paths.
+
+    If a `line_ranges` dict is passed, it is filled with the `#L<start>-L<end>`
+    range of each resolved local path. When several links point at the same
+    file, they are merged into one range spanning from the first start to the
+    last end, which includes any lines between them.
     """
     clone_dir = os.path.expanduser(os.environ.get("REPO_SAMPLES_DIR", "~/samples"))
     if not os.path.exists(clone_dir):
@@ -137,6 +165,13 @@ def get_files_from_csv(csv_path, max_workers):
             local_path = os.path.join(clone_dir, owner, repo_name, file_path)
             if os.path.exists(local_path):
                 local_files.append(local_path)
+                line_range = parse_line_range(link)
+                if line_ranges is not None and line_range:
+                    existing = line_ranges.get(local_path, line_range)
+                    line_ranges[local_path] = (
+                        min(existing[0], line_range[0]),
+                        max(existing[1], line_range[1]),
+                    )
             else:
                 logger.warning(f"File not found after cloning: {local_path}")
         except IndexError:
@@ -148,68 +183,428 @@ def get_files_from_csv(csv_path, max_workers):
     return local_files
 
 
+def discover_files(args, line_ranges):
+    """
+    Lists the files named by `--from-csv` (cloning or updating the
+    repositories it links to) or by `file_link`, a file or a directory.
+    `line_ranges` is filled in from the CSV links when `--line-ranges` is set.
+    """
+    files_to_process = []
+    if args.from_csv:
+        logger.info("Processing from CSV...")
+        files_to_process = get_files_from_csv(
+            args.from_csv,
+            args.workers,
+            line_ranges=line_ranges if args.line_ranges else None,
+        )
+        logger.info(f"Got {len(files_to_process)} files from CSV.")
+    elif os.path.isfile(args.file_link):
+        files_to_process.append(args.file_link)
+    elif os.path.isdir(args.file_link):
+        for root, _, files in os.walk(args.file_link):
+            for file in files:
+                file_path = os.path.join(root, file)
+                files_to_process.append(file_path)
+    return files_to_process
+
+
 def process_file_wrapper(
     processor: CodeProcessor,
     file_path: str,
     regen: bool,
     gen: bool,
+    by_region: bool,
     error_logger: logging.Logger,
-    processed_counts: defaultdict,
-    skipped_counts: defaultdict,
-    errored_counts: defaultdict,
-    consecutive_errors: list,
-    error_lock: threading.Lock,
+    stats: RunStats,
+    line_range: tuple = None,
+    retry_queue: RetryQueue = None,
 ):
     """
     Wrapper function to process a single file, handle exceptions, and update counters.
     Invokes the CodeProcessor to perform analysis via an external API.
+
+    Per-extension counters are recorded in thread-local storage by `stats` and
+    merged once the run completes.
+
+    Failures are classified by `classify_failure`. Transient ones (API
+    timeouts, 429/5xx, BigQuery quota) are put on `retry_queue` while it has
+    attempts and budget left; anything else is written to the error log as
+    `<file_path>\t<reason>`. During an API or BigQuery outage the processor's
+    circuit breakers hold the call until the dependency recovers; if it stays
+    down past BREAKER_MAX_OUTAGE_SECONDS, the remaining files fail fast with
+    the reason `circuit_open` so the run can finish and be reprocessed later.
+
+    Returns:
+        str: The processing status, "retry" if the file was queued for a
+        retry, "aborted" if a circuit breaker has given up, or "errored" if
+        processing failed for good.
     """
     logger.info(f"Starting processing for file: {file_path}")
     file_extension = os.path.splitext(file_path)[1]
     try:
-        status = processor.process_file(file_path, regen=regen, gen=gen)
-        if status == "processed":
-            processed_counts[file_extension] += 1
-        elif status == "skipped":
-            skipped_counts[file_extension] += 1
-
-        with error_lock:
-            consecutive_errors[0] = 0
+        status = processor.process_file(
+            file_path,
+            regen=regen,
+            gen=gen,
+            by_region=by_region,
+            line_range=line_range,
+        )
+        stats.increment(status, file_extension)
         logger.info(f"Finished processing for file: {file_path} with status: {status}")
+        return status
 
     except Exception as e:
-        logger.error(f"Error processing file {file_path}: {e}")
-        error_logger.error(file_path)
-        errored_counts[file_extension] += 1
-        with error_lock:
-            consecutive_errors[0] += 1
-        # After 20 consecutive errors, we halt execution. This threshold prevents 
-        # unintentional and costly API usage if there is a systemic issue (e.g., 
-        # network failure, API outage, or configuration error) that would affect 
-        # all subsequent files.
-        if consecutive_errors[0] >= 20:
-            logger.error("Twenty consecutive errors detected. Aborting execution to prevent runaway costs.")
-            # os._exit is used to immediately terminate all threads.
-            os._exit(1)
+        reason, transient = classify_failure(e)
+        delay = (
+            retry_queue.schedule(file_path, reason)
+            if transient and retry_queue is not None
+            else None
+        )
+        if delay is not None:
+            logger.warning(
+                f"Transient failure ({reason}) processing {file_path}: {e}. "
+                f"Retrying in {delay:.0f}s."
+            )
+        else:
+            logger.error(f"Error processing file {file_path} ({reason}): {e}")
+            error_logger.error(f"{file_path}\t{reason}")
+            stats.increment("errored", file_extension)
+        if delay is not None:
+            return "retry"
+        return "aborted" if reason == CIRCUIT_OPEN else "errored"
+
+
+def run_queue_worker(queue, max_workers, lease_seconds, poll_interval=5.0, **kwargs):
+    """
+    Drains a shared work queue with `max_workers` threads.
+
+    Each thread repeatedly leases one item and processes it with
+    `process_file_wrapper` (which receives `kwargs`), then marks the item done
+    or failed. A background heartbeat keeps the leases of in-progress items
+    alive. When nothing is leasable but other workers still hold leases, the
+    thread waits and polls, so items from workers that die are picked up once
+    their leases expire. Returns when no item is pending or leased, or once
+    a circuit breaker has given up on the API or BigQuery.
+    """
+    from utils.work_queue import LeaseHeartbeat
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    heartbeat = LeaseHeartbeat(queue, worker_id, lease_seconds)
+    logger.info(f"Queue worker {worker_id} started with {max_workers} threads.")
+
+    def drain():
+        while True:
+            items = queue.lease(worker_id, lease_seconds)
+            if not items:
+                if queue.is_drained():
+                    return
+                time.sleep(poll_interval)
+                continue
+            item = items[0]
+            line_range = item.payload.get("line_range")
+            heartbeat.track(item.id)
+            try:
+                status = process_file_wrapper(
+                    file_path=item.file_path,
+                    line_range=tuple(line_range) if line_range else None,
+                    **kwargs,
+                )
+            finally:
+                heartbeat.untrack(item.id)
+            if status == "aborted":
+                # A dependency has been down too long; leave the rest of the
+                # queue to workers that start once it is back.
+                queue.fail(worker_id, item.id, CIRCUIT_OPEN)
+                return
+            if status == "errored":
+                queue.fail(worker_id, item.id, "processing failed")
+            else:
+                queue.complete(worker_id, item.id)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in [executor.submit(drain) for _ in range(max_workers)]:
+                future.result()
+    finally:
+        heartbeat.close()
+    logger.info(f"Queue worker {worker_id} finished: {queue.counts()}")
+
+
+def run_queue_coordinator(
+    queue, files_to_process, line_ranges, spawn_workers, worker_args
+):
+    """
+    Loads the discovered files into the work queue and, optionally, starts
+    `spawn_workers` local worker processes (`main.py --queue ...`) and waits
+    for them. Workers on other hosts can join the same queue at any time.
+    """
+    added = queue.enqueue(
+        files_to_process,
+        {
+            file: {"line_range": line_ranges[file]}
+            for file in files_to_process
+            if line_ranges.get(file)
+        },
+    )
+    logger.info(
+        f"Queued {added} new files ({len(files_to_process) - added} already queued). "
+        f"Queue state: {queue.counts()}"
+    )
+    if not spawn_workers:
+        return
+
+    command = [sys.executable, os.path.abspath(__file__), *worker_args]
+    logger.info(f"Starting {spawn_workers} worker processes: {' '.join(command)}")
+    workers = [
+        subprocess.Popen(command, stdin=subprocess.DEVNULL)
+        for _ in range(spawn_workers)
+    ]
+    exit_codes = [worker.wait() for worker in workers]
+    failed_workers = sum(1 for code in exit_codes if code != 0)
+    if failed_workers:
+        logger.error(f"{failed_workers} worker processes exited with an error.")
+    logger.info(f"Final queue state: {queue.counts()}")
+    for file_path, error in queue.failed_items():
+        logger.error(f"Gave up on {file_path}: {error}")
+
+
+def record_deltas(executor, processor, plans, failed_files, gen, stats):
+    """
+    Finishes a `--delta` run: writes a tombstone for every file deleted from
+    each repository, then records the repository's HEAD as fully analyzed if
+    none of its files or tombstones failed. A repository that is not recorded
+    is diffed from the same commit again next time.
+    """
+    from tools.repo_delta import record_delta
+
+    table_id = processor.bigquery_repo.table_id
+    futures = {
+        executor.submit(
+            processor.process_deletion, plan.repo_root, relative_path, gen
+        ): plan
+        for plan in plans
+        for relative_path in plan.deleted
+    }
+    failed_plans = set()
+    for future in as_completed(futures):
+        plan = futures[future]
+        try:
+            status = future.result()
+            stats.increment(status, "")
+        except Exception as e:
+            logger.error(f"Could not record a deletion in {plan.repo_root}: {e}")
+            failed_plans.add(plan)
+
+    for plan in plans:
+        if plan in failed_plans or failed_files.intersection(plan.files):
+            logger.warning(
+                f"Not recording {plan.repo_root} at {plan.head}: some files failed."
+            )
+            continue
+        record_delta(plan, table_id)
+
+
+def run_files(
+    processor,
+    files_to_process,
+    args,
+    settings,
+    error_logger,
+    stats,
+    line_ranges=None,
+    delta_plans=(),
+    on_done=None,
+):
+    """
+    Processes `files_to_process` on `args.workers` threads through a bounded
+    window, in the SCHEDULE_ORDER, retrying transient failures in-run, then
+    finishes any `--delta` plans (see `record_deltas`).
+
+    Args:
+        on_done: Optional callable invoked with the final status of each file.
+            Progress is shown with tqdm only when it is not given.
+    """
+    line_ranges = line_ranges or {}
+    if settings.SCHEDULE_ORDER != "discovery":
+        from tools.work_order import order_files
+
+        files_to_process = order_files(
+            files_to_process,
+            settings.SCHEDULE_ORDER,
+            bigquery_repo=processor.bigquery_repo,
+            latency_history=processor.latency_history,
+        )
+    logger.info(
+        f"Starting execution for {len(files_to_process)} files using {args.workers} workers."
+    )
+    retry_queue = RetryQueue(
+        max_attempts=settings.RETRY_MAX_ATTEMPTS,
+        budget=settings.RETRY_BUDGET,
+        base_delay=settings.RETRY_BASE_DELAY_SECONDS,
+        max_delay=settings.RETRY_MAX_DELAY_SECONDS,
+    )
+    # Files that failed for good; a repository with any is not recorded as
+    # fully analyzed in --delta mode.
+    failed_files = set()
+
+    def process(file):
+        status = process_file_wrapper(
+            processor,
+            file,
+            regen=args.regen,
+            gen=args.gen,
+            by_region=args.by_region,
+            error_logger=error_logger,
+            stats=stats,
+            line_range=line_ranges.get(file),
+            retry_queue=retry_queue,
+        )
+        if status in ("errored", "aborted"):
+            failed_files.add(file)
+        return status
+
+    if on_done is None:
+        from tqdm import tqdm
+
+        progress = tqdm(total=len(files_to_process), desc="Processing files")
+
+        def on_done(status):
+            progress.update(1)
+    else:
+        progress = None
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            # Files are admitted as earlier ones finish, so only a bounded
+            # window of futures, code and responses is held at once.
+            # Transient failures come back through the retry queue.
+            completed = bounded_as_completed(
+                executor,
+                process,
+                files_to_process,
+                settings.MAX_IN_FLIGHT_FILES or 2 * args.workers,
+                settings.MAX_IN_FLIGHT_BYTES,
+                cost=file_cost,
+                retries=retry_queue,
+            )
+            for future in completed:
+                status = future.result()
+                if status != "retry":
+                    on_done(status)
+            if delta_plans:
+                record_deltas(
+                    executor, processor, delta_plans, failed_files, args.gen, stats
+                )
+    finally:
+        if progress is not None:
+            progress.close()
+    if retry_queue.retries_granted:
+        logger.info(f"Retried {retry_queue.retries_granted} transient failures in-run.")
+
+
+def run_watch(processor, args, settings, error_logger, stats):
+    """
+    Runs as a daemon: every WATCH_INTERVAL_SECONDS, rediscovers the input
+    (pulling the repositories of a `--from-csv` inventory), narrows it to what
+    changed with `--delta` planning and processes that, reusing the warm
+    processor, its API and BigQuery clients and the per-repository caches.
+    Unchanged repositories cost one `git rev-parse` per cycle.
+
+    A JSON status endpoint with queue depth and throughput is served on
+    127.0.0.1:WATCH_STATUS_PORT (0 disables it). Stops on Ctrl-C or SIGTERM,
+    after the current cycle's in-flight files finish.
+    """
+    import signal
+    from tools.repo_delta import plan_delta
+    from utils.status import RunStatus, StatusServer
+
+    status = RunStatus()
+    server = (
+        StatusServer(settings.WATCH_STATUS_PORT, status.snapshot)
+        if settings.WATCH_STATUS_PORT
+        else None
+    )
+    if server is not None:
+        logger.info(f"Status endpoint listening on {server.url}")
+
+    stop = threading.Event()
+    previous_handler = signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    table_id = processor.bigquery_repo.table_id
+    try:
+        while not stop.is_set():
+            cycle_started_at = datetime.now().isoformat()
+            line_ranges = {}
+            files, plans = plan_delta(discover_files(args, line_ranges), table_id)
+            deletions = sum(len(plan.deleted) for plan in plans)
+            if files or deletions:
+                status.start_cycle(len(files))
+                run_files(
+                    processor,
+                    files,
+                    args,
+                    settings,
+                    error_logger,
+                    stats,
+                    line_ranges=line_ranges,
+                    delta_plans=plans,
+                    on_done=status.file_done,
+                )
+                status.end_cycle()
+                if settings.UPDATE_LATEST_SNAPSHOT:
+                    try:
+                        processor.bigquery_repo.refresh_latest(since=cycle_started_at)
+                    except BigQueryError as e:
+                        logger.error(f"Could not update the latest snapshot: {e}")
+            else:
+                status.idle_cycle()
+                logger.info("No changes since the last cycle.")
+            stop.wait(settings.WATCH_INTERVAL_SECONDS)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info("Watch mode stopped.")
+        signal.signal(signal.SIGTERM, previous_handler)
+        if server is not None:
+            server.close()
 
 
 def categorize_file_wrapper(processor, file_path, csv_writer):
-    """Wrapper function to process a single file and write to CSV."""
+    """
+    Wrapper function to process a single file and write to CSV.
+
+    `csv_writer` is a StreamingCsvWriter, so rows are handed to its dedicated
+    writer thread rather than written from the worker.
+    """
     try:
         result = processor.categorize_file_only(file_path)
-        if result:
-            csv_writer.writerow(result)
     except Exception as e:
         logger.error(f"Error categorizing file {file_path}: {e}")
+        return
+    # A failed writer stops the run instead of dropping rows.
+    if result:
+        csv_writer.writerow(result)
 
 
-def categorize_only(input_path, max_workers):
+def categorize_only(input_path, max_workers, output_path=None, shard_by_repo=False):
     """
     Processes files for categorization only and writes the output to a CSV file.
+
+    Rows are streamed through a StreamingCsvWriter that periodically flushes
+    and fsyncs. If `output_path` already exists, files it already lists are
+    skipped so an interrupted run can be resumed by passing the same path.
+    With `shard_by_repo`, `output_path` is a directory holding one CSV per
+    repository.
     """
-    now = datetime.now().strftime("%Y-%m-%d-%H-%M")
-    output_filename = f"{now} - categorization.csv"
-    output_path = os.path.join("logs", output_filename)
+    from tqdm import tqdm
+    from config import settings
+    from tools.code_processor import CodeProcessor
+
+    if not output_path:
+        now = datetime.now().strftime("%Y-%m-%d-%H-%M")
+        output_filename = f"{now} - categorization"
+        if not shard_by_repo:
+            output_filename += ".csv"
+        output_path = os.path.join("logs", output_filename)
 
     os.makedirs("logs", exist_ok=True)
 
@@ -224,37 +619,56 @@ def categorize_only(input_path, max_workers):
             for file in files:
                 files_to_process.append(os.path.join(root, file))
 
+    completed = read_completed(output_path, "file_path")
+    if completed:
+        files_to_process = [
+            file for file in files_to_process if os.path.abspath(file) not in completed
+        ]
+        logger.info(
+            f"Resuming {output_path}: {len(completed)} files already categorized."
+        )
+
     if not files_to_process:
         logger.info("No files to process.")
         return
 
-    client = genai.Client()
+    # The genai client is created by CodeProcessor only if the evaluator is used.
     prompts = load_prompts()
-    processor = CodeProcessor(settings, client, prompts)  # No DB for categorize-only mode
+    processor = CodeProcessor(settings, None, prompts)  # No DB for categorize-only mode
+    fieldnames = [
+        "indexed_source_url",
+        "region_tag",
+        "repository_name",
+        "product_category",
+        "product_name",
+        "llm_determined",
+        "file_path",
+    ]
+    writer = StreamingCsvWriter(
+        output_path,
+        fieldnames,
+        shard_by="repository_name" if shard_by_repo else None,
+        flush_rows=settings.CATEGORIZE_FLUSH_ROWS,
+        flush_interval=settings.CATEGORIZE_FLUSH_SECONDS,
+    )
     try:
-        with open(output_path, "w", newline="") as csvfile:
-            fieldnames = [
-                "indexed_source_url",
-                "region_tag",
-                "repository_name",
-                "product_category",
-                "product_name",
-                "llm_determined",
-            ]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {
-                    executor.submit(categorize_file_wrapper, processor, file, writer)
-                    for file in files_to_process
-                }
-                for future in tqdm(
-                    as_completed(futures), total=len(futures), desc="Categorizing files"
-                ):
-                    future.result()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            completed = bounded_as_completed(
+                executor,
+                lambda file: categorize_file_wrapper(processor, file, writer),
+                files_to_process,
+                settings.MAX_IN_FLIGHT_FILES or 2 * max_workers,
+                settings.MAX_IN_FLIGHT_BYTES,
+                cost=file_cost,
+            )
+            for future in tqdm(
+                completed, total=len(files_to_process), desc="Categorizing files"
+            ):
+                future.result()
 
     finally:
+        writer.close()
+        processor.close()
         print()  # Newline after progress bar
 
     logger.info(f"Categorization complete. Output written to {output_path}")
@@ -282,7 +696,25 @@ def main():
         action="store_true",
         help="Set the 'Generated' column to true in BigQuery.",
     )
+    parser.add_argument(
+        "--by-region",
+        action="store_true",
+        help="Evaluate each region tag separately, re-analyzing only regions whose code changed.",
+    )
+    parser.add_argument(
+        "--line-ranges",
+        action="store_true",
+        help="With --from-csv, send only each link's #L<start>-L<end> range (plus context) to the API.",
+    )
     parser.add_argument("--reprocess-log", help="Path to a log file to reprocess.")
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help=(
+            "Only analyze files changed since each repository's last fully "
+            "analyzed commit, and record deleted files as tombstones."
+        ),
+    )
     parser.add_argument(
         "--eval-only",
         action="store_true",
@@ -293,43 +725,216 @@ def main():
         action="store_true",
         help="Run in categorization-only mode.",
     )
+    parser.add_argument(
+        "--output",
+        help="Categorization output path. If it exists, already categorized files are skipped.",
+    )
+    parser.add_argument(
+        "--shard-by-repo",
+        action="store_true",
+        help="Write categorization output as one CSV per repository under --output.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "Run as a daemon, analyzing changes to the --from-csv repositories or "
+            "the directory every WATCH_INTERVAL_SECONDS (implies --delta)."
+        ),
+    )
+    parser.add_argument(
+        "--order",
+        choices=["discovery", "longest-first", "stalest-first"],
+        help=(
+            "Order to process the files in: as discovered, longest estimated API "
+            "time first, or oldest evaluation first (overrides SCHEDULE_ORDER)."
+        ),
+    )
     parser.add_argument(
         "--workers", type=int, default=10, help="Number of parallel threads to use."
     )
+    parser.add_argument(
+        "--cpu-workers",
+        type=int,
+        help="Run the CPU-bound git stage in this many processes (overrides CPU_WORKERS).",
+    )
+    parser.add_argument(
+        "--queue",
+        help=(
+            "Shared work queue (SQLite file path or <backend>://...). With an input, "
+            "queue the discovered files; without one, run as a worker draining it."
+        ),
+    )
+    parser.add_argument(
+        "--spawn-workers",
+        type=int,
+        default=0,
+        help="With --queue and an input, also start this many local worker processes.",
+    )
+    parser.add_argument(
+        "--migrate-schema",
+        action="store_true",
+        help="Add new columns to the BigQuery table and backfill them, then exit.",
+    )
+    parser.add_argument(
+        "--refresh-latest",
+        action="store_true",
+        help="Rebuild the <table>_latest snapshot from the full history, then exit.",
+    )
     args = parser.parse_args()
 
+    # Settings are validated only once a mode that needs them is selected.
+    from config import settings
+
+    if args.cpu_workers is not None:
+        settings.CPU_WORKERS = args.cpu_workers
+    if args.order is not None:
+        settings.SCHEDULE_ORDER = args.order
+    if not settings.API_POOL_SIZE:
+        # Every worker thread can hold an API connection at once.
+        settings.API_POOL_SIZE = args.workers
+
     if args.categorize_only:
         input_path = args.from_csv or args.file_link
         if not input_path:
             parser.error(
                 "--categorize-only requires an input path from --from-csv or file_link."
             )
-        categorize_only(input_path, args.workers)
+        categorize_only(input_path, args.workers, args.output, args.shard_by_repo)
         return
 
     if args.eval_only:
         if not args.file_link or not os.path.isfile(args.file_link):
             parser.error("--eval-only requires a single file path.")
 
-        client = genai.Client()
+        from tools.code_processor import CodeProcessor
+
         prompts = load_prompts()
-        processor = CodeProcessor(settings, client, prompts)
+        processor = CodeProcessor(settings, None, prompts)
         try:
             result = processor.analyze_file_only(args.file_link)
             if result:
                 print(json.dumps(result, indent=4))
         except Exception as e:
             logger.error(f"Error during evaluation: {e}")
+        finally:
+            processor.close()
         return
 
     if args.db:
         settings.BIGQUERY_TABLE = args.db
 
-    if not any([args.file_link, args.reprocess_log, args.from_csv]):
+    if args.migrate_schema or args.refresh_latest:
+        from tools.bigquery import BigQueryRepository
+
+        bigquery_repo = BigQueryRepository(settings)
+        try:
+            if args.migrate_schema:
+                bigquery_repo.migrate_schema()
+            if args.refresh_latest:
+                bigquery_repo.refresh_latest()
+        finally:
+            bigquery_repo.close()
+        return
+
+    has_input = any([args.file_link, args.reprocess_log, args.from_csv])
+    if not has_input and not args.queue:
         parser.error("Either file_link, --reprocess-log, or --from-csv is required.")
 
+    queue = None
+    if args.queue:
+        from utils.work_queue import open_queue
+
+        queue = open_queue(args.queue, max_attempts=settings.QUEUE_MAX_ATTEMPTS)
+
+    files_to_process = []
+    line_ranges = {}
+    if args.watch:
+        if not (args.from_csv or (args.file_link and os.path.isdir(args.file_link))):
+            parser.error("--watch requires --from-csv or a directory.")
+        if args.reprocess_log or queue is not None:
+            parser.error("--watch cannot be combined with --reprocess-log or --queue.")
+        # Files are discovered at the start of every watch cycle.
+    elif args.from_csv or (args.file_link and not args.reprocess_log):
+        files_to_process = discover_files(args, line_ranges)
+    elif args.reprocess_log:
+        try:
+            with open(args.reprocess_log, "r") as f:
+                # Lines are `<file_path>\t<reason>`; older logs hold only the path.
+                files_to_process = [
+                    line.split("\t")[0].strip() for line in f if line.strip()
+                ]
+            logger.info(
+                f"Reprocessing {len(files_to_process)} files from {args.reprocess_log}"
+            )
+        except FileNotFoundError:
+            logger.error(f"Error: Log file not found at {args.reprocess_log}")
+            return
+
+    if has_input and not args.watch and not files_to_process:
+        logger.info("No files to process.")
+        return
+
+    delta_plans = []
+    if args.delta and not args.watch:
+        if args.reprocess_log or queue is not None:
+            parser.error("--delta cannot be combined with --reprocess-log or --queue.")
+        from tools.repo_delta import plan_delta
+
+        table_id = (
+            f"{settings.GOOGLE_CLOUD_PROJECT}.{settings.BIGQUERY_DATASET}."
+            f"{settings.BIGQUERY_TABLE}"
+        )
+        files_to_process, delta_plans = plan_delta(files_to_process, table_id)
+        if not files_to_process and not any(plan.deleted for plan in delta_plans):
+            logger.info("No changes since the last analyzed commits.")
+            return
+
+    if queue is not None and has_input:
+        worker_args = ["--queue", args.queue, "--workers", str(args.workers)]
+        worker_args += [
+            flag
+            for flag, enabled in [
+                ("--regen", args.regen),
+                ("--gen", args.gen),
+                ("--by-region", args.by_region),
+            ]
+            if enabled
+        ]
+        if args.db:
+            worker_args += ["--db", args.db]
+        if args.cpu_workers is not None:
+            worker_args += ["--cpu-workers", str(args.cpu_workers)]
+        if settings.SCHEDULE_ORDER != "discovery":
+            # Workers lease files in the order they were queued.
+            from tools.work_order import STALEST_FIRST, order_files
+            from utils.scheduling import LatencyHistory
+
+            bigquery_repo = None
+            if settings.SCHEDULE_ORDER == STALEST_FIRST:
+                from tools.bigquery import BigQueryRepository
+
+                bigquery_repo = BigQueryRepository(settings)
+            files_to_process = order_files(
+                files_to_process,
+                settings.SCHEDULE_ORDER,
+                bigquery_repo=bigquery_repo,
+                latency_history=LatencyHistory.load(settings.API_LATENCY_HISTORY_PATH),
+            )
+        try:
+            run_queue_coordinator(
+                queue, files_to_process, line_ranges, args.spawn_workers, worker_args
+            )
+        finally:
+            queue.close()
+        return
+
     source = (
-        "csv"
+        "queue"
+        if queue is not None
+        else "watch"
+        if args.watch
+        else "csv"
         if args.from_csv
         else "reprocess"
         if args.reprocess_log
@@ -338,6 +943,9 @@ def main():
         else "file"
     )
     log_filename_parts = [datetime.now().strftime("%Y%m%d-%H%M%S"), source]
+    if queue is not None:
+        # Several workers may start in the same second.
+        log_filename_parts.append(str(os.getpid()))
     if args.regen:
         log_filename_parts.append("regen")
     if args.db:
@@ -352,76 +960,69 @@ def main():
     error_handler.setFormatter(logging.Formatter("%(message)s"))
     error_logger.addHandler(error_handler)
 
-    files_to_process = []
-    if args.from_csv:
-        logger.info("Processing from CSV...")
-        files_to_process = get_files_from_csv(args.from_csv, args.workers)
-        logger.info(f"Got {len(files_to_process)} files from CSV.")
-    elif args.reprocess_log:
-        try:
-            with open(args.reprocess_log, "r") as f:
-                files_to_process = [line.strip() for line in f if line.strip()]
-            logger.info(
-                f"Reprocessing {len(files_to_process)} files from {args.reprocess_log}"
-            )
-        except FileNotFoundError:
-            logger.error(f"Error: Log file not found at {args.reprocess_log}")
-            return
-    elif os.path.isfile(args.file_link):
-        files_to_process.append(args.file_link)
-    elif os.path.isdir(args.file_link):
-        for root, _, files in os.walk(args.file_link):
-            for file in files:
-                file_path = os.path.join(root, file)
-                files_to_process.append(file_path)
-
-    if not files_to_process:
-        logger.info("No files to process.")
-        return
+    stats = RunStats()
 
-    processed_counts = defaultdict(int)
-    skipped_counts = defaultdict(int)
-    errored_counts = defaultdict(int)
-    consecutive_errors = [0]
-    error_lock = threading.Lock()
+    from tools.bigquery import BigQueryRepository
+    from tools.code_processor import CodeProcessor
 
-    logger.info("Initializing GenAI client...")
-    client = genai.Client()
     prompts = load_prompts()
     logger.info("Initializing BigQuery Repository...")
     bigquery_repo = BigQueryRepository(settings)
     logger.info("Initializing CodeProcessor...")
-    processor = CodeProcessor(settings, client, prompts, bigquery_repo)
-    
-    logger.info(f"Starting execution for {len(files_to_process)} files using {args.workers} workers.")
+    processor = CodeProcessor(settings, None, prompts, bigquery_repo)
+
+    # Rows written from here on are merged into the latest snapshot at the end.
+    # evaluation_date uses the same naive local timestamp format.
+    run_started_at = datetime.now().isoformat()
     try:
-        with ThreadPoolExecutor(max_workers=args.workers) as executor:
-            logger.info("Submitting tasks to executor...")
-            futures = {
-                executor.submit(
-                    process_file_wrapper,
-                    processor,
-                    file,
-                    regen=args.regen,
-                    gen=args.gen,
-                    error_logger=error_logger,
-                    processed_counts=processed_counts,
-                    skipped_counts=skipped_counts,
-                    errored_counts=errored_counts,
-                    consecutive_errors=consecutive_errors,
-                    error_lock=error_lock,
-                )
-                for file in files_to_process
-            }
-            logger.info("Tasks submitted. Waiting for completion...")
-            for future in tqdm(
-                as_completed(futures), total=len(futures), desc="Processing files"
-            ):
-                future.result()
+        if queue is not None:
+            run_queue_worker(
+                queue,
+                args.workers,
+                settings.QUEUE_LEASE_SECONDS,
+                processor=processor,
+                regen=args.regen,
+                gen=args.gen,
+                by_region=args.by_region,
+                error_logger=error_logger,
+                stats=stats,
+            )
+        elif args.watch:
+            run_watch(processor, args, settings, error_logger, stats)
+        else:
+            run_files(
+                processor,
+                files_to_process,
+                args,
+                settings,
+                error_logger,
+                stats,
+                line_ranges=line_ranges,
+                delta_plans=delta_plans,
+            )
     finally:
+        processor.close()
+        # Watch mode refreshes the snapshot after every cycle. Tombstones are
+        # written rows too, so a run that only recorded deletions refreshes.
+        written = stats.totals()
+        if (
+            settings.UPDATE_LATEST_SNAPSHOT
+            and not args.watch
+            and (written["processed"] or written["deleted"])
+        ):
+            try:
+                bigquery_repo.refresh_latest(since=run_started_at)
+            except BigQueryError as e:
+                logger.error(f"Could not update the latest snapshot: {e}")
         bigquery_repo.close()
+        if queue is not None:
+            queue.close()
         print()  # Newline after progress bar
 
+    totals = stats.totals()
+    processed_counts = totals["processed"]
+    skipped_counts = totals["skipped"]
+    errored_counts = totals["errored"]
     total_processed = sum(processed_counts.values())
     total_skipped = sum(skipped_counts.values())
     total_errored = sum(errored_counts.values())
@@ -437,6 +1038,10 @@ def main():
         for ext, count in sorted(skipped_counts.items()):
             logger.info(f"  - {ext if ext else 'other'}: {count}")
 
+    total_deleted = sum(totals["deleted"].values())
+    if total_deleted:
+        logger.info(f"\nTotal deletions recorded: {total_deleted}")
+
     logger.info(f"\nTotal files errored: {total_errored}")
     if total_errored > 0:
         for ext, count in sorted(errored_counts.items()):
@@ -456,6 +1061,10 @@ def main():
         logger.info("No errors, removing empty log file.")
     elif os.path.exists(error_log_path):
         logger.info(f"Errors were encountered. See {error_log_path} for details.")
+        if queue is not None or args.watch:
+            # Failed items are retried by the queue or the next watch cycle;
+            # these modes run unattended.
+            return
         reprocess = input("Would you like to reprocess the failed files? (y/n): ")
         if reprocess.lower() == "y":
             print("\nTo reprocess, run the following command:")
@@ -0,0 +1,127 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestMainStartup(unittest.TestCase):
+    def _loaded_modules(self, code):
+        result = subprocess.run(
+            [sys.executable, "-c", f"{code}; import sys; print(' '.join(sys.modules))"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return set(result.stdout.split())
+
+    def test_import_main_is_lightweight(self):
+        modules = self._loaded_modules("import main")
+
+        for heavy in ["config", "google.genai", "google.cloud.bigquery", "tqdm"]:
+            self.assertNotIn(heavy, modules)
+
+    def test_code_processor_does_not_load_genai_or_bigquery(self):
+        modules = self._loaded_modules("import tools.code_processor")
+
+        self.assertNotIn("google.genai", modules)
+        self.assertNotIn("google.cloud.bigquery", modules)
+
+
+class TestParseLineRange(unittest.TestCase):
+    def test_range(self):
+        from main import parse_line_range
+
+        link = "https://github.com/o/r/blob/abc/f.cs#L15-L55"
+        self.assertEqual(parse_line_range(link), (15, 55))
+
+    def test_single_line_and_missing_fragment(self):
+        from main import parse_line_range
+
+        self.assertEqual(
+            parse_line_range("https://github.com/o/r/blob/a/f.py#L7"), (7, 7)
+        )
+        self.assertIsNone(parse_line_range("https://github.com/o/r/blob/a/f.py"))
+
+
+class TestRunQueueWorker(unittest.TestCase):
+    def test_drains_queue_and_records_outcomes(self):
+        from main import run_queue_worker
+        from utils.collectors import RunStats
+        from utils.work_queue import SqliteWorkQueue
+
+        with tempfile.TemporaryDirectory() as directory:
+            queue = SqliteWorkQueue(os.path.join(directory, "q.db"), max_attempts=1)
+            queue.enqueue(
+                ["ok.py", "bad.py", "range.py"],
+                {"range.py": {"line_range": [3, 9]}},
+            )
+
+            def process_file(file_path, **kwargs):
+                if file_path == "bad.py":
+                    raise Exception("boom")
+                return "processed"
+
+            processor = MagicMock()
+            processor.process_file.side_effect = process_file
+
+            run_queue_worker(
+                queue,
+                max_workers=2,
+                lease_seconds=60,
+                poll_interval=0.01,
+                processor=processor,
+                regen=False,
+                gen=False,
+                by_region=False,
+                error_logger=MagicMock(),
+                stats=RunStats(),
+            )
+
+            self.assertEqual(queue.counts(), {"done": 2, "failed": 1})
+            processor.process_file.assert_any_call(
+                "range.py", regen=False, gen=False, by_region=False, line_range=(3, 9)
+            )
+            queue.close()
+
+
+class TestRunWatch(unittest.TestCase):
+    def test_cycles_reuse_the_processor_until_stopped(self):
+        import main
+        from utils.collectors import RunStats
+
+        processor = MagicMock()
+        processor.process_file.return_value = "processed"
+        settings = MagicMock(
+            WATCH_STATUS_PORT=0,
+            WATCH_INTERVAL_SECONDS=0,
+            UPDATE_LATEST_SNAPSHOT=True,
+            RETRY_MAX_ATTEMPTS=0,
+            RETRY_BUDGET=0,
+            RETRY_BASE_DELAY_SECONDS=0,
+            RETRY_MAX_DELAY_SECONDS=0,
+            MAX_IN_FLIGHT_FILES=0,
+            MAX_IN_FLIGHT_BYTES=0,
+            SCHEDULE_ORDER="discovery",
+        )
+        args = MagicMock(workers=2, regen=False, gen=False, by_region=False)
+        # The first cycle finds two changed files, the second none, and the
+        # third is interrupted.
+        plans = [(["a.py", "b.py"], []), ([], []), KeyboardInterrupt()]
+
+        with (
+            patch.object(main, "discover_files", return_value=["a.py", "b.py"]),
+            patch("tools.repo_delta.plan_delta", side_effect=plans),
+        ):
+            main.run_watch(processor, args, settings, MagicMock(), RunStats())
+
+        self.assertEqual(processor.process_file.call_count, 2)
+        processor.bigquery_repo.refresh_latest.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import gzip
+import json
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+from tools.api_client import ApiClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        encoding = self.headers.get("Content-Encoding")
+        self.server.encodings.append(encoding)
+        if encoding == "gzip":
+            if not self.server.accept_gzip:
+                return self._respond(415, {"error": "unsupported encoding"})
+            body = gzip.decompress(body)
+        self._respond(200, {"received": len(json.loads(body)["code"])})
+
+    def _respond(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class TestApiClient(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.encodings = []
+        self.server.accept_gzip = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/analyze"
+        self.settings = MagicMock(API_GZIP_REQUESTS=True, API_MAX_RETRIES=0)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_large_bodies_are_gzipped(self):
+        client = ApiClient(self.settings)
+        code = "print('hello')\n" * 500
+
+        response = client.post_json(self.url, {"code": code}, timeout=5)
+
+        self.assertEqual(response.json(), {"received": len(code)})
+        self.assertEqual(self.server.encodings, ["gzip"])
+        stats = client.stats()
+        self.assertLess(stats["sent_bytes"], stats["body_bytes"] / 10)
+        client.close()
+
+    def test_gzip_is_off_by_default(self):
+        client = ApiClient(MagicMock(spec=["API_MAX_RETRIES"], API_MAX_RETRIES=0))
+
+        client.post_json(self.url, {"code": "x" * 5000}, timeout=5)
+
+        self.assertEqual(self.server.encodings, [None])
+        client.close()
+
+    def test_rejected_gzip_body_is_not_resent_uncompressed(self):
+        self.server.accept_gzip = False
+        client = ApiClient(self.settings)
+
+        response = client.post_json(self.url, {"code": "x" * 5000}, timeout=5)
+
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(self.server.encodings, ["gzip"])
+        client.close()
+
+    def test_pool_sized_to_workers_reuses_connections(self):
+        client = ApiClient(self.settings, pool_size=4)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(
+                executor.map(
+                    lambda _: client.post_json(self.url, {"code": "x"}, timeout=5),
+                    range(40),
+                )
+            )
+
+        stats = client.stats()
+        self.assertEqual(stats["requests"], 40)
+        self.assertLessEqual(stats["connections_opened"], 4)
+        self.assertGreaterEqual(stats["connection_reuse"], 0.9)
+        client.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
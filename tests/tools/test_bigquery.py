@@ -1,6 +1,9 @@
+import hashlib
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
-from tools.bigquery import BigQueryRepository
+from google.api_core.exceptions import NotFound
+from tools.bigquery import BigQueryRepository, CLUSTERING_FIELDS
 from utils.exceptions import BigQueryError
 from config import settings
 
@@ -103,6 +106,312 @@ class TestBigQueryRepository(unittest.TestCase):
         # Assert
         mock_query_job.result.assert_called_once()
 
+    @patch("google.cloud.bigquery.Client")
+    def test_get_region_evaluations(self, mock_bigquery_client):
+        # Arrange
+        mock_client_instance = mock_bigquery_client.return_value
+        mock_client_instance.query.return_value = [
+            {
+                "github_link": "some_link#L1-L5",
+                "region_tags": ["tag1"],
+                "region_hash": "abc",
+                "product_category": "Databases",
+                "product_name": "Spanner",
+                "language": "Python",
+                "evaluation_data": '{"overall_compliance_score": 90}',
+                "validation_details": None,
+            }
+        ]
+        repo = BigQueryRepository(self.settings)
+
+        # Act
+        result = repo.get_region_evaluations("some_link")
+
+        # Assert
+        job_config = mock_client_instance.query.call_args.kwargs["job_config"]
+        self.assertEqual(job_config.query_parameters[0].value, "some_link#")
+        query = mock_client_instance.query.call_args.args[0]
+        self.assertIn("PARTITION BY region_hash, region_tags[SAFE_OFFSET(0)]", query)
+        self.assertEqual(result[("tag1", "abc")]["github_link"], "some_link#L1-L5")
+        self.assertEqual(
+            result[("tag1", "abc")]["analysis"]["assessment"],
+            {"overall_compliance_score": 90},
+        )
+
+    @patch("google.cloud.bigquery.Client")
+    def test_last_evaluations(self, mock_bigquery_client):
+        # Arrange
+        mock_client_instance = mock_bigquery_client.return_value
+        prefix = "https://github.com/o/r/blob/main"
+        mock_client_instance.query.side_effect = [
+            [
+                {"github_link": f"{prefix}/a.py", "evaluation_date": "2025-01-01"},
+                {
+                    "github_link": f"{prefix}/a.py#L1-L5",
+                    "evaluation_date": "2025-02-01",
+                },
+                {"github_link": f"{prefix}/b.py", "evaluation_date": "2025-03-01"},
+            ],
+            [],
+        ]
+        repo = BigQueryRepository(self.settings)
+
+        # Act
+        result = repo.last_evaluations(
+            [
+                f"{prefix}/c.py",
+                f"{prefix}/a.py",
+                f"{prefix}/a.py",
+                "https://github.com/o/s/blob/main/x.py",
+            ]
+        )
+
+        # Assert
+        # One query per repository, filtering on the clustered column itself.
+        calls = mock_client_instance.query.call_args_list
+        self.assertEqual(len(calls), 2)
+        self.assertNotIn("SPLIT", calls[0].args[0])
+        parameters = calls[0].kwargs["job_config"].query_parameters
+        self.assertEqual(
+            [p.value for p in parameters], [f"{prefix}/a.py", f"{prefix}/c.py$"]
+        )
+        # Region rows count towards their file; unrequested links are dropped.
+        self.assertEqual(result, {f"{prefix}/a.py": "2025-02-01"})
+
+    @patch("google.cloud.bigquery.Client")
+    def test_has_column_reads_the_schema_once(self, mock_bigquery_client):
+        # Arrange
+        mock_client_instance = mock_bigquery_client.return_value
+        field = MagicMock()
+        field.name = "github_link"
+        mock_client_instance.get_table.return_value.schema = [field]
+        repo = BigQueryRepository(self.settings)
+
+        # Act / Assert
+        self.assertTrue(repo.has_column("github_link"))
+        self.assertFalse(repo.has_column("criteria_breakdown"))
+        mock_client_instance.get_table.assert_called_once()
+
+    @patch("google.cloud.bigquery.Client")
+    def test_record_exists_prunes_partitions(self, mock_bigquery_client):
+        # Arrange
+        mock_client_instance = mock_bigquery_client.return_value
+        mock_client_instance.query.return_value.__iter__.return_value = [[0]]
+        repo = BigQueryRepository(self.settings)
+
+        # Act
+        repo.record_exists("some_link", "2025-01-01")
+
+        # Assert
+        query = mock_client_instance.query.call_args.args[0]
+        self.assertIn("evaluation_date >= TIMESTAMP_SUB", query)
+
+    @patch("google.cloud.bigquery.Client")
+    def test_ensure_table_creates_partitioned_table(self, mock_bigquery_client):
+        # Arrange
+        mock_client_instance = mock_bigquery_client.return_value
+        mock_client_instance.get_table.side_effect = NotFound("missing")
+        repo = BigQueryRepository(self.settings)
+
+        # Act
+        result = repo.ensure_table()
+
+        # Assert
+        self.assertEqual(result, "created")
+        table = mock_client_instance.create_table.call_args.args[0]
+        self.assertEqual(table.time_partitioning.field, "evaluation_date")
+        self.assertEqual(table.clustering_fields, CLUSTERING_FIELDS)
+
+    @patch("google.cloud.bigquery.Client")
+    def test_ensure_table_migrates_unpartitioned_table(self, mock_bigquery_client):
+        # Arrange
+        mock_client_instance = mock_bigquery_client.return_value
+        mock_client_instance.get_table.return_value.time_partitioning = None
+        repo = BigQueryRepository(self.settings)
+
+        # Act
+        result = repo.ensure_table()
+
+        # Assert
+        self.assertEqual(result, "migrated")
+        queries = [c.args[0] for c in mock_client_instance.query.call_args_list]
+        self.assertIn("PARTITION BY DATE(evaluation_date)", queries[0])
+        self.assertIn("CLUSTER BY github_link, github_repo", queries[0])
+        self.assertIn("RENAME TO `test-table_unpartitioned_", queries[1])
+        self.assertIn("RENAME TO `test-table`", queries[2])
+
+    @patch("google.cloud.bigquery.Client")
+    def test_migrate_schema(self, mock_bigquery_client):
+        # Arrange
+        mock_client_instance = mock_bigquery_client.return_value
+        mock_client_instance.query.return_value.num_dml_affected_rows = 3
+        table = mock_client_instance.get_table.return_value
+        table.time_partitioning.field = "evaluation_date"
+        table.clustering_fields = CLUSTERING_FIELDS
+        repo = BigQueryRepository(self.settings)
+
+        # Act
+        backfilled = repo.migrate_schema()
+
+        # Assert
+        self.assertEqual(backfilled, 3)
+        queries = [c.args[0] for c in mock_client_instance.query.call_args_list]
+        self.assertIn("ADD COLUMN IF NOT EXISTS criteria_breakdown", queries[0])
+        self.assertIn(repo.latest_table_id, queries[1])
+        self.assertIn("ADD COLUMN IF NOT EXISTS raw_code_hash", queries[1])
+        self.assertIn(repo.blob_table_ids["raw_code"], queries[2])
+        self.assertIn(repo.blob_table_ids["commit_history"], queries[3])
+        self.assertIn("SET criteria_breakdown", queries[4])
+        # Rows already backfilled, or without criteria, are not rewritten.
+        self.assertIn("ARRAY_LENGTH(criteria_breakdown) = 0", queries[4])
+        self.assertIn(
+            "JSON_QUERY_ARRAY(evaluation_data, '$.criteria_breakdown')", queries[4]
+        )
+        self.assertIn("ADD COLUMN IF NOT EXISTS is_deleted BOOL", queries[0])
+
+    @patch("google.cloud.bigquery.Client")
+    def test_create_stores_blobs_by_hash(self, mock_bigquery_client):
+        # Arrange
+        mock_client_instance = mock_bigquery_client.return_value
+        mock_client_instance.insert_rows_json.return_value = []
+        mock_client_instance.query.return_value.__iter__.return_value = []
+        repo = BigQueryRepository(self.settings)
+        repo.content_addressed = True
+        row = {"github_link": "link", "raw_code": "print(1)", "commit_history": "[]"}
+
+        # Act
+        repo.create(row)
+        repo.create(dict(row, github_link="link2"))
+
+        # Assert
+        # One lookup of both hashes, sending no content; the second row reuses
+        # both blobs without another.
+        mock_client_instance.query.assert_called_once()
+        query = mock_client_instance.query.call_args.args[0]
+        self.assertIn("IN UNNEST(@hashes)", query)
+        self.assertNotIn("MERGE", query)
+        hashes = mock_client_instance.query.call_args.kwargs[
+            "job_config"
+        ].query_parameters[0]
+        self.assertEqual(len(hashes.values), 2)
+        inserts = mock_client_instance.insert_rows_json.call_args_list
+        # One insert per blob side table, then the two main rows.
+        self.assertEqual(len(inserts), 4)
+        self.assertEqual(inserts[0].args[0], repo.blob_table_ids["raw_code"])
+        main_row = inserts[3].args[1][0]
+        self.assertNotIn("raw_code", main_row)
+        self.assertEqual(
+            main_row["raw_code_hash"], inserts[0].args[1][0]["content_hash"]
+        )
+
+    @patch("google.cloud.bigquery.Client")
+    def test_create_skips_blobs_already_stored(self, mock_bigquery_client):
+        # Arrange
+        mock_client_instance = mock_bigquery_client.return_value
+        mock_client_instance.insert_rows_json.return_value = []
+        repo = BigQueryRepository(self.settings)
+        repo.content_addressed = True
+        row = {"github_link": "link", "raw_code": "print(1)", "commit_history": "[]"}
+        content_hash = hashlib.sha256(b"print(1)").hexdigest()
+        mock_client_instance.query.return_value.__iter__.return_value = [
+            {"blob_column": "raw_code", "content_hash": content_hash}
+        ]
+
+        # Act
+        repo.create(row)
+
+        # Assert
+        tables = [
+            c.args[0] for c in mock_client_instance.insert_rows_json.call_args_list
+        ]
+        self.assertEqual(tables, [repo.blob_table_ids["commit_history"], repo.table_id])
+
+    @patch("google.cloud.bigquery.Client")
+    def test_create_retries_a_blob_whose_write_failed(self, mock_bigquery_client):
+        # Arrange
+        mock_client_instance = mock_bigquery_client.return_value
+        mock_client_instance.query.return_value.__iter__.return_value = []
+        mock_client_instance.insert_rows_json.side_effect = [
+            [{"errors": "quota exceeded"}],
+            [],
+            [],
+        ]
+        repo = BigQueryRepository(self.settings)
+        repo.content_addressed = True
+        row = {"github_link": "link", "raw_code": "print(1)"}
+
+        # Act
+        with self.assertRaises(BigQueryError):
+            repo.create(row)
+        repo.create(row)
+
+        # Assert
+        # The failed hash was not remembered, so the second row stores it.
+        self.assertEqual(mock_client_instance.query.call_count, 2)
+        self.assertEqual(mock_client_instance.insert_rows_json.call_count, 3)
+
+    @patch("google.cloud.bigquery.Client")
+    def test_concurrent_writers_of_a_blob_wait_for_one_write(
+        self, mock_bigquery_client
+    ):
+        # Arrange
+        mock_client_instance = mock_bigquery_client.return_value
+        mock_client_instance.insert_rows_json.return_value = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_lookup(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return []
+
+        mock_client_instance.query.side_effect = slow_lookup
+        repo = BigQueryRepository(self.settings)
+        repo.content_addressed = True
+        row = {"github_link": "link", "raw_code": "print(1)"}
+
+        # Act
+        first = threading.Thread(target=repo.create, args=(row,))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=repo.create, args=(row,))
+        second.start()
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        # Assert
+        mock_client_instance.query.assert_called_once()
+        # One blob, then both main rows.
+        self.assertEqual(mock_client_instance.insert_rows_json.call_count, 3)
+
+    @patch("google.cloud.bigquery.Client")
+    def test_refresh_latest_merges_rows_since_run_start(self, mock_bigquery_client):
+        # Arrange
+        mock_client_instance = mock_bigquery_client.return_value
+        field = MagicMock()
+        field.name = "github_link"
+        other_field = MagicMock()
+        other_field.name = "evaluation_date"
+        mock_client_instance.get_table.return_value.schema = [field, other_field]
+        mock_client_instance.query.return_value.num_dml_affected_rows = 2
+        repo = BigQueryRepository(self.settings)
+
+        # Act
+        merged = repo.refresh_latest(since="2025-01-01T00:00:00")
+
+        # Assert
+        self.assertEqual(merged, 2)
+        merge_call = mock_client_instance.query.call_args_list[-1]
+        self.assertIn(f"MERGE `{repo.latest_table_id}`", merge_call.args[0])
+        self.assertIn("evaluation_date >= @since", merge_call.args[0])
+        self.assertIn(
+            "UPDATE SET evaluation_date = S.evaluation_date", merge_call.args[0]
+        )
+        self.assertEqual(
+            merge_call.kwargs["job_config"].query_parameters[0].name, "since"
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
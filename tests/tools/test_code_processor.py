@@ -1,3 +1,5 @@
+import tempfile
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
 from config import settings
@@ -5,6 +7,7 @@ from tools.code_processor import CodeProcessor
 from utils.exceptions import (
     GitRepositoryError,
     APIError,
+    BigQueryError,
 )
 
 
@@ -12,7 +15,7 @@ class TestCodeProcessor(unittest.TestCase):
     def setUp(self):
         self.mock_client = MagicMock()
         self.mock_prompts = {
-            "system_instructions": "Test instructions",
+            "system_instructions": ["Test", "instructions"],
             "consolidated_eval": "Test eval prompt",
             "json_conversion": "Test json prompt",
         }
@@ -20,6 +23,8 @@ class TestCodeProcessor(unittest.TestCase):
         self.processor = CodeProcessor(
             settings, self.mock_client, self.mock_prompts, self.mock_bigquery_repo
         )
+        self.processor.region_tag_index = MagicMock()
+        self.processor.region_tag_index.region_tags_for_file.return_value = []
 
     @patch(
         "tools.code_processor.CodeProcessor._read_raw_code", return_value="some code"
@@ -75,7 +80,9 @@ class TestCodeProcessor(unittest.TestCase):
 
         self.processor.process_file("test.py", regen=True)
 
-        self.mock_bigquery_repo.delete.assert_called_once_with("some_link", "2025-01-01")
+        self.mock_bigquery_repo.delete.assert_called_once_with(
+            "some_link", "2025-01-01"
+        )
 
     @patch.object(CodeProcessor, "_get_git_info", side_effect=GitRepositoryError)
     def test_process_file_git_error(self, mock_get_git_info):
@@ -150,6 +157,327 @@ class TestCodeProcessor(unittest.TestCase):
         result = self.processor.analyze_file_only("test.py")
         self.assertEqual(result, {"analysis": "good"})
 
+    @patch.object(CodeProcessor, "_get_git_info")
+    @patch.object(CodeProcessor, "_call_analysis_api")
+    def test_categorize_file_only_local_fast_path(
+        self, mock_call_analysis_api, mock_get_git_info
+    ):
+        mock_get_git_info.return_value = {
+            "github_link": "some_link",
+            "github_repo": "repo",
+        }
+        code = "# [START spanner_query]\nfrom google.cloud import spanner\n"
+        with patch.object(CodeProcessor, "_read_raw_code", return_value=code):
+            result = self.processor.categorize_file_only("test.py")
+
+        mock_call_analysis_api.assert_not_called()
+        self.assertEqual(result["product_name"], "Spanner")
+        self.assertFalse(result["llm_determined"])
+
+    @patch(
+        "tools.code_processor.CodeProcessor._read_raw_code", return_value="some code"
+    )
+    @patch.object(CodeProcessor, "_get_git_info")
+    @patch.object(CodeProcessor, "_call_analysis_api")
+    def test_categorize_file_only_uses_categorize_mode(
+        self, mock_call_analysis_api, mock_get_git_info, mock_read_raw_code
+    ):
+        mock_get_git_info.return_value = {
+            "github_link": "some_link",
+            "github_repo": "repo",
+        }
+        mock_call_analysis_api.return_value = {
+            "analysis": {
+                "product_category": "Databases",
+                "product_name": "Spanner",
+                "region_tags": ["tag1"],
+            }
+        }
+
+        result = self.processor.categorize_file_only("test.py")
+
+        mock_call_analysis_api.assert_called_once_with(
+            "some_link", "some code", "Python", mode="categorize"
+        )
+        self.assertEqual(result["region_tag"], "tag1")
+        self.assertTrue(result["llm_determined"])
+
+    def test_build_bigquery_row_prefers_local_region_tags(self):
+        analysis_result = {
+            "git_info": {"github_link": "some_link"},
+            "local_region_tags": ["local_tag"],
+            "analysis": {
+                "region_tags": ["api_tag"],
+                "assessment": {"overall_compliance_score": 90},
+            },
+        }
+
+        row = self.processor._build_bigquery_row(analysis_result, "test.py", "code")
+
+        self.assertEqual(row["region_tags"], ["local_tag"])
+
+    def test_build_bigquery_row_flattens_criteria(self):
+        analysis_result = {
+            "git_info": {"github_link": "some_link"},
+            "analysis": {
+                "assessment": {
+                    "overall_compliance_score": 90,
+                    "criteria_breakdown": [
+                        {
+                            "criterion_name": "runnability_and_configuration",
+                            "score": "85",
+                            "weight": 0.25,
+                            "assessment": "Runs as is.",
+                            "recommendations_for_llm_fix": [],
+                        },
+                        {"criterion_name": "formatting", "score": "n/a"},
+                        {"criterion_name": "clarity", "score": 79.6},
+                    ],
+                },
+            },
+        }
+
+        row = self.processor._build_bigquery_row(analysis_result, "test.py", "code")
+
+        self.assertEqual(
+            row["criteria_breakdown"],
+            [
+                {
+                    "criterion_name": "runnability_and_configuration",
+                    "score": 85,
+                    "weight": 0.25,
+                    "assessment": "Runs as is.",
+                },
+                {
+                    "criterion_name": "formatting",
+                    "score": None,
+                    "weight": None,
+                    "assessment": None,
+                },
+                {
+                    "criterion_name": "clarity",
+                    "score": 80,
+                    "weight": None,
+                    "assessment": None,
+                },
+            ],
+        )
+
+    def test_build_bigquery_row_omits_criteria_before_migration(self):
+        self.mock_bigquery_repo.has_column.side_effect = lambda name: (
+            name != "criteria_breakdown"
+        )
+        analysis_result = {
+            "git_info": {"github_link": "some_link"},
+            "analysis": {"assessment": {"overall_compliance_score": 90}},
+        }
+
+        row = self.processor._build_bigquery_row(analysis_result, "test.py", "code")
+
+        self.assertNotIn("criteria_breakdown", row)
+
+    @patch.object(CodeProcessor, "_get_git_info")
+    @patch.object(CodeProcessor, "_analyze_file")
+    @patch.object(CodeProcessor, "_save_result")
+    def test_process_file_by_region_only_reanalyzes_changed_regions(
+        self, mock_save_result, mock_analyze_file, mock_get_git_info
+    ):
+        mock_get_git_info.return_value = {
+            "github_link": "link",
+            "last_updated": "2025-01-01",
+        }
+        self.processor.region_tag_index.regions_for_file.return_value = [
+            {"tag": "same", "start_line": 1, "end_line": 3, "hash": "h1"},
+            {"tag": "moved", "start_line": 4, "end_line": 6, "hash": "h2"},
+            {"tag": "changed", "start_line": 7, "end_line": 9, "hash": "h3-new"},
+        ]
+        prior_analysis = {"assessment": {"overall_compliance_score": 80}}
+        self.mock_bigquery_repo.get_region_evaluations.return_value = {
+            ("same", "h1"): {
+                "github_link": "link#L1-L3",
+                "analysis": prior_analysis,
+                "validation_history": None,
+            },
+            ("moved", "h2"): {
+                "github_link": "link#L10-L12",
+                "analysis": prior_analysis,
+                "validation_history": None,
+            },
+        }
+        mock_analyze_file.return_value = {
+            "git_info": {"github_link": "link#L7-L9"},
+            "analysis": {"assessment": {"overall_compliance_score": 60}},
+        }
+        code = "".join(f"line {i}\n" for i in range(1, 10))
+
+        with patch.object(CodeProcessor, "_read_raw_code", return_value=code):
+            status = self.processor.process_file("test.py", by_region=True)
+
+        self.assertEqual(status, "processed")
+        mock_analyze_file.assert_called_once()
+        self.assertEqual(
+            mock_analyze_file.call_args.args[2], "line 7\nline 8\nline 9\n"
+        )
+        rows = [call.args[0] for call in mock_save_result.call_args_list]
+        self.assertEqual(
+            [(row["github_link"], row["region_hash"]) for row in rows],
+            [("link#L4-L6", "h2"), ("link#L7-L9", "h3-new")],
+        )
+        self.mock_bigquery_repo.record_exists.assert_not_called()
+
+    @patch.object(CodeProcessor, "_get_git_info")
+    @patch.object(CodeProcessor, "_is_already_processed", return_value=False)
+    @patch.object(CodeProcessor, "_analyze_file")
+    @patch.object(CodeProcessor, "_build_bigquery_row", return_value={})
+    @patch.object(CodeProcessor, "_save_result")
+    def test_process_file_with_line_range_sends_snippet(
+        self,
+        mock_save_result,
+        mock_build_bigquery_row,
+        mock_analyze_file,
+        mock_is_already_processed,
+        mock_get_git_info,
+    ):
+        mock_get_git_info.return_value = {"github_link": "some_link"}
+        code = "".join(f"line {i}\n" for i in range(1, 101))
+
+        with patch.object(CodeProcessor, "_read_raw_code", return_value=code):
+            self.processor.process_file("test.py", line_range=(50, 52))
+
+        context = settings.SNIPPET_CONTEXT_LINES
+        expected = "".join(f"line {i}\n" for i in range(50 - context, 52 + context + 1))
+        self.assertEqual(mock_analyze_file.call_args.args[2], expected)
+        # The full file is still stored as raw_code.
+        self.assertEqual(mock_build_bigquery_row.call_args.args[2], code)
+
+    def test_line_range_past_the_end_falls_back_to_the_full_file(self):
+        code = "".join(f"line {i}\n" for i in range(1, 11))
+
+        self.assertEqual(self.processor._slice_line_range(code, (50, 60)), code)
+        self.assertEqual(
+            self.processor._slice_line_range("\n" * 30, (20, 20)), "\n" * 30
+        )
+
+    @patch.object(CodeProcessor, "_get_git_info")
+    def test_process_file_skips_binary_before_git(self, mock_get_git_info):
+        with tempfile.NamedTemporaryFile(suffix=".py") as f:
+            f.write(b"\x00\x01binary")
+            f.flush()
+
+            status = self.processor.process_file(f.name)
+
+        self.assertEqual(status, "skipped")
+        mock_get_git_info.assert_not_called()
+
+    def test_process_deletion_writes_tombstone(self):
+        self.processor.git_processor = MagicMock()
+        self.processor.git_processor.deleted_file_info.return_value = {
+            "github_owner": "o",
+            "github_repo": "r",
+            "github_link": "https://github.com/o/r/blob/main/old.py",
+            "branch_name": "main",
+            "last_updated": "2024-05-01",
+            "commit_history": [],
+            "metadata": {"deleted": True},
+        }
+
+        self.assertEqual(self.processor.process_deletion("/repo", "old.py"), "deleted")
+        self.assertEqual(
+            self.processor.process_deletion("/repo", "notes.txt"), "skipped"
+        )
+
+        row = self.mock_bigquery_repo.create.call_args.args[0]
+        self.assertTrue(row["is_deleted"])
+        self.assertEqual(row["github_link"], "https://github.com/o/r/blob/main/old.py")
+        self.assertEqual(row["last_updated"], "2024-05-01")
+        self.mock_bigquery_repo.create.assert_called_once()
+
+    def test_process_deletion_requires_the_is_deleted_column(self):
+        self.processor.git_processor = MagicMock()
+        self.mock_bigquery_repo.has_column.return_value = False
+
+        with self.assertRaises(BigQueryError):
+            self.processor.process_deletion("/repo", "old.py")
+
+        self.mock_bigquery_repo.create.assert_not_called()
+        self.processor.git_processor.deleted_file_info.assert_not_called()
+
+    def test_identical_concurrent_requests_share_one_api_call(self):
+        release = threading.Event()
+        calls = []
+
+        def post_analysis(github_link, data):
+            calls.append(github_link)
+            release.wait(5)
+            return {"analysis": {"assessment": {"overall_compliance_score": 90}}}
+
+        results = {}
+
+        def analyze(link):
+            results[link] = self.processor._call_analysis_api(link, "x = 1", "Python")
+
+        with patch.object(self.processor, "_post_analysis", side_effect=post_analysis):
+            threads = [
+                threading.Thread(target=analyze, args=(f"https://github.com/o/r{i}",))
+                for i in range(3)
+            ]
+            for thread in threads:
+                thread.start()
+            while self.processor.single_flight.calls < 3:
+                release.wait(0.01)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.processor.single_flight.collapsed, 2)
+        self.assertEqual(len(results), 3)
+        responses = list(results.values())
+        self.assertEqual(responses[0], responses[1])
+        self.assertIsNot(responses[0], responses[1])
+
+    def test_analysis_requests_are_admitted_and_settled(self):
+        usage = {"total_token_count": 1234}
+
+        with patch.object(
+            self.processor,
+            "_post_analysis",
+            return_value={"analysis": {}, "usage_metadata": usage},
+        ):
+            self.processor._call_analysis_api(
+                "https://github.com/o/r", "x = 1", "Python"
+            )
+
+        stats = self.processor.token_budget.stats()
+        self.assertEqual(stats["requests"], 1)
+        self.assertGreater(stats["estimated_tokens"], 0)
+        self.assertEqual(stats["actual_tokens"], 1234)
+
+    def test_retried_analysis_requests_are_charged(self):
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"analysis": {}}
+        response.raw.retries.history = (
+            MagicMock(status=429),
+            MagicMock(status=None),
+        )
+        self.processor.api_client = MagicMock()
+        self.processor.api_client.post_json.return_value = response
+
+        self.processor._post_analysis(
+            "https://github.com/o/r", {"code": "x = 1", "language": "Python"}
+        )
+
+        # The 429 reached the API; the connection error did not.
+        self.assertEqual(self.processor.token_budget.stats()["requests"], 1)
+
+    def test_prompt_overhead_counts_characters_of_every_line(self):
+        # Twice the system instructions ("Test\ninstructions\n"), plus both
+        # prompt templates.
+        self.assertEqual(
+            self.processor.prompt_overhead_chars,
+            2 * 18 + len("Test eval prompt") + len("Test json prompt"),
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -16,6 +16,8 @@ class TestCodeProcessorHappyPath(unittest.TestCase):
         self.processor = CodeProcessor(
             self.settings, self.mock_client, self.mock_prompts
         )
+        self.processor.region_tag_index = MagicMock()
+        self.processor.region_tag_index.region_tags_for_file.return_value = []
 
     @patch(
         "tools.code_processor.CodeProcessor._read_raw_code", return_value="some code"
@@ -1,9 +1,10 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 import os
 import subprocess
 import tempfile
 import shutil
+from tools.code_processor import CodeProcessor
 from tools.git_file_processor import GitFileProcessor
 from utils.exceptions import GitProcessorError
 
@@ -150,3 +151,21 @@ class TestGitFileProcessorIntegration(unittest.TestCase):
         self.assertEqual(
             result["commit_history"][0]["author_email"], "test@example.com"
         )
+
+    def test_code_processor_cpu_pool_matches_inline(self):
+        settings = MagicMock(
+            CPU_WORKERS=1,
+            API_URL="http://localhost",
+            API_HEDGE_PERCENTILE=0,
+            API_LATENCY_HISTORY_PATH="",
+        )
+        processor = CodeProcessor(settings, None, {})
+        try:
+            pooled = processor._get_git_info(self.file_path)
+        finally:
+            processor.close()
+
+        inline = GitFileProcessor().execute(self.file_path)
+        pooled["metadata"].pop("created")
+        inline["metadata"].pop("created")
+        self.assertEqual(pooled, inline)
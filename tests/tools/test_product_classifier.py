@@ -0,0 +1,68 @@
+import unittest
+from tools.product_classifier import ProductClassifier
+
+
+class TestProductClassifier(unittest.TestCase):
+    def setUp(self):
+        self.classifier = ProductClassifier()
+
+    def test_region_tag_and_import_agree(self):
+        code = (
+            "// [START spanner_query_with_timestamp]\n"
+            "using Google.Cloud.Spanner.Data;\n"
+            "// [END spanner_query_with_timestamp]\n"
+        )
+
+        result = self.classifier.classify(code)
+
+        self.assertEqual(result["product_name"], "Spanner")
+        self.assertEqual(result["product_category"], "Databases")
+        self.assertEqual(result["region_tag"], "spanner_query_with_timestamp")
+
+    def test_versioned_python_import(self):
+        code = "# [START cloudtasks_create]\nfrom google.cloud import tasks_v2\n"
+
+        result = self.classifier.classify(code)
+
+        self.assertEqual(result["product_name"], "Cloud Tasks")
+
+    def test_node_and_go_imports(self):
+        node = "// [START pubsub_publish]\nconst {PubSub} = require('@google-cloud/pubsub');\n"
+        go = '// [START spanner_query]\nimport "cloud.google.com/go/spanner"\n'
+
+        self.assertEqual(self.classifier.classify(node)["product_name"], "Pub/Sub")
+        self.assertEqual(self.classifier.classify(go)["product_name"], "Spanner")
+
+    def test_disagreement_is_left_to_api(self):
+        code = "# [START spanner_query]\nfrom google.cloud import bigquery\n"
+
+        self.assertIsNone(self.classifier.classify(code))
+
+    def test_multiple_products_are_left_to_api(self):
+        code = "# [START spanner_query]\nfrom google.cloud import spanner, bigquery\n"
+
+        self.assertIsNone(self.classifier.classify(code))
+
+    def test_no_region_tags(self):
+        self.assertIsNone(
+            self.classifier.classify("from google.cloud import spanner\n")
+        )
+
+    def test_short_region_tag_prefixes(self):
+        gae = "# [START gae_users_api]\nfrom google.appengine.api import users\n"
+        gce = "# [START gce_create_instance]\nfrom google.cloud import compute_v1\n"
+
+        self.assertEqual(self.classifier.classify(gae)["product_name"], "App Engine")
+        self.assertEqual(
+            self.classifier.classify(gce)["product_name"], "Compute Engine"
+        )
+
+    def test_hierarchy_is_loaded_once(self):
+        self.assertIs(
+            ProductClassifier()._keyword_to_product,
+            self.classifier._keyword_to_product,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+from config import settings
+from tools.evaluate_code_file import CodeEvaluator
+from tools.prompt_cache import PromptCache
+
+
+class TestPromptCache(unittest.TestCase):
+    def setUp(self):
+        self.mock_client = MagicMock()
+        self.mock_client.caches.create.return_value.name = "cachedContents/123"
+        self.cache = PromptCache(settings, self.mock_client, ["Test instructions"])
+
+    def test_get_creates_once_and_reuses(self):
+        first = self.cache.get("json_conversion")
+        second = self.cache.get("json_conversion")
+
+        self.assertEqual(first, "cachedContents/123")
+        self.assertEqual(second, "cachedContents/123")
+        self.mock_client.caches.create.assert_called_once()
+        self.assertEqual(self.cache.hits, 2)
+        self.assertEqual(self.cache.misses, 0)
+
+    def test_get_falls_back_when_creation_fails(self):
+        self.mock_client.caches.create.side_effect = Exception("Too few tokens")
+
+        self.assertIsNone(self.cache.get("json_conversion"))
+        self.assertIsNone(self.cache.get("json_conversion"))
+
+        # Caching is disabled after the first failure rather than retried.
+        self.mock_client.caches.create.assert_called_once()
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_close_deletes_cached_content(self):
+        self.cache.get("grounding")
+        self.cache.close()
+
+        self.mock_client.caches.delete.assert_called_once_with(
+            name="cachedContents/123"
+        )
+
+    def test_short_ttl_is_still_reused(self):
+        with patch.object(settings, "PROMPT_CACHE_TTL_SECONDS", 30):
+            cache = PromptCache(settings, self.mock_client, ["Test instructions"])
+
+        cache.get("grounding")
+        cache.get("grounding")
+
+        self.mock_client.caches.create.assert_called_once()
+
+    def test_refresh_deletes_the_superseded_cache(self):
+        first, second = MagicMock(), MagicMock()
+        first.name, second.name = "cachedContents/1", "cachedContents/2"
+        self.mock_client.caches.create.side_effect = [first, second]
+        self.cache.get("grounding")
+        self.cache._entries["grounding"]["expires_at"] = 0
+
+        self.assertEqual(self.cache.get("grounding"), "cachedContents/2")
+        self.mock_client.caches.delete.assert_called_once_with(name="cachedContents/1")
+
+    def test_concurrent_gets_share_one_creation(self):
+        release = threading.Event()
+
+        def create(**kwargs):
+            release.wait(5)
+            return MagicMock()
+
+        self.mock_client.caches.create.side_effect = create
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.cache.get("grounding")))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        while not self.cache._creating:
+            release.wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.mock_client.caches.create.assert_called_once()
+        self.assertEqual(len(results), 3)
+        self.assertEqual(len(set(results)), 1)
+
+
+class TestCodeEvaluatorPromptCache(unittest.TestCase):
+    def setUp(self):
+        self.mock_client = MagicMock()
+        self.mock_client.models.generate_content.return_value.text = "{}"
+        self.prompt_cache = MagicMock()
+        self.evaluator = CodeEvaluator(
+            config=settings,
+            client=self.mock_client,
+            system_instructions=["Test instructions"],
+            consolidated_eval_prompt="{{code}}",
+            json_conversion_prompt="{{text}}",
+            prompt_cache=self.prompt_cache,
+        )
+
+    def test_uses_cached_content(self):
+        self.prompt_cache.get.return_value = "cachedContents/123"
+
+        self.evaluator._generate_content("json_conversion", "prompt", temperature=0.0)
+
+        config = self.mock_client.models.generate_content.call_args.kwargs["config"]
+        self.assertEqual(config.cached_content, "cachedContents/123")
+        self.assertIsNone(config.system_instruction)
+
+    def test_retries_inline_when_cached_request_fails(self):
+        self.prompt_cache.get.return_value = "cachedContents/123"
+        self.mock_client.models.generate_content.side_effect = [
+            Exception("Cache expired"),
+            MagicMock(text="{}"),
+        ]
+
+        self.evaluator._generate_content("json_conversion", "prompt", temperature=0.0)
+
+        self.prompt_cache.invalidate.assert_called_once_with(
+            "json_conversion", "cachedContents/123"
+        )
+        config = self.mock_client.models.generate_content.call_args.kwargs["config"]
+        self.assertIsNone(config.cached_content)
+        self.assertEqual(config.system_instruction, ["Test instructions"])
+
+    def test_other_errors_are_not_retried_inline(self):
+        self.prompt_cache.get.return_value = "cachedContents/123"
+        self.mock_client.models.generate_content.side_effect = Exception(
+            "429 RESOURCE_EXHAUSTED"
+        )
+
+        with self.assertRaises(Exception):
+            self.evaluator._generate_content(
+                "json_conversion", "prompt", temperature=0.0
+            )
+
+        self.prompt_cache.invalidate.assert_not_called()
+        self.mock_client.models.generate_content.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
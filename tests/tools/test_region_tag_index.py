@@ -0,0 +1,115 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from tools.region_tag_index import (
+    INDEX_FILENAME,
+    RegionTagIndex,
+    RegionTagIndexCache,
+    scan_region_tags,
+)
+
+SAMPLE = """// Copyright header
+// [START spanner_query]
+query();
+// [START spanner_query_inner]
+inner();
+// [END spanner_query_inner]
+// [END spanner_query]
+"""
+
+
+class TestScanRegionTags(unittest.TestCase):
+    def test_nested_regions(self):
+        regions = scan_region_tags(SAMPLE.splitlines(keepends=True))
+
+        self.assertEqual(
+            [(r["tag"], r["start_line"], r["end_line"]) for r in regions],
+            [("spanner_query", 2, 7), ("spanner_query_inner", 4, 6)],
+        )
+
+    def test_hash_ignores_lines_outside_region(self):
+        changed_header = SAMPLE.replace("Copyright header", "Changed header")
+
+        before = scan_region_tags(SAMPLE.splitlines(keepends=True))
+        after = scan_region_tags(changed_header.splitlines(keepends=True))
+
+        self.assertEqual(before, after)
+
+    def test_hash_changes_with_region_body(self):
+        changed_body = SAMPLE.replace("inner();", "inner(1);")
+
+        before = scan_region_tags(SAMPLE.splitlines(keepends=True))
+        after = scan_region_tags(changed_body.splitlines(keepends=True))
+
+        self.assertNotEqual(before[0]["hash"], after[0]["hash"])
+        self.assertNotEqual(before[1]["hash"], after[1]["hash"])
+
+    def test_unterminated_region_is_ignored(self):
+        self.assertEqual(scan_region_tags(["// [START lonely]\n", "code\n"]), [])
+
+
+class TestRegionTagIndex(unittest.TestCase):
+    def setUp(self):
+        self.repo_dir = tempfile.mkdtemp()
+        subprocess.check_call(["git", "init", "-q", self.repo_dir])
+        os.makedirs(os.path.join(self.repo_dir, "spanner"))
+        self.file_path = os.path.join(self.repo_dir, "spanner", "query.js")
+        with open(self.file_path, "w") as f:
+            f.write(SAMPLE)
+
+    def tearDown(self):
+        shutil.rmtree(self.repo_dir)
+
+    def test_build_persist_and_lookup(self):
+        index = RegionTagIndex.load_or_build(self.repo_dir)
+
+        self.assertTrue(
+            os.path.exists(os.path.join(self.repo_dir, ".git", INDEX_FILENAME))
+        )
+        self.assertEqual(
+            [r["tag"] for r in index.regions_for_file(self.file_path)],
+            ["spanner_query", "spanner_query_inner"],
+        )
+        self.assertEqual(index.lookup("spanner_query")[0]["file"], "spanner/query.js")
+
+    def test_build_skips_dependencies_binaries_and_other_files(self):
+        skipped = {
+            os.path.join("node_modules", "dep", "index.js"): SAMPLE,
+            "notes.txt": SAMPLE,
+            "blob.py": SAMPLE + "\0",
+        }
+        for relative_path, content in skipped.items():
+            path = os.path.join(self.repo_dir, relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(content)
+
+        index = RegionTagIndex.load_or_build(self.repo_dir)
+
+        self.assertEqual(list(index.by_file), ["spanner/query.js"])
+
+    def test_modified_file_is_rescanned(self):
+        index = RegionTagIndex.load_or_build(self.repo_dir)
+        with open(self.file_path, "w") as f:
+            f.write("// [START renamed]\n// [END renamed]\n")
+        os.utime(self.file_path, (0, 12345))
+
+        self.assertEqual(
+            [r["tag"] for r in index.regions_for_file(self.file_path)], ["renamed"]
+        )
+        self.assertEqual(index.lookup("spanner_query"), [])
+
+    def test_cache_returns_tag_names_for_file(self):
+        cache = RegionTagIndexCache()
+
+        self.assertEqual(
+            cache.region_tags_for_file(self.file_path),
+            ["spanner_query", "spanner_query_inner"],
+        )
+        self.assertIs(cache.get(self.file_path), cache.get(self.file_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
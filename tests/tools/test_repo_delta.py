@@ -0,0 +1,100 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from tools.git_file_processor import GitFileProcessor
+from tools.repo_delta import changes_between, plan_delta, record_delta
+from utils.exceptions import GitProcessorError
+
+TABLE_ID = "project.dataset.repo_analysis"
+
+
+class TestRepoDelta(unittest.TestCase):
+    def setUp(self):
+        self.repo_dir = os.path.realpath(tempfile.mkdtemp())
+        self._git("init", "-q")
+        self._git("config", "user.email", "dev@example.com")
+        self._git("config", "user.name", "Dev")
+        self._git("remote", "add", "origin", "https://github.com/example/samples.git")
+        for name in ["a.py", "b.py", "c.py"]:
+            self._write(name, f"print('{name}')\n")
+        self._commit("initial")
+
+    def tearDown(self):
+        shutil.rmtree(self.repo_dir)
+
+    def _git(self, *args):
+        return subprocess.check_output(["git", *args], cwd=self.repo_dir).decode()
+
+    def _write(self, name, content):
+        with open(os.path.join(self.repo_dir, name), "w") as f:
+            f.write(content)
+
+    def _commit(self, message):
+        self._git("add", "-A")
+        self._git("commit", "-q", "-m", message)
+        return self._git("rev-parse", "HEAD").strip()
+
+    def _files(self):
+        return sorted(
+            os.path.join(self.repo_dir, name)
+            for name in os.listdir(self.repo_dir)
+            if name.endswith(".py")
+        )
+
+    def test_first_run_analyzes_everything_then_nothing(self):
+        files, plans = plan_delta(self._files(), TABLE_ID)
+        self.assertEqual(files, self._files())
+        record_delta(plans[0], TABLE_ID)
+
+        files, plans = plan_delta(self._files(), TABLE_ID)
+
+        self.assertEqual(files, [])
+        self.assertEqual(plans[0].deleted, [])
+
+    def test_only_changes_are_analyzed_and_deletions_listed(self):
+        _, plans = plan_delta(self._files(), TABLE_ID)
+        record_delta(plans[0], TABLE_ID)
+        self._write("a.py", "print('changed')\n")
+        self._git("mv", "b.py", "renamed.py")
+        self._git("rm", "-q", "c.py")
+        self._write("new.py", "print('new')\n")
+        self._commit("change")
+
+        files, plans = plan_delta(self._files(), TABLE_ID)
+
+        self.assertEqual(
+            [os.path.basename(f) for f in files], ["a.py", "new.py", "renamed.py"]
+        )
+        self.assertEqual(plans[0].deleted, ["b.py", "c.py"])
+
+    def test_state_is_kept_per_table(self):
+        _, plans = plan_delta(self._files(), TABLE_ID)
+        record_delta(plans[0], TABLE_ID)
+
+        files, _ = plan_delta(self._files(), "project.dataset.other")
+
+        self.assertEqual(files, self._files())
+
+    def test_unknown_base_cannot_be_diffed(self):
+        with self.assertRaises(GitProcessorError):
+            changes_between(self.repo_dir, "0" * 40, "HEAD")
+
+    def test_deleted_file_info(self):
+        self._git("rm", "-q", "c.py")
+        self._commit("delete c")
+
+        info = GitFileProcessor().deleted_file_info(self.repo_dir, "c.py")
+
+        branch = self._git("rev-parse", "--abbrev-ref", "HEAD").strip()
+        self.assertEqual(
+            info["github_link"],
+            f"https://github.com/example/samples/blob/{branch}/c.py",
+        )
+        self.assertIsNotNone(info["last_updated"])
+        self.assertTrue(info["metadata"]["deleted"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+from tools.work_order import order_files
+from utils.exceptions import BigQueryError
+from utils.scheduling import LatencyHistory
+
+
+class TestOrderFiles(unittest.TestCase):
+    def setUp(self):
+        self.repo_dir = os.path.realpath(tempfile.mkdtemp())
+        self._git("init", "-q")
+        self._git("remote", "add", "origin", "https://github.com/example/samples.git")
+        self.files = [
+            self._write("small.py", 10),
+            self._write("large.py", 1000),
+            self._write("medium.java", 100),
+        ]
+        self._git("add", "-A")
+        self._git(
+            "-c",
+            "user.name=Dev",
+            "-c",
+            "user.email=dev@example.com",
+            "commit",
+            "-q",
+            "-m",
+            "initial",
+        )
+        self.branch = self._git("rev-parse", "--abbrev-ref", "HEAD").strip()
+
+    def tearDown(self):
+        shutil.rmtree(self.repo_dir)
+
+    def _git(self, *args):
+        return subprocess.check_output(["git", *args], cwd=self.repo_dir).decode()
+
+    def _write(self, name, size):
+        path = os.path.join(self.repo_dir, name)
+        with open(path, "w") as f:
+            f.write("x" * size)
+        return path
+
+    def _link(self, name):
+        return f"https://github.com/example/samples/blob/{self.branch}/{name}"
+
+    def _names(self, files):
+        return [os.path.basename(f) for f in files]
+
+    def test_discovery_keeps_the_order(self):
+        self.assertEqual(order_files(self.files, "discovery"), self.files)
+
+    def test_longest_first_by_size_without_history(self):
+        ordered = order_files(
+            self.files, "longest-first", latency_history=LatencyHistory()
+        )
+
+        self.assertEqual(self._names(ordered), ["large.py", "medium.java", "small.py"])
+
+    def test_longest_first_uses_latency_per_language(self):
+        history = LatencyHistory()
+        history.record("Python", 1.0, 1000)
+        history.record("Java", 100.0, 1000)
+
+        ordered = order_files(self.files, "longest-first", latency_history=history)
+
+        self.assertEqual(self._names(ordered), ["medium.java", "large.py", "small.py"])
+
+    def test_stalest_first_puts_never_evaluated_files_first(self):
+        bigquery_repo = MagicMock()
+        bigquery_repo.last_evaluations.return_value = {
+            self._link("small.py"): datetime(2025, 6, 1, tzinfo=timezone.utc),
+            self._link("large.py"): datetime(2024, 1, 1, tzinfo=timezone.utc),
+        }
+
+        ordered = order_files(self.files, "stalest-first", bigquery_repo=bigquery_repo)
+
+        self.assertEqual(self._names(ordered), ["medium.java", "large.py", "small.py"])
+        self.assertEqual(
+            set(bigquery_repo.last_evaluations.call_args.args[0]),
+            {self._link(name) for name in ["small.py", "large.py", "medium.java"]},
+        )
+
+    def test_stalest_first_keeps_the_order_if_bigquery_fails(self):
+        bigquery_repo = MagicMock()
+        bigquery_repo.last_evaluations.side_effect = BigQueryError("unavailable")
+
+        ordered = order_files(self.files, "stalest-first", bigquery_repo=bigquery_repo)
+
+        self.assertEqual(ordered, self.files)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import patch
+from utils.admission import TokenBudget, text_chars
+
+
+@patch("utils.admission.time.sleep")
+class TestTokenBudget(unittest.TestCase):
+    def test_unlimited_budget_never_waits(self, mock_sleep):
+        budget = TokenBudget()
+
+        for _ in range(3):
+            budget.admit(10**6)
+
+        mock_sleep.assert_not_called()
+        self.assertEqual(budget.stats()["estimated_tokens"], 3 * 10**6)
+
+    def test_waits_once_tokens_per_minute_are_spent(self, mock_sleep):
+        # 6000 TPM refills 100 tokens a second.
+        budget = TokenBudget(tokens_per_minute=6000)
+
+        self.assertEqual(budget.admit(6000).waited, 0)
+        admission = budget.admit(500)
+
+        self.assertAlmostEqual(admission.waited, 5.0, delta=0.1)
+        mock_sleep.assert_called_once()
+        # A later caller queues behind the reservation.
+        self.assertAlmostEqual(budget.admit(100).waited, 6.0, delta=0.1)
+
+    def test_waits_once_requests_per_minute_are_spent(self, mock_sleep):
+        budget = TokenBudget(requests_per_minute=60)
+
+        waits = [budget.admit(1).waited for _ in range(61)]
+
+        self.assertEqual(max(waits[:60]), 0)
+        self.assertAlmostEqual(waits[60], 1.0, delta=0.1)
+
+    def test_settle_refunds_an_overestimate(self, mock_sleep):
+        budget = TokenBudget(tokens_per_minute=6000)
+        admission = budget.admit(6000)
+
+        budget.settle(admission, 1000)
+
+        self.assertEqual(budget.admit(4000).waited, 0)
+        stats = budget.stats()
+        self.assertEqual(stats["actual_tokens"], 1000)
+        self.assertEqual(stats["reported_charged_tokens"], 6000)
+
+    def test_settle_calibrates_later_estimates_per_kind(self, mock_sleep):
+        budget = TokenBudget()
+
+        for _ in range(50):
+            budget.settle(budget.admit(1000, kind="analysis"), 2000)
+        calibrated = budget.admit(1000, kind="analysis")
+
+        self.assertAlmostEqual(calibrated.charged, 2000, delta=20)
+        self.assertEqual(budget.admit(1000, kind="categorize").charged, 1000)
+
+    def test_unreported_usage_keeps_the_estimate(self, mock_sleep):
+        budget = TokenBudget()
+
+        budget.settle(budget.admit(1000), None)
+
+        self.assertEqual(budget.stats()["reported_requests"], 0)
+        self.assertEqual(budget.admit(1000).charged, 1000)
+
+    def test_try_admit_refuses_while_in_deficit(self, mock_sleep):
+        budget = TokenBudget(tokens_per_minute=6000)
+
+        self.assertIsNotNone(budget.try_admit(4000))
+        self.assertIsNone(budget.try_admit(4000))
+
+        mock_sleep.assert_not_called()
+        self.assertEqual(budget.stats()["charged_tokens"], 4000)
+
+    def test_charge_takes_without_waiting_and_delays_later_callers(self, mock_sleep):
+        budget = TokenBudget(tokens_per_minute=6000)
+
+        budget.charge(6000)
+        budget.charge(500)
+
+        mock_sleep.assert_not_called()
+        self.assertAlmostEqual(budget.admit(100).waited, 6.0, delta=0.1)
+
+    def test_text_chars_counts_lines_as_characters(self, mock_sleep):
+        self.assertEqual(text_chars("abc"), 3)
+        self.assertEqual(text_chars(["ab", "cde"]), len("ab\ncde\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
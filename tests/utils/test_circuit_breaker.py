@@ -0,0 +1,102 @@
+import threading
+import time
+import unittest
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from utils.exceptions import CircuitOpenError
+
+
+class Outage(Exception):
+    pass
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def _failing_call(self, breaker):
+        def fail():
+            raise Outage()
+
+        with self.assertRaises(Outage):
+            breaker.call(fail)
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("api", failure_threshold=3, reset_timeout=60)
+
+        self._failing_call(breaker)
+        self._failing_call(breaker)
+        breaker.call(lambda: "ok")  # A success resets the count.
+        self._failing_call(breaker)
+        self._failing_call(breaker)
+        self.assertEqual(breaker.state, CLOSED)
+        self._failing_call(breaker)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_non_failures_do_not_count(self):
+        breaker = CircuitBreaker(
+            "api", failure_threshold=1, is_failure=lambda e: isinstance(e, Outage)
+        )
+
+        with self.assertRaises(ValueError):
+            breaker.call(self._raise_value_error)
+
+        self.assertEqual(breaker.state, CLOSED)
+
+    def _raise_value_error(self):
+        raise ValueError()
+
+    def test_single_probe_closes_and_releases_waiters(self):
+        breaker = CircuitBreaker("api", failure_threshold=1, reset_timeout=0.05)
+        self._failing_call(breaker)
+        probe_started = threading.Event()
+        release_probe = threading.Event()
+        calls = []
+
+        def call(name):
+            def fn():
+                calls.append(name)
+                if name == "probe":
+                    probe_started.set()
+                    release_probe.wait(5)
+                return name
+
+            return breaker.call(fn)
+
+        probe = threading.Thread(target=call, args=("probe",))
+        probe.start()
+        self.assertTrue(probe_started.wait(5))
+        self.assertEqual(breaker.state, HALF_OPEN)
+        waiter = threading.Thread(target=call, args=("waiter",))
+        waiter.start()
+        time.sleep(0.1)
+        # The waiter is held back while the probe is in flight.
+        self.assertEqual(calls, ["probe"])
+
+        release_probe.set()
+        probe.join(5)
+        waiter.join(5)
+
+        self.assertEqual(calls, ["probe", "waiter"])
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker("bigquery", failure_threshold=1, reset_timeout=0.01)
+        self._failing_call(breaker)
+
+        self._failing_call(breaker)
+
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.stats()["transitions"], 3)
+
+    def test_gives_up_after_max_outage(self):
+        breaker = CircuitBreaker(
+            "api", failure_threshold=1, reset_timeout=10, max_outage=0.05
+        )
+        self._failing_call(breaker)
+
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(lambda: "ok")
+        with self.assertRaises(CircuitOpenError):
+            breaker.check()
+        self.assertTrue(breaker.gave_up)
+
+
+if __name__ == "__main__":
+    unittest.main()
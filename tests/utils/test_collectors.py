@@ -0,0 +1,124 @@
+import csv
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from utils.collectors import RunStats, StreamingCsvWriter, read_completed
+
+
+class TestRunStats(unittest.TestCase):
+    def test_totals_merges_thread_local_counters(self):
+        stats = RunStats()
+
+        def work(i):
+            stats.increment("processed" if i % 2 else "skipped", ".py")
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(work, range(10000)))
+
+        totals = stats.totals()
+        self.assertEqual(totals["processed"][".py"], 5000)
+        self.assertEqual(totals["skipped"][".py"], 5000)
+        self.assertEqual(sum(totals["errored"].values()), 0)
+
+
+class TestStreamingCsvWriter(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.output_dir, "out.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def _read(self, path):
+        with open(path, newline="") as f:
+            return list(csv.DictReader(f))
+
+    def test_rows_written_whole_from_many_threads(self):
+        writer = StreamingCsvWriter(self.output_path, ["id", "value"])
+
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            list(
+                executor.map(
+                    lambda i: writer.writerow({"id": i, "value": "x" * 500}),
+                    range(2000),
+                )
+            )
+        writer.close()
+
+        rows = self._read(self.output_path)
+        self.assertEqual(len(rows), 2000)
+        self.assertEqual({int(row["id"]) for row in rows}, set(range(2000)))
+        self.assertTrue(all(row["value"] == "x" * 500 for row in rows))
+
+    def test_flushes_every_n_rows_before_close(self):
+        writer = StreamingCsvWriter(
+            self.output_path, ["id"], flush_rows=2, flush_interval=60
+        )
+        writer.writerow({"id": 1})
+        writer.writerow({"id": 2})
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if (
+                os.path.exists(self.output_path)
+                and len(self._read(self.output_path)) == 2
+            ):
+                break
+            time.sleep(0.01)
+        writer.close()
+
+        self.assertEqual(len(self._read(self.output_path)), 2)
+
+    def test_resume_appends_without_duplicate_header(self):
+        writer = StreamingCsvWriter(self.output_path, ["file_path"])
+        writer.writerow({"file_path": "/a.py"})
+        writer.close()
+
+        self.assertEqual(read_completed(self.output_path, "file_path"), {"/a.py"})
+
+        writer = StreamingCsvWriter(self.output_path, ["file_path"])
+        writer.writerow({"file_path": "/b.py"})
+        writer.close()
+
+        rows = self._read(self.output_path)
+        self.assertEqual([row["file_path"] for row in rows], ["/a.py", "/b.py"])
+
+    def test_resume_refuses_a_different_header(self):
+        writer = StreamingCsvWriter(self.output_path, ["file_path"])
+        writer.writerow({"file_path": "/a.py"})
+        writer.close()
+
+        with self.assertRaises(ValueError):
+            StreamingCsvWriter(self.output_path, ["file_path", "product_name"])
+
+    def test_writer_errors_are_raised(self):
+        writer = StreamingCsvWriter(self.output_path, ["id"], flush_rows=1)
+        with patch("utils.collectors.os.fsync", side_effect=OSError("disk full")):
+            writer.writerow({"id": 1})
+            writer._thread.join(5)
+
+        with self.assertRaises(OSError):
+            writer.writerow({"id": 2})
+        with self.assertRaises(OSError):
+            writer.close()
+
+    def test_shard_by_column(self):
+        shard_dir = os.path.join(self.output_dir, "shards")
+        writer = StreamingCsvWriter(shard_dir, ["repo", "file_path"], shard_by="repo")
+        writer.writerow({"repo": "one", "file_path": "/a.py"})
+        writer.writerow({"repo": "two", "file_path": "/b.py"})
+        writer.close()
+
+        self.assertEqual(sorted(os.listdir(shard_dir)), ["one.csv", "two.csv"])
+        self.assertEqual(read_completed(shard_dir, "file_path"), {"/a.py", "/b.py"})
+
+    def test_read_completed_missing_output(self):
+        self.assertEqual(read_completed(self.output_path, "file_path"), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+from utils.exceptions import BinaryFileError, FileReadError, FileTooLargeError
+from utils.file_reader import MMAP_THRESHOLD_BYTES, check_source_file, read_source_file
+
+
+class TestFileReader(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_reads_utf8_and_normalizes_line_endings(self):
+        path = self._write("a.py", "print('héllo')\r\nx = 1\r".encode("utf-8"))
+
+        self.assertEqual(read_source_file(path), "print('héllo')\nx = 1\n")
+
+    def test_detects_bom_and_legacy_encodings(self):
+        utf16 = self._write("b.py", "print('hi')\n".encode("utf-16"))
+        cp1252 = self._write("c.py", "# café – ok\n".encode("cp1252"))
+
+        self.assertEqual(read_source_file(utf16), "print('hi')\n")
+        self.assertEqual(read_source_file(cp1252), "# café – ok\n")
+
+    def test_large_files_are_read_through_mmap(self):
+        text = "é = 1\n" * (MMAP_THRESHOLD_BYTES // 4)
+        path = self._write("big.py", text.encode("latin-1"))
+
+        self.assertEqual(read_source_file(path), text)
+
+    def test_rejects_binary_and_oversized_files(self):
+        binary = self._write("d.py", b"\x7fELF\x00\x01")
+        large = self._write("e.py", b"x" * 100)
+
+        with self.assertRaises(BinaryFileError):
+            read_source_file(binary)
+        with self.assertRaises(BinaryFileError):
+            check_source_file(binary, max_bytes=1000)
+        with self.assertRaises(FileTooLargeError):
+            read_source_file(large, max_bytes=10)
+        with self.assertRaises(FileTooLargeError):
+            check_source_file(large, max_bytes=10)
+
+    def test_missing_file_raises_typed_error(self):
+        missing = os.path.join(self.directory, "missing.py")
+
+        # The pre-check leaves I/O errors to the full read.
+        check_source_file(missing, max_bytes=10)
+        with self.assertRaises(FileReadError):
+            read_source_file(missing)
+
+    def test_phrase_in_file_is_not_an_error(self):
+        path = self._write("f.py", b'print("Error reading file")\n')
+
+        self.assertEqual(read_source_file(path), 'print("Error reading file")\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import threading
+import time
+import unittest
+from utils.hedging import Hedger
+
+
+class TestHedger(unittest.TestCase):
+    def _warm_up(self, hedger, samples=10):
+        for _ in range(samples):
+            hedger.call(lambda: None)
+
+    def test_disabled_runs_inline(self):
+        hedger = Hedger(percentile=0)
+        thread = hedger.call(threading.current_thread)
+
+        self.assertIs(thread, threading.current_thread())
+        self.assertEqual(hedger.stats()["calls"], 0)
+
+    def test_slow_call_is_hedged_and_fast_attempt_wins(self):
+        hedger = Hedger(percentile=90, budget=1.0, min_samples=10)
+        self._warm_up(hedger)
+        attempts = []
+
+        def call():
+            attempts.append(None)
+            if len(attempts) == 1:
+                time.sleep(0.5)
+                return "slow"
+            return "fast"
+
+        start = time.monotonic()
+        result = hedger.call(call)
+
+        self.assertEqual(result, "fast")
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(hedger.stats()["hedges"], 1)
+        self.assertEqual(hedger.stats()["hedge_wins"], 1)
+        hedger.close(wait=True)
+
+    def test_failed_attempt_falls_back_to_the_other(self):
+        hedger = Hedger(percentile=90, budget=1.0, min_samples=10)
+        self._warm_up(hedger)
+        attempts = []
+
+        def call():
+            attempts.append(None)
+            if len(attempts) == 1:
+                time.sleep(0.05)
+                return "primary"
+            raise RuntimeError("hedge failed")
+
+        self.assertEqual(hedger.call(call), "primary")
+        hedger.close(wait=True)
+
+    def test_budget_caps_hedges(self):
+        hedger = Hedger(percentile=50, budget=0.1, min_samples=10)
+        self._warm_up(hedger)
+
+        for _ in range(10):
+            hedger.call(time.sleep, 0.02)
+
+        # 20 calls at a 10% budget allow at most two hedges.
+        self.assertLessEqual(hedger.stats()["hedges"], 2)
+        hedger.close(wait=True)
+
+    def test_refused_hedge_is_not_sent(self):
+        asked = []
+        hedger = Hedger(
+            percentile=50,
+            budget=1.0,
+            min_samples=10,
+            admit_hedge=lambda *args: asked.append(args) or False,
+        )
+        self._warm_up(hedger)
+
+        hedger.call(time.sleep, 0.05)
+
+        self.assertEqual(asked, [(0.05,)])
+        self.assertEqual(hedger.stats()["hedges"], 0)
+        hedger.close(wait=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import requests
+from utils.exceptions import (
+    APIError,
+    BigQueryError,
+    CircuitOpenError,
+    FileReadError,
+    GitProcessorError,
+)
+from utils.retry import (
+    API_CLIENT_ERROR,
+    API_RATE_LIMITED,
+    API_SERVER_ERROR,
+    API_TIMEOUT,
+    BIGQUERY_ERROR,
+    BIGQUERY_QUOTA,
+    CIRCUIT_OPEN,
+    FILE_READ_ERROR,
+    GIT_ERROR,
+    UNEXPECTED,
+    RetryQueue,
+    classify_failure,
+)
+
+
+def _raise_from(outer, inner):
+    try:
+        try:
+            raise inner
+        except Exception as e:
+            raise outer from e
+    except Exception as e:
+        return e
+
+
+def _http_error(status):
+    response = MagicMock(status_code=status)
+    return requests.exceptions.HTTPError(response=response)
+
+
+class FakeGoogleError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class TestClassifyFailure(unittest.TestCase):
+    def test_api_timeout_is_transient(self):
+        exc = _raise_from(APIError("timed out"), requests.exceptions.Timeout())
+        self.assertEqual(classify_failure(exc), (API_TIMEOUT, True))
+
+    def test_api_status_codes(self):
+        self.assertEqual(
+            classify_failure(_raise_from(APIError("x"), _http_error(503))),
+            (API_SERVER_ERROR, True),
+        )
+        self.assertEqual(
+            classify_failure(_raise_from(APIError("x"), _http_error(429))),
+            (API_RATE_LIMITED, True),
+        )
+        self.assertEqual(
+            classify_failure(_raise_from(APIError("x"), _http_error(400))),
+            (API_CLIENT_ERROR, False),
+        )
+
+    def test_bigquery_quota_is_transient(self):
+        exc = _raise_from(
+            BigQueryError("insert failed"), FakeGoogleError(403, "Quota exceeded")
+        )
+        self.assertEqual(classify_failure(exc), (BIGQUERY_QUOTA, True))
+
+    def test_bigquery_bad_request_is_permanent(self):
+        exc = _raise_from(BigQueryError("insert failed"), FakeGoogleError(400, "Bad"))
+        self.assertEqual(classify_failure(exc), (BIGQUERY_ERROR, False))
+
+    def test_permanent_failures(self):
+        self.assertEqual(classify_failure(GitProcessorError("x")), (GIT_ERROR, False))
+        self.assertEqual(classify_failure(FileReadError("x")), (FILE_READ_ERROR, False))
+        self.assertEqual(classify_failure(ValueError("x")), (UNEXPECTED, False))
+        self.assertEqual(classify_failure(CircuitOpenError("x")), (CIRCUIT_OPEN, False))
+
+    def test_bare_requests_errors(self):
+        self.assertEqual(
+            classify_failure(requests.exceptions.ConnectionError()),
+            ("api_connection", True),
+        )
+        self.assertEqual(classify_failure(_http_error(404)), (API_CLIENT_ERROR, False))
+
+
+class TestRetryQueue(unittest.TestCase):
+    def test_max_attempts_per_item(self):
+        queue = RetryQueue(max_attempts=2, budget=10, base_delay=0)
+
+        self.assertIsNotNone(queue.schedule("a.py", API_TIMEOUT))
+        self.assertIsNotNone(queue.schedule("a.py", API_TIMEOUT))
+        self.assertIsNone(queue.schedule("a.py", API_TIMEOUT))
+        self.assertEqual(queue.attempts("a.py"), 2)
+
+    def test_budget_caps_total_retries(self):
+        queue = RetryQueue(max_attempts=3, budget=2, base_delay=0)
+
+        granted = [queue.schedule(f"{i}.py", API_TIMEOUT) for i in range(5)]
+
+        self.assertEqual(sum(d is not None for d in granted), 2)
+        self.assertEqual(queue.retries_granted, 2)
+
+    def test_items_are_ready_after_their_delay(self):
+        queue = RetryQueue(base_delay=10, max_delay=10)
+        with patch("utils.retry.time.monotonic", return_value=100.0):
+            with patch("utils.retry.random.uniform", return_value=4.0):
+                queue.schedule("a.py", API_TIMEOUT)
+            self.assertIsNone(queue.pop_ready())
+            self.assertEqual(queue.next_ready_in(), 4.0)
+        with patch("utils.retry.time.monotonic", return_value=104.0):
+            self.assertEqual(queue.pop_ready(), "a.py")
+        self.assertEqual(len(queue), 0)
+        self.assertIsNone(queue.next_ready_in())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from utils.retry import RetryQueue
+from utils.scheduling import LatencyHistory, bounded_as_completed, longest_first
+
+
+class TestBoundedAsCompleted(unittest.TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.in_flight_bytes = 0
+        self.peak = 0
+        self.peak_bytes = 0
+
+    def _executor(self, max_workers, cost):
+        # Counts an item as in flight from submission until it finishes.
+        test = self
+
+        class TrackingExecutor(ThreadPoolExecutor):
+            def submit(self, fn, item):
+                with test.lock:
+                    test.in_flight += 1
+                    test.in_flight_bytes += cost(item)
+                    test.peak = max(test.peak, test.in_flight)
+                    test.peak_bytes = max(test.peak_bytes, test.in_flight_bytes)
+                return super().submit(fn, item)
+
+        return TrackingExecutor(max_workers=max_workers)
+
+    def _work(self, cost):
+        def run(item):
+            time.sleep(0.001)
+            with self.lock:
+                self.in_flight -= 1
+                self.in_flight_bytes -= cost(item)
+            return item
+
+        return run
+
+    def test_caps_items_in_flight_and_yields_everything(self):
+        cost = lambda item: 0  # noqa: E731
+        with self._executor(8, cost) as executor:
+            results = [
+                future.result()
+                for future in bounded_as_completed(
+                    executor, self._work(cost), range(500), 10
+                )
+            ]
+
+        self.assertEqual(sorted(results), list(range(500)))
+        self.assertLessEqual(self.peak, 10)
+
+    def test_caps_bytes_in_flight(self):
+        cost = lambda item: 100  # noqa: E731
+        with self._executor(8, cost) as executor:
+            list(
+                bounded_as_completed(
+                    executor,
+                    self._work(cost),
+                    range(200),
+                    max_in_flight=50,
+                    max_bytes=350,
+                    cost=cost,
+                )
+            )
+
+        self.assertLessEqual(self.peak_bytes, 350)
+        self.assertLessEqual(self.peak, 3)
+
+    def test_oversized_item_runs_alone(self):
+        cost = lambda item: 1000 if item == 2 else 1  # noqa: E731
+        with self._executor(4, cost) as executor:
+            results = [
+                future.result()
+                for future in bounded_as_completed(
+                    executor,
+                    self._work(cost),
+                    range(5),
+                    max_in_flight=5,
+                    max_bytes=10,
+                    cost=cost,
+                )
+            ]
+
+        self.assertEqual(sorted(results), list(range(5)))
+        # Nothing else was in flight while the oversized item ran.
+        self.assertEqual(self.peak_bytes, 1000)
+
+    def test_retried_items_run_again(self):
+        retries = RetryQueue(max_attempts=2, base_delay=0.01, max_delay=0.01)
+        calls = []
+
+        def flaky(item):
+            calls.append(item)
+            if item == 3 and calls.count(3) < 3:
+                retries.schedule(item, "api_timeout")
+                return "retry"
+            return item
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = [
+                future.result()
+                for future in bounded_as_completed(
+                    executor, flaky, range(5), 5, retries=retries
+                )
+            ]
+
+        self.assertEqual(calls.count(3), 3)
+        self.assertEqual(sorted(r for r in results if r != "retry"), list(range(5)))
+        self.assertEqual(retries.retries_granted, 2)
+
+
+class TestLatencyHistory(unittest.TestCase):
+    def test_estimates_by_language_with_a_global_fallback(self):
+        history = LatencyHistory()
+        history.record("Python", 1.0, 1000)
+        history.record("Java", 4.0, 1000)
+
+        self.assertAlmostEqual(history.estimate("Python", 2000), 2.0)
+        self.assertAlmostEqual(history.estimate("Java", 2000), 8.0)
+        # Unknown languages use the average over every call.
+        self.assertGreater(history.estimate("Go", 2000), 2.0)
+        self.assertLess(history.estimate("Go", 2000), 8.0)
+
+    def test_without_history_the_estimate_is_the_size(self):
+        self.assertEqual(LatencyHistory().estimate("Python", 500), 500.0)
+
+    def test_round_trips_through_disk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "logs", "api_latency.json")
+            history = LatencyHistory.load(path)
+            history.record("Python", 1.0, 1000)
+            history.save()
+
+            loaded = LatencyHistory.load(path)
+
+        self.assertAlmostEqual(loaded.seconds_per_byte("Python"), 0.001)
+        self.assertAlmostEqual(loaded.seconds_per_byte("Go"), 0.001)
+
+    def test_longest_first_keeps_ties_in_order(self):
+        sizes = {"a": 1, "b": 5, "c": 1, "d": 3}
+
+        self.assertEqual(longest_first("abcd", sizes.get), ["b", "d", "a", "c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
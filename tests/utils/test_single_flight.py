@@ -0,0 +1,77 @@
+import threading
+import unittest
+from utils.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def _run_concurrently(self, flight, key, fn, callers=4):
+        results = []
+        errors = []
+
+        def call():
+            try:
+                results.append(flight.do(key, fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(None)
+            started.set()
+            release.wait(5)
+            return {"score": [1, 2]}
+
+        threads, results, _ = self._run_concurrently(flight, "key", fn)
+        started.wait(5)
+        while flight.calls < 4:
+            release.wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.collapsed, 3)
+        self.assertEqual(results, [{"score": [1, 2]}] * 4)
+        # Every caller owns its result.
+        self.assertEqual(len({id(result) for result in results}), 4)
+
+    def test_exception_is_shared_and_key_is_released(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ValueError("boom")
+
+        threads, _, errors = self._run_concurrently(flight, "key", fail, callers=3)
+        while flight.calls < 3:
+            release.wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+        # Nothing is cached: the next call runs again.
+        self.assertEqual(flight.do("key", lambda: "fresh"), "fresh")
+
+    def test_different_keys_do_not_collapse(self):
+        flight = SingleFlight()
+
+        self.assertEqual(flight.do("a", lambda: 1), 1)
+        self.assertEqual(flight.do("b", lambda: 2), 2)
+        self.assertEqual(flight.collapsed, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
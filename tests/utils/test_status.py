@@ -0,0 +1,45 @@
+import json
+import unittest
+import urllib.error
+import urllib.request
+from utils.status import RunStatus, StatusServer
+
+
+class TestRunStatus(unittest.TestCase):
+    def test_tracks_queue_depth_and_throughput(self):
+        status = RunStatus()
+        status.start_cycle(3)
+        status.file_done("processed")
+
+        running = status.snapshot()
+        self.assertEqual(running["state"], "running")
+        self.assertEqual(running["queue_depth"], 2)
+        self.assertEqual(running["current_cycle"]["files_done"], 1)
+
+        status.file_done("skipped")
+        status.file_done("processed")
+        status.end_cycle()
+
+        idle = status.snapshot()
+        self.assertEqual(idle["state"], "idle")
+        self.assertEqual(idle["queue_depth"], 0)
+        self.assertEqual(idle["cycles"], 1)
+        self.assertEqual(idle["files_by_status"], {"processed": 2, "skipped": 1})
+        self.assertEqual(idle["last_cycle"]["files"], 3)
+        self.assertNotIn("current_cycle", idle)
+
+
+class TestStatusServer(unittest.TestCase):
+    def test_serves_snapshot_as_json(self):
+        server = StatusServer(0, lambda: {"queue_depth": 7})
+        try:
+            with urllib.request.urlopen(server.url, timeout=5) as response:
+                self.assertEqual(json.load(response), {"queue_depth": 7})
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(server.url.replace("/status", "/x"), timeout=5)
+        finally:
+            server.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from utils.work_queue import SqliteWorkQueue, open_queue
+
+
+def _drain(queue_path, results_dir, worker_number):
+    # Runs in a separate process: lease and complete items until drained,
+    # recording each completed file so duplicates can be detected.
+    queue = SqliteWorkQueue(queue_path)
+    worker_id = f"worker-{worker_number}"
+    completed = []
+    while True:
+        items = queue.lease(worker_id, lease_seconds=30)
+        if not items:
+            if queue.is_drained():
+                break
+            time.sleep(0.01)
+            continue
+        time.sleep(0.005)  # Simulated work.
+        if queue.complete(worker_id, items[0].id):
+            completed.append(items[0].file_path)
+    with open(os.path.join(results_dir, worker_id), "w") as f:
+        f.write("\n".join(completed))
+    queue.close()
+
+
+class TestSqliteWorkQueue(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "queue.db")
+        self.queue = SqliteWorkQueue(self.path, max_attempts=2)
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.directory)
+
+    def test_enqueue_is_idempotent_and_keeps_payloads(self):
+        self.assertEqual(
+            self.queue.enqueue(["a.py", "b.py"], {"b.py": {"line_range": [3, 9]}}), 2
+        )
+        self.assertEqual(self.queue.enqueue(["a.py", "c.py"]), 1)
+
+        items = self.queue.lease("w1", lease_seconds=60, limit=10)
+
+        self.assertEqual([item.file_path for item in items], ["a.py", "b.py", "c.py"])
+        self.assertEqual(items[1].payload, {"line_range": [3, 9]})
+        self.assertEqual(self.queue.counts(), {"leased": 3})
+
+    def test_leased_items_are_not_handed_out_twice(self):
+        self.queue.enqueue(["a.py"])
+
+        self.assertEqual(len(self.queue.lease("w1", lease_seconds=60)), 1)
+        self.assertEqual(self.queue.lease("w2", lease_seconds=60), [])
+
+    def test_expired_lease_is_picked_up_and_fences_the_old_worker(self):
+        self.queue.enqueue(["a.py"])
+        item = self.queue.lease("w1", lease_seconds=60)[0]
+
+        with patch("utils.work_queue.time.time", return_value=time.time() + 120):
+            retried = self.queue.lease("w2", lease_seconds=60)
+
+        self.assertEqual(retried[0].id, item.id)
+        self.assertEqual(retried[0].attempts, 2)
+        # The first worker lost its lease and can no longer finish the item.
+        self.assertFalse(self.queue.complete("w1", item.id))
+        self.assertEqual(self.queue.heartbeat("w1", {item.id}, 60), set())
+        self.assertTrue(self.queue.complete("w2", item.id))
+        self.assertEqual(self.queue.counts(), {"done": 1})
+
+    def test_fail_requeues_until_max_attempts(self):
+        self.queue.enqueue(["a.py"])
+
+        item = self.queue.lease("w1", lease_seconds=60)[0]
+        self.queue.fail("w1", item.id, "API error")
+        self.assertEqual(self.queue.counts(), {"pending": 1})
+
+        item = self.queue.lease("w1", lease_seconds=60)[0]
+        self.queue.fail("w1", item.id, "API error")
+        self.assertEqual(self.queue.counts(), {"failed": 1})
+        self.assertEqual(self.queue.failed_items(), [("a.py", "API error")])
+        self.assertTrue(self.queue.is_drained())
+
+    def test_open_queue_resolves_sqlite_urls(self):
+        queue = open_queue(f"sqlite://{self.path}")
+        self.assertIsInstance(queue, SqliteWorkQueue)
+        self.assertEqual(queue.path, self.path)
+        queue.close()
+        with self.assertRaises(ValueError):
+            open_queue("redis://localhost/0")
+
+    def test_worker_processes_drain_each_item_exactly_once(self):
+        files = [f"file_{i}.py" for i in range(200)]
+        self.queue.enqueue(files)
+        results_dir = os.path.join(self.directory, "results")
+        os.makedirs(results_dir)
+
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=_drain, args=(self.path, results_dir, n))
+            for n in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=60)
+            self.assertEqual(worker.exitcode, 0)
+
+        completed = []
+        for name in os.listdir(results_dir):
+            with open(os.path.join(results_dir, name)) as f:
+                completed.extend(line for line in f.read().splitlines() if line)
+        self.assertEqual(sorted(completed), sorted(files))
+        self.assertEqual(self.queue.counts(), {"done": 200})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,74 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from google.api_core.exceptions import NotFound
 from google.cloud import bigquery
-from typing import Dict, Any
+from typing import Dict, Any, Iterable
 from utils.logger import logger
 from utils.exceptions import BigQueryError
 
+# The repo_analysis schema, kept in sync with BQ/create_table.sql.
+REPO_ANALYSIS_SCHEMA = [
+    bigquery.SchemaField("github_link", "STRING"),
+    bigquery.SchemaField("file_path", "STRING"),
+    bigquery.SchemaField("github_owner", "STRING"),
+    bigquery.SchemaField("github_repo", "STRING"),
+    bigquery.SchemaField("product_category", "STRING"),
+    bigquery.SchemaField("product_name", "STRING"),
+    bigquery.SchemaField("language", "STRING"),
+    bigquery.SchemaField("overall_compliance_score", "INT64"),
+    bigquery.SchemaField("evaluation_data", "JSON"),
+    bigquery.SchemaField(
+        "criteria_breakdown",
+        "RECORD",
+        mode="REPEATED",
+        fields=[
+            bigquery.SchemaField("criterion_name", "STRING"),
+            bigquery.SchemaField("score", "INT64"),
+            bigquery.SchemaField("weight", "FLOAT64"),
+            bigquery.SchemaField("assessment", "STRING"),
+        ],
+    ),
+    bigquery.SchemaField("region_tags", "STRING", mode="REPEATED"),
+    bigquery.SchemaField("region_hash", "STRING"),
+    bigquery.SchemaField("raw_code", "STRING"),
+    bigquery.SchemaField("raw_code_hash", "STRING"),
+    bigquery.SchemaField("evaluation_date", "TIMESTAMP"),
+    bigquery.SchemaField("last_updated", "DATE"),
+    bigquery.SchemaField("branch_name", "STRING"),
+    bigquery.SchemaField("commit_history", "JSON"),
+    bigquery.SchemaField("commit_history_hash", "STRING"),
+    bigquery.SchemaField("metadata", "JSON"),
+    bigquery.SchemaField("validation_details", "JSON"),
+    bigquery.SchemaField("Generated", "BOOL"),
+    bigquery.SchemaField("is_deleted", "BOOL"),
+]
+
+# Every query filters on github_link, and most also bound evaluation_date, so
+# the table is partitioned by evaluation day and clustered by link and repo.
+PARTITION_FIELD = "evaluation_date"
+CLUSTERING_FIELDS = ["github_link", "github_repo"]
+
+# Columns added to tables created before they existed, by `migrate_schema`.
+MIGRATED_COLUMNS = {
+    "criteria_breakdown": (
+        "ARRAY<STRUCT<criterion_name STRING, score INT64, weight FLOAT64, "
+        "assessment STRING>>"
+    ),
+    "raw_code_hash": "STRING",
+    "commit_history_hash": "STRING",
+    "is_deleted": "BOOL",
+}
+
+# Columns that can be stored once per distinct value in a side table keyed by
+# content hash, mapped to the side table suffix and column type.
+BLOB_COLUMNS = {
+    "raw_code": ("raw_code", "STRING"),
+    "commit_history": ("commit_history", "JSON"),
+}
+
 
 class BigQueryRepository:
     def __init__(self, config):
@@ -10,14 +76,48 @@ class BigQueryRepository:
         try:
             self._db = bigquery.Client(project=self.config.GOOGLE_CLOUD_PROJECT)
             self.table_id = f"{self.config.GOOGLE_CLOUD_PROJECT}.{self.config.BIGQUERY_DATASET}.{self.config.BIGQUERY_TABLE}"
+            self.latest_table_id = f"{self.table_id}_latest"
+            self.blob_table_ids = {
+                column: f"{self.table_id}_{suffix}"
+                for column, (suffix, _) in BLOB_COLUMNS.items()
+            }
+            self.content_addressed = getattr(config, "CONTENT_ADDRESSED_BLOBS", False)
+            self._known_blobs = {column: set() for column in BLOB_COLUMNS}
+            # (column, hash) pairs being stored, mapped to a Future of the
+            # write's error, or None once it succeeded.
+            self._storing_blobs = {}
+            self._blob_lock = threading.Lock()
+            self._columns = None
+            self._columns_lock = threading.Lock()
             logger.info(f"BigQuery connection opened (instance: {id(self)}).")
         except Exception as e:
             raise BigQueryError(f"Error initializing BigQuery client: {e}")
 
+    def has_column(self, name: str) -> bool:
+        """
+        Whether the table has column `name`. The schema is read once and
+        re-read after `migrate_schema`, so rows can leave out columns that an
+        older table does not have yet instead of failing to insert.
+        """
+        with self._columns_lock:
+            if self._columns is None:
+                try:
+                    schema = self._db.get_table(self.table_id).schema
+                except Exception as e:
+                    raise BigQueryError(f"Error reading the table schema: {e}")
+                self._columns = {field.name for field in schema}
+            return name in self._columns
+
     def create(self, row_payload: Dict[str, Any]):
         """
         Writes a row to the BigQuery table.
+
+        With `CONTENT_ADDRESSED_BLOBS` enabled, `raw_code` and `commit_history`
+        are first moved to their side tables and the row keeps only their
+        hashes (see `_store_blob`).
         """
+        if self.content_addressed:
+            row_payload = self._externalize_blobs(row_payload)
         try:
             errors = self._db.insert_rows_json(self.table_id, [row_payload])
             if not errors:
@@ -29,14 +129,122 @@ class BigQueryRepository:
         except Exception as e:
             raise BigQueryError(f"Error writing document to BigQuery: {e}")
 
+    def _externalize_blobs(self, row_payload: Dict[str, Any]) -> Dict[str, Any]:
+        row_payload = dict(row_payload)
+        blobs = {}
+        for column in BLOB_COLUMNS:
+            content = row_payload.pop(column, None)
+            if content is not None:
+                content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+                row_payload[f"{column}_hash"] = content_hash
+                blobs[column] = (content_hash, content)
+        self._store_blobs(blobs)
+        return row_payload
+
+    def _store_blobs(self, blobs: Dict[str, tuple]):
+        """
+        Makes sure the side tables hold `blobs`, a mapping of column to
+        (content hash, content).
+
+        Hashes stored or found during this run are remembered, so unchanged
+        files and the regions of one file only cost a lookup the first time.
+        The other hashes are looked up with one query that sends only the
+        hashes, and just the missing contents are streamed to their side
+        tables. A hash is remembered once that succeeds; a thread needing
+        content that another thread is storing waits for it and shares its
+        outcome. Separate runs can still store the same content twice, which
+        the views tolerate by grouping the side tables by hash.
+
+        Raises:
+            BigQueryError: If the blobs cannot be looked up or stored.
+        """
+        claimed = {}
+        waiting = []
+        with self._blob_lock:
+            for column, (content_hash, content) in blobs.items():
+                if content_hash in self._known_blobs[column]:
+                    continue
+                future = self._storing_blobs.get((column, content_hash))
+                if future is None:
+                    self._storing_blobs[(column, content_hash)] = Future()
+                    claimed[column] = (content_hash, content)
+                else:
+                    waiting.append(future)
+
+        error = None
+        if claimed:
+            try:
+                self._insert_missing_blobs(claimed)
+            except Exception as e:
+                error = BigQueryError(f"Error storing blobs: {e}")
+            with self._blob_lock:
+                futures = [
+                    self._storing_blobs.pop((column, content_hash))
+                    for column, (content_hash, _) in claimed.items()
+                ]
+                if error is None:
+                    for column, (content_hash, _) in claimed.items():
+                        self._known_blobs[column].add(content_hash)
+            for future in futures:
+                future.set_result(error)
+
+        for future in waiting:
+            error = error or future.result()
+        if error:
+            raise error
+
+    def _insert_missing_blobs(self, blobs: Dict[str, tuple]):
+        query = "\nUNION ALL\n".join(
+            f"""
+            SELECT '{column}' AS blob_column, content_hash
+            FROM `{self.blob_table_ids[column]}`
+            WHERE content_hash IN UNNEST(@hashes)
+            """
+            for column in blobs
+        )
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ArrayQueryParameter(
+                    "hashes",
+                    "STRING",
+                    sorted({content_hash for content_hash, _ in blobs.values()}),
+                ),
+            ]
+        )
+        stored = {
+            (row["blob_column"], row["content_hash"])
+            for row in self._db.query(query, job_config=job_config)
+        }
+        for column, (content_hash, content) in blobs.items():
+            if (column, content_hash) in stored:
+                continue
+            errors = self._db.insert_rows_json(
+                self.blob_table_ids[column],
+                [
+                    {
+                        "content_hash": content_hash,
+                        column: content,
+                        "stored_at": datetime.now().isoformat(),
+                    }
+                ],
+            )
+            if errors:
+                raise BigQueryError(
+                    f"Error writing {column} to '{self.blob_table_ids[column]}': "
+                    f"{errors}"
+                )
+
     def record_exists(self, github_link: str, last_updated: str) -> bool:
         """
         Checks if a record with the given github_link and last_updated date
         already exists in BigQuery.
-        
-        This dual check allows for incremental analysis: only files that have 
-        been updated since their last evaluation (as determined by the 
+
+        This dual check allows for incremental analysis: only files that have
+        been updated since their last evaluation (as determined by the
         Git last-commit date) will be re-processed.
+
+        A file can only have been evaluated after its last commit, so the
+        query is bounded by evaluation_date to prune older partitions.
         """
         if not last_updated:
             return False
@@ -46,6 +254,7 @@ class BigQueryRepository:
                 SELECT COUNT(1)
                 FROM `{self.table_id}`
                 WHERE github_link = @github_link AND last_updated = @last_updated
+                    AND {_EVALUATED_SINCE_LAST_UPDATE}
             """
             job_config = bigquery.QueryJobConfig(
                 query_parameters=[
@@ -59,6 +268,109 @@ class BigQueryRepository:
         except Exception as e:
             raise BigQueryError(f"Error reading from BigQuery: {e}")
 
+    def last_evaluations(self, github_links: Iterable[str]) -> Dict[str, datetime]:
+        """
+        Returns when each of `github_links` was last evaluated.
+
+        Region rows (`<github_link>#L<start>-L<end>`) count towards their
+        file. Links that were never evaluated are left out of the result.
+
+        The links are queried one repository at a time, on the range of
+        `github_link` values from its first link to its last, so BigQuery can
+        prune clustered blocks; region links are folded into their file here.
+        """
+        wanted = set(github_links)
+        by_repository = {}
+        for link in sorted(wanted):
+            by_repository.setdefault(_repository_prefix(link), []).append(link)
+        evaluations = {}
+        try:
+            for links in by_repository.values():
+                query = f"""
+                    SELECT github_link, MAX(evaluation_date) AS evaluation_date
+                    FROM `{self.table_id}`
+                    WHERE github_link >= @first_link AND github_link < @past_last_link
+                    GROUP BY github_link
+                """
+                job_config = bigquery.QueryJobConfig(
+                    query_parameters=[
+                        bigquery.ScalarQueryParameter("first_link", "STRING", links[0]),
+                        # "$" sorts right after "#", so the range ends after
+                        # the last link's region rows.
+                        bigquery.ScalarQueryParameter(
+                            "past_last_link", "STRING", f"{links[-1]}$"
+                        ),
+                    ]
+                )
+                for row in self._db.query(query, job_config=job_config):
+                    file_link = row["github_link"].split("#", 1)[0]
+                    if file_link not in wanted:
+                        continue
+                    if (
+                        file_link not in evaluations
+                        or row["evaluation_date"] > evaluations[file_link]
+                    ):
+                        evaluations[file_link] = row["evaluation_date"]
+            return evaluations
+        except Exception as e:
+            raise BigQueryError(f"Error reading from BigQuery: {e}")
+
+    def get_region_evaluations(self, github_link: str) -> Dict[tuple, Dict[str, Any]]:
+        """
+        Returns the latest region-level evaluation for each region of a file.
+
+        Region rows are linked as `<github_link>#L<start>-L<end>` and carry the
+        hash of the region body, so a region is matched by its tag and hash
+        regardless of where it now sits in the file. Regions with identical
+        bodies under different tags are kept apart.
+
+        Returns:
+            dict: A mapping of (region_tag, region_hash) to a dict with the
+            stored `github_link`, the `analysis` fields and `validation_history`.
+        """
+        try:
+            query = f"""
+                SELECT github_link, region_tags, region_hash, product_category,
+                    product_name, language, evaluation_data, validation_details
+                FROM `{self.table_id}`
+                WHERE github_link LIKE @link_pattern
+                    AND STARTS_WITH(github_link, @link_prefix)
+                    AND region_hash IS NOT NULL
+                QUALIFY ROW_NUMBER() OVER(
+                    PARTITION BY region_hash, region_tags[SAFE_OFFSET(0)]
+                    ORDER BY evaluation_date DESC
+                ) = 1
+            """
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[
+                    bigquery.ScalarQueryParameter(
+                        "link_prefix", "STRING", f"{github_link}#"
+                    ),
+                    # A LIKE prefix pattern lets BigQuery prune clustered
+                    # blocks; STARTS_WITH keeps the match exact.
+                    bigquery.ScalarQueryParameter(
+                        "link_pattern", "STRING", f"{_escape_like(github_link)}#%"
+                    ),
+                ]
+            )
+            evaluations = {}
+            for row in self._db.query(query, job_config=job_config):
+                result = {
+                    "github_link": row["github_link"],
+                    "analysis": {
+                        "product_category": row["product_category"],
+                        "product_name": row["product_name"],
+                        "language": row["language"],
+                        "assessment": _load_json(row["evaluation_data"]),
+                    },
+                    "validation_history": _load_json(row["validation_details"]),
+                }
+                for region_tag in row["region_tags"] or []:
+                    evaluations[(region_tag, row["region_hash"])] = result
+            return evaluations
+        except Exception as e:
+            raise BigQueryError(f"Error reading from BigQuery: {e}")
+
     def delete(self, github_link: str, last_updated: str):
         """
         Deletes a specific record for a given GitHub link and last_updated date.
@@ -67,6 +379,7 @@ class BigQueryRepository:
             query = f"""
                 DELETE FROM `{self.table_id}`
                 WHERE github_link = @github_link AND last_updated = @last_updated
+                    AND {_EVALUATED_SINCE_LAST_UPDATE}
             """
             job_config = bigquery.QueryJobConfig(
                 query_parameters=[
@@ -82,6 +395,239 @@ class BigQueryRepository:
         except Exception as e:
             raise BigQueryError(f"Error deleting from BigQuery: {e}")
 
+    def ensure_table(self) -> str:
+        """
+        Creates the table partitioned by day on `evaluation_date` and clustered
+        on `github_link`/`github_repo`, or migrates an existing table to that
+        layout.
+
+        Partitioning cannot be added to an existing table, so an unpartitioned
+        table is copied into a new partitioned table, which then takes its
+        name. The original is kept as `<table>_unpartitioned_<timestamp>`.
+        Tables with rows still in the streaming buffer cannot be renamed; wait
+        for the buffer to flush and re-run.
+
+        Returns:
+            str: "created", "migrated", "reclustered" or "up-to-date".
+        """
+        try:
+            try:
+                table = self._db.get_table(self.table_id)
+            except NotFound:
+                table = bigquery.Table(self.table_id, schema=REPO_ANALYSIS_SCHEMA)
+                table.time_partitioning = bigquery.TimePartitioning(
+                    type_=bigquery.TimePartitioningType.DAY, field=PARTITION_FIELD
+                )
+                table.clustering_fields = CLUSTERING_FIELDS
+                self._db.create_table(table)
+                logger.info(f"Created partitioned table '{self.table_id}'.")
+                return "created"
+
+            partitioning = table.time_partitioning
+            if partitioning and partitioning.field == PARTITION_FIELD:
+                if table.clustering_fields == CLUSTERING_FIELDS:
+                    return "up-to-date"
+                # Clustering can be changed in place; it applies to new data.
+                table.clustering_fields = CLUSTERING_FIELDS
+                self._db.update_table(table, ["clustering_fields"])
+                logger.info(f"Updated clustering on '{self.table_id}'.")
+                return "reclustered"
+
+            table_name = self.config.BIGQUERY_TABLE
+            staging_id = f"{self.table_id}_partitioned"
+            backup_name = (
+                f"{table_name}_unpartitioned_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            )
+            self._db.query(
+                f"""
+                CREATE TABLE `{staging_id}`
+                PARTITION BY DATE({PARTITION_FIELD})
+                CLUSTER BY {", ".join(CLUSTERING_FIELDS)}
+                AS SELECT * FROM `{self.table_id}`
+                """
+            ).result()
+            self._db.query(
+                f"ALTER TABLE `{self.table_id}` RENAME TO `{backup_name}`"
+            ).result()
+            self._db.query(
+                f"ALTER TABLE `{staging_id}` RENAME TO `{table_name}`"
+            ).result()
+            logger.info(
+                f"Migrated '{self.table_id}' to a partitioned, clustered table. "
+                f"The original was kept as '{backup_name}'."
+            )
+            return "migrated"
+        except Exception as e:
+            raise BigQueryError(f"Error managing BigQuery table layout: {e}")
+
+    def migrate_schema(self):
+        """
+        Brings the table up to the current schema: ensures the partitioned and
+        clustered layout (see `ensure_table`), adds the typed
+        `criteria_breakdown` column to an existing table and backfills it from
+        the `evaluation_data` JSON of rows written before it existed, and adds
+        the content hash columns and side tables used by
+        `CONTENT_ADDRESSED_BLOBS` and the `is_deleted` column written by
+        `--delta` tombstones. Safe to run repeatedly.
+
+        Only rows whose `evaluation_data` has criteria but whose column is
+        still empty are backfilled, so a re-run leaves rows without criteria
+        alone. Rows still in the streaming buffer cannot be updated by DML;
+        re-run the migration later to backfill them. Run `refresh_latest()` afterwards to
+        carry the backfilled values into the latest snapshot.
+
+        Returns:
+            int: The number of rows backfilled.
+        """
+        self.ensure_table()
+        try:
+            # The latest snapshot table, if it exists, gets the same columns so
+            # it can keep being refreshed from the history table.
+            add_columns = ",\n".join(
+                f"ADD COLUMN IF NOT EXISTS {column} {column_type}"
+                for column, column_type in MIGRATED_COLUMNS.items()
+            )
+            for table_id in [self.table_id, self.latest_table_id]:
+                self._db.query(
+                    f"ALTER TABLE IF EXISTS `{table_id}`\n{add_columns}"
+                ).result()
+                logger.info(
+                    f"Ensured columns {', '.join(MIGRATED_COLUMNS)} on '{table_id}'."
+                )
+
+            for column, (_, column_type) in BLOB_COLUMNS.items():
+                self._db.query(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS `{self.blob_table_ids[column]}` (
+                        content_hash STRING NOT NULL,
+                        {column} {column_type},
+                        stored_at TIMESTAMP
+                    )
+                    CLUSTER BY content_hash
+                    """
+                ).result()
+                logger.info(f"Ensured side table '{self.blob_table_ids[column]}'.")
+
+            backfill_job = self._db.query(
+                f"""
+                UPDATE `{self.table_id}`
+                SET criteria_breakdown = ARRAY(
+                    SELECT AS STRUCT
+                        JSON_VALUE(criterion, '$.criterion_name') AS criterion_name,
+                        CAST(
+                            ROUND(SAFE_CAST(JSON_VALUE(criterion, '$.score') AS FLOAT64))
+                            AS INT64
+                        ) AS score,
+                        SAFE_CAST(JSON_VALUE(criterion, '$.weight') AS FLOAT64) AS weight,
+                        JSON_VALUE(criterion, '$.assessment') AS assessment
+                    FROM UNNEST(
+                        JSON_QUERY_ARRAY(evaluation_data, '$.criteria_breakdown')
+                    ) AS criterion
+                )
+                WHERE ARRAY_LENGTH(criteria_breakdown) = 0
+                    AND ARRAY_LENGTH(
+                        JSON_QUERY_ARRAY(evaluation_data, '$.criteria_breakdown')
+                    ) > 0
+                """
+            )
+            backfill_job.result()
+            backfilled = backfill_job.num_dml_affected_rows or 0
+            logger.info(f"Backfilled criteria_breakdown for {backfilled} rows.")
+            with self._columns_lock:
+                self._columns = None
+            return backfilled
+        except Exception as e:
+            raise BigQueryError(f"Error migrating BigQuery schema: {e}")
+
+    def refresh_latest(self, since: str = None) -> int:
+        """
+        MERGEs the newest evaluation of each github_link into the
+        `<table>_latest` snapshot table, creating it if needed.
+
+        Only rows with `evaluation_date >= since` are read, so refreshing after
+        a run touches just the rows that run wrote. Pass `since=None` to
+        rebuild the snapshot from the full history.
+
+        Returns:
+            int: The number of snapshot rows inserted or updated.
+        """
+        try:
+            self._db.query(
+                f"CREATE TABLE IF NOT EXISTS `{self.latest_table_id}` LIKE `{self.table_id}`"
+            ).result()
+
+            # Columns added to the history table after the snapshot was created
+            # are left out until the snapshot table is migrated as well.
+            latest_columns = {
+                field.name for field in self._db.get_table(self.latest_table_id).schema
+            }
+            columns = [
+                field.name
+                for field in self._db.get_table(self.table_id).schema
+                if field.name in latest_columns
+            ]
+            update_set = ", ".join(
+                f"{c} = S.{c}" for c in columns if c != "github_link"
+            )
+            insert_columns = ", ".join(columns)
+            insert_values = ", ".join(f"S.{c}" for c in columns)
+
+            where_clause = "WHERE evaluation_date >= @since" if since else ""
+            query = f"""
+                MERGE `{self.latest_table_id}` AS T
+                USING (
+                    SELECT * FROM `{self.table_id}`
+                    {where_clause}
+                    QUALIFY ROW_NUMBER() OVER(
+                        PARTITION BY github_link ORDER BY evaluation_date DESC
+                    ) = 1
+                ) AS S
+                ON T.github_link = S.github_link
+                WHEN MATCHED AND S.evaluation_date >= T.evaluation_date THEN
+                    UPDATE SET {update_set}
+                WHEN NOT MATCHED THEN
+                    INSERT ({insert_columns}) VALUES ({insert_values})
+            """
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[
+                    bigquery.ScalarQueryParameter("since", "TIMESTAMP", since),
+                ]
+                if since
+                else []
+            )
+            merge_job = self._db.query(query, job_config=job_config)
+            merge_job.result()
+            merged = merge_job.num_dml_affected_rows or 0
+            logger.info(
+                f"Merged {merged} rows into latest snapshot '{self.latest_table_id}'."
+            )
+            return merged
+        except Exception as e:
+            raise BigQueryError(f"Error refreshing latest snapshot: {e}")
+
     def close(self):
         # BigQuery client doesn't have an explicit close method.
         logger.info(f"BigQuery connection conceptually closed (instance: {id(self)}).")
+
+
+# Evaluations happen after the last commit. One day of slack covers commit
+# dates recorded in a timezone ahead of the evaluation timestamp.
+_EVALUATED_SINCE_LAST_UPDATE = (
+    f"{PARTITION_FIELD} >= TIMESTAMP_SUB(TIMESTAMP(@last_updated), INTERVAL 1 DAY)"
+)
+
+
+def _repository_prefix(github_link):
+    # `https://github.com/<owner>/<repo>/blob/<branch>`; links of the same
+    # repository and branch share it and sort next to each other.
+    return "/".join(github_link.split("/")[:7])
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _load_json(value):
+    # JSON columns come back already parsed from the client, STRING columns
+    # holding JSON do not.
+    return json.loads(value) if isinstance(value, str) else value
@@ -1,43 +1,70 @@
+import hashlib
 import json
+import math
+import multiprocessing
 import os
-from typing import Dict
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from datetime import datetime
-from tools.git_file_processor import GitFileProcessor
-from tools.evaluate_code_file import CodeEvaluator
+from tools.api_client import ApiClient
+from tools.git_file_processor import GitFileProcessor, extract_git_info
+from tools.languages import FILE_EXTENSION_MAP
+from tools.product_classifier import ProductClassifier
+from tools.region_tag_index import RegionTagIndexCache
+from utils.admission import TokenBudget, text_chars
+from utils.circuit_breaker import CircuitBreaker
+from utils.file_reader import check_source_file, read_source_file
+from utils.hedging import Hedger
+from utils.single_flight import SingleFlight
 from utils.logger import logger
+from utils.retry import is_transient
+from utils.scheduling import LatencyHistory
 from utils.exceptions import (
     GitRepositoryError,
     APIError,
+    BigQueryError,
+    FileReadError,
 )
 
-FILE_EXTENSION_MAP: Dict[str, str] = {
-    ".py": "Python",
-    ".java": "Java",
-    ".groovy": "Java",
-    ".kt": "Java",
-    ".scala": "Java",
-    ".go": "Go",
-    ".rb": "Ruby",
-    ".rs": "Rust",
-    ".cs": "C#",
-    ".cpp": "C++",
-    ".cc": "C++",
-    ".h": "C++",
-    ".c": "C++",
-    ".hpp": "C++",
-    ".php": "PHP",
-    ".tf": "Terraform",
-    ".js": "JavaScript",
-    ".ts": "JavaScript",  # TypeScript is normalized to Javascript.
-    ".jsx": "JavaScript",
-    ".tsx": "JavaScript",
-    ".sh": "Unknown",
-    ".yaml": "Unknown",
-    ".xml": "Unknown",
-}
+
+def _to_number(value, number_type):
+    """
+    Coerces a JSON value to `number_type`, returning None if it is not numeric.
+    Fractional values are rounded, not truncated, when converting to int.
+    """
+    if value is None:
+        return None
+    try:
+        if number_type is int:
+            return round(float(value))
+        return number_type(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _reported_tokens(api_response):
+    """
+    The model tokens an analysis used, if the API reports them in a Gemini
+    style `usage_metadata.total_token_count`, else None.
+    """
+    if not isinstance(api_response, dict):
+        return None
+    usage = api_response.get("usage_metadata")
+    if not isinstance(usage, dict):
+        return None
+    return _to_number(usage.get("total_token_count"), int)
+
+
+def _retried_attempts(response):
+    """
+    The number of earlier attempts of `response`'s request that the session's
+    retry policy re-sent after an HTTP error status.
+    """
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    history = getattr(retries, "history", None) or ()
+    return sum(1 for attempt in history if attempt.status is not None)
 
 
 class CodeProcessor:
@@ -55,71 +82,348 @@ class CodeProcessor:
 
         Args:
             settings: A configuration object with application settings.
-            client: An initialized genai.Client instance.
+            client: An initialized genai.Client instance, or None to create one
+                the first time the evaluator is used.
             prompts: A dictionary containing pre-loaded prompt templates.
             bigquery_repo: A shared BigQueryRepository instance (optional).
         """
         self.settings = settings
+        self.client = client
+        self.prompts = prompts
         self.bigquery_repo = bigquery_repo
         self.git_processor = GitFileProcessor()
         self.api_url = settings.API_URL
+        self.max_file_bytes = getattr(settings, "MAX_FILE_BYTES", 0)
+
+        # One keep-alive pool shared by all worker threads, sized to them.
+        pool_size = getattr(settings, "API_POOL_SIZE", 0) or 10
+
+        # With API_HEDGE_PERCENTILE set, an analysis request still running
+        # after that percentile of observed latencies is sent again and the
+        # first response kept, within the API_HEDGE_BUDGET share of requests.
+        self.hedger = Hedger(
+            percentile=getattr(settings, "API_HEDGE_PERCENTILE", 0),
+            budget=getattr(settings, "API_HEDGE_BUDGET", 0.05),
+            min_samples=getattr(settings, "API_HEDGE_MIN_SAMPLES", 50),
+            # Room for every worker's request, a hedge and abandoned losers.
+            max_workers=3 * pool_size,
+            admit_hedge=self._admit_hedge,
+        )
+        if self.hedger.percentile:
+            # Hedges need connections of their own.
+            pool_size += math.ceil(pool_size * self.hedger.budget)
+
+        self.api_client = ApiClient(settings, pool_size=pool_size)
+        self.session = self.api_client.session
+
+        # Threads analyzing the same content at the same time (duplicate
+        # inventory rows, forks) share one API call.
+        self.single_flight = (
+            SingleFlight() if getattr(settings, "API_SINGLE_FLIGHT", True) else None
+        )
 
-        # Configure retry strategy
-        self.session = requests.Session()
-        retry_strategy = Retry(
-            total=getattr(settings, "API_MAX_RETRIES", 3),
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["POST"],
+        # Keeps the model tokens and requests sent within the TPM/RPM quota,
+        # so large files arriving together wait instead of causing 429s.
+        self.token_budget = TokenBudget(
+            tokens_per_minute=getattr(settings, "MODEL_TOKENS_PER_MINUTE", 0),
+            requests_per_minute=getattr(settings, "MODEL_REQUESTS_PER_MINUTE", 0),
+            chars_per_token=getattr(settings, "MODEL_CHARS_PER_TOKEN", 4.0),
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("https://", adapter)
-        self.session.mount("http://", adapter)
-
-        self.evaluator = CodeEvaluator(
-            config=settings,
-            client=client,
-            system_instructions=prompts["system_instructions"],
-            consolidated_eval_prompt=prompts["consolidated_eval"],
-            json_conversion_prompt=prompts["json_conversion"],
+        self.output_tokens_estimate = getattr(settings, "MODEL_OUTPUT_TOKENS", 2000)
+        # The analysis sends the system instructions with both the evaluation
+        # and the JSON conversion prompt, and the code twice (as is and with
+        # comments removed).
+        self.prompt_overhead_chars = (
+            2 * text_chars(prompts.get("system_instructions", ""))
+            + text_chars(prompts.get("consolidated_eval", ""))
+            + text_chars(prompts.get("json_conversion", ""))
         )
 
+        # API latency per language, kept across runs to estimate how long a
+        # file will take for longest-first scheduling.
+        self.latency_history = LatencyHistory.load(
+            getattr(settings, "API_LATENCY_HISTORY_PATH", "")
+        )
+
+        # Breakers shared by all worker threads: during an API or BigQuery
+        # outage the workers wait for a single probe call to succeed instead
+        # of failing (and paying for) every file.
+        self.api_breaker = self._circuit_breaker("api")
+        self.bigquery_breaker = self._circuit_breaker("bigquery")
+
+        self.product_classifier = (
+            ProductClassifier()
+            if getattr(settings, "CATEGORIZE_HEURISTICS_ENABLED", True)
+            else None
+        )
+
+        # Region tags are read from a local per-repository index so they never
+        # depend on the API response.
+        self.region_tag_index = (
+            RegionTagIndexCache(self.max_file_bytes)
+            if getattr(settings, "REGION_TAG_INDEX_ENABLED", True)
+            else None
+        )
+
+        self._evaluator = None
+        self._prompt_cache = None
+        self._evaluator_lock = threading.Lock()
 
+        # With CPU_WORKERS set, the git stage (subprocess calls and log
+        # parsing) runs in a process pool so it does not contend for the GIL
+        # with the worker threads, which keep the I/O-bound API and BigQuery
+        # calls. The pool is started on first use.
+        self.cpu_workers = getattr(settings, "CPU_WORKERS", 0)
+        self._cpu_pool = None
+        self._cpu_pool_lock = threading.Lock()
 
-    def process_file(self, file_path, regen=False, gen=False):
+    @property
+    def evaluator(self):
+        """
+        The CodeEvaluator, built on first use.
+
+        The genai SDK and client are only loaded when an evaluation actually
+        runs, so API-only modes start without paying for them.
+        """
+        with self._evaluator_lock:
+            if self._evaluator is None:
+                from tools.evaluate_code_file import CodeEvaluator
+                from tools.prompt_cache import PromptCache
+
+                if self.client is None:
+                    from google import genai
+
+                    logger.info("Initializing GenAI client...")
+                    self.client = genai.Client()
+
+                # The system instructions are registered as cached content once
+                # per run and shared by every evaluation instead of being resent
+                # per request.
+                self._prompt_cache = PromptCache(
+                    self.settings, self.client, self.prompts["system_instructions"]
+                )
+                self._evaluator = CodeEvaluator(
+                    config=self.settings,
+                    client=self.client,
+                    system_instructions=self.prompts["system_instructions"],
+                    consolidated_eval_prompt=self.prompts["consolidated_eval"],
+                    json_conversion_prompt=self.prompts["json_conversion"],
+                    prompt_cache=self._prompt_cache,
+                    token_budget=self.token_budget,
+                    output_tokens_estimate=self.output_tokens_estimate,
+                )
+            return self._evaluator
+
+    def _circuit_breaker(self, name):
+        return CircuitBreaker(
+            name,
+            failure_threshold=getattr(self.settings, "BREAKER_FAILURE_THRESHOLD", 20),
+            reset_timeout=getattr(self.settings, "BREAKER_RESET_SECONDS", 30.0),
+            max_outage=getattr(self.settings, "BREAKER_MAX_OUTAGE_SECONDS", 1800.0),
+            is_failure=is_transient,
+        )
+
+    def process_file(
+        self, file_path, regen=False, gen=False, by_region=False, line_range=None
+    ):
         _, file_extension = os.path.splitext(file_path)
         language = FILE_EXTENSION_MAP.get(file_extension)
 
         if not language or language == "Unknown":
             return "skipped"
 
+        # Once a dependency has been down for longer than the configured
+        # outage, the remaining files fail fast, without any git work.
+        self.api_breaker.check()
+        self.bigquery_breaker.check()
+
+        # Oversized and binary files are rejected before any git or API work.
+        try:
+            check_source_file(file_path, self.max_file_bytes)
+        except FileReadError as e:
+            logger.warning(f"Skipping {file_path}: {e}")
+            return "skipped"
+
         git_info = self._get_git_info(file_path)
 
+        if by_region:
+            regions = self._get_local_regions(file_path)
+            if regions:
+                return self._process_regions(file_path, git_info, regions, regen, gen)
+
         if regen:
             logger.info(
                 f"Regen is true, deleting existing records for {git_info['github_link']}"
             )
-            self.bigquery_repo.delete(git_info["github_link"], git_info["last_updated"])
+            self.bigquery_breaker.call(
+                self.bigquery_repo.delete,
+                git_info["github_link"],
+                git_info["last_updated"],
+            )
         elif self._is_already_processed(git_info):
             logger.info(f"{file_path} already processed and up-to-date, skipping.")
             return "skipped"
 
-        code = self._read_raw_code(file_path)
-        if "Error reading file" in code:
-            logger.error(f"Could not read file {file_path}, skipping.")
+        try:
+            code = self._read_raw_code(file_path)
+        except FileReadError as e:
+            logger.error(f"Could not read file {file_path}, skipping: {e}")
             return "skipped"
 
-        analysis_result = self._analyze_file(file_path, git_info, code)
+        # With an inventory line range, only that snippet (plus a little
+        # context) is sent to the API. The full file is still stored unless
+        # STORE_FULL_RAW_CODE is disabled.
+        api_code = (
+            self._slice_line_range(code, line_range, file_path) if line_range else code
+        )
+        analysis_result = self._analyze_file(file_path, git_info, api_code)
 
         if analysis_result is None:
             return "skipped"
 
+        raw_code = (
+            code if getattr(self.settings, "STORE_FULL_RAW_CODE", True) else api_code
+        )
         bigquery_row = self._build_bigquery_row(
-            analysis_result, file_path, code, gen
+            analysis_result, file_path, raw_code, gen
         )
         self._save_result(bigquery_row)
         return "processed"
 
+    def process_deletion(self, repo_root, relative_path, gen=False):
+        """
+        Writes a tombstone row for a file deleted from the repository, so the
+        latest snapshot stops reporting its last evaluation.
+
+        Returns:
+            str: "deleted", or "skipped" for files that are never analyzed.
+        """
+        _, file_extension = os.path.splitext(relative_path)
+        language = FILE_EXTENSION_MAP.get(file_extension)
+        if not language or language == "Unknown":
+            return "skipped"
+
+        self.bigquery_breaker.check()
+        if not self._table_has_column("is_deleted"):
+            # Without the column the tombstone would read as a live row.
+            raise BigQueryError(
+                f"Cannot record the deletion of {relative_path}: the table has no "
+                f"is_deleted column. Run `main.py --migrate-schema` first."
+            )
+        git_info = self.git_processor.deleted_file_info(repo_root, relative_path)
+        if not git_info["github_link"]:
+            return "skipped"
+        self._save_result(
+            {
+                "github_link": git_info["github_link"],
+                "file_path": os.path.join(repo_root, relative_path),
+                "github_owner": git_info["github_owner"],
+                "github_repo": git_info["github_repo"],
+                "language": language,
+                "evaluation_date": datetime.now().isoformat(),
+                "last_updated": git_info["last_updated"],
+                "branch_name": git_info["branch_name"],
+                "commit_history": json.dumps(git_info["commit_history"]),
+                "metadata": json.dumps(git_info["metadata"]),
+                "Generated": gen,
+                "is_deleted": True,
+            }
+        )
+        logger.info(f"Recorded deletion of {git_info['github_link']}.")
+        return "deleted"
+
+    def _process_regions(self, file_path, git_info, regions, regen=False, gen=False):
+        """
+        Evaluates a file one region tag at a time, re-analyzing only changed regions.
+
+        Each region is stored as its own row, linked as `<github_link>#L<start>-L<end>`
+        (the same form used by the inventory) with the hash of its body in
+        `region_hash`. A region whose tag and hash match a previous evaluation is
+        not re-sent to the API: if it is already stored under the same link it
+        is skipped, and if it only moved within the file the previous result is
+        carried forward under the new link.
+
+        Returns:
+            str: "processed" if any region row was written, otherwise "skipped".
+        """
+        try:
+            code = self._read_raw_code(file_path)
+        except FileReadError as e:
+            logger.error(f"Could not read file {file_path}, skipping: {e}")
+            return "skipped"
+
+        lines = code.splitlines(keepends=True)
+        previous = (
+            {}
+            if regen
+            else self.bigquery_breaker.call(
+                self.bigquery_repo.get_region_evaluations, git_info["github_link"]
+            )
+        )
+
+        status = "skipped"
+        for region in regions:
+            region_link = f"{git_info['github_link']}#L{region['start_line']}-L{region['end_line']}"
+            region_git_info = {**git_info, "github_link": region_link}
+            snippet = "".join(lines[region["start_line"] - 1 : region["end_line"]])
+            prior = previous.get((region["tag"], region["hash"]))
+
+            if prior and prior["github_link"] == region_link:
+                logger.info(f"Region {region_link} unchanged, skipping.")
+                continue
+
+            if regen:
+                self.bigquery_breaker.call(
+                    self.bigquery_repo.delete, region_link, git_info["last_updated"]
+                )
+
+            if prior:
+                logger.info(
+                    f"Region {region['tag']} moved to {region_link}, carrying forward "
+                    f"the previous evaluation."
+                )
+                analysis_result = {
+                    "git_info": region_git_info,
+                    "analysis": prior["analysis"],
+                    "validation_history": prior["validation_history"],
+                }
+            else:
+                analysis_result = self._analyze_file(
+                    file_path, region_git_info, snippet
+                )
+                if analysis_result is None:
+                    continue
+
+            analysis_result["local_region_tags"] = [region["tag"]]
+            analysis_result["region_hash"] = region["hash"]
+            bigquery_row = self._build_bigquery_row(
+                analysis_result, file_path, snippet, gen
+            )
+            self._save_result(bigquery_row)
+            status = "processed"
+        return status
+
+    def _slice_line_range(self, code, line_range, file_path=None):
+        """
+        Returns the lines in `line_range` (1-based, inclusive) widened by
+        SNIPPET_CONTEXT_LINES on each side.
+
+        If the range starts past the end of the file or selects only blank
+        lines, e.g. because the inventory link was taken at another commit,
+        the full file is returned instead and a warning is logged.
+        """
+        context = getattr(self.settings, "SNIPPET_CONTEXT_LINES", 5)
+        start, end = line_range
+        lines = code.splitlines(keepends=True)
+        snippet = "".join(lines[max(start - 1 - context, 0) : end + context])
+        if start > len(lines) or not snippet.strip():
+            logger.warning(
+                f"Lines {start}-{end} are not in {file_path or 'the file'} "
+                f"({len(lines)} lines); analyzing the full file."
+            )
+            return code
+        return snippet
+
     def _is_already_processed(self, git_info):
         """
         Checks if a file has already been processed and is up-to-date.
@@ -135,57 +439,169 @@ class CodeProcessor:
         """
         github_link = git_info["github_link"]
         last_updated = git_info.get("last_updated")
-        return self.bigquery_repo.record_exists(github_link, last_updated)
+        return self.bigquery_breaker.call(
+            self.bigquery_repo.record_exists, github_link, last_updated
+        )
+
+    @property
+    def cpu_pool(self):
+        """The process pool for CPU-bound stages, or None if CPU_WORKERS is 0."""
+        if not self.cpu_workers:
+            return None
+        with self._cpu_pool_lock:
+            if self._cpu_pool is None:
+                # forkserver children do not inherit the parent's threads and
+                # locks, which a plain fork of this threaded process would.
+                context = multiprocessing.get_context(
+                    "forkserver"
+                    if "forkserver" in multiprocessing.get_all_start_methods()
+                    else "spawn"
+                )
+                self._cpu_pool = ProcessPoolExecutor(
+                    max_workers=self.cpu_workers, mp_context=context
+                )
+                logger.info(f"Started {self.cpu_workers} CPU worker processes.")
+            return self._cpu_pool
 
     def _get_git_info(self, file_path):
-        git_info = self.git_processor.execute(file_path)
+        pool = self.cpu_pool
+        if pool is not None:
+            # Only the path goes out and the metadata dict comes back.
+            git_info = pool.submit(extract_git_info, file_path).result()
+        else:
+            git_info = self.git_processor.execute(file_path)
         if "github_link" not in git_info:
             raise GitRepositoryError(f"File not in git repository: {file_path}")
         return git_info
 
-    def _call_analysis_api(self, github_link, code, language):
+    def _get_local_regions(self, file_path):
+        """
+        Returns the regions (tag, line span and body hash) found in the file by
+        the local index, or an empty list if the index is disabled or unavailable.
+        """
+        if self.region_tag_index is None:
+            return []
+        try:
+            return self.region_tag_index.regions_for_file(file_path)
+        except Exception as e:
+            logger.warning(f"Could not read region tags for {file_path}: {e}")
+            return []
+
+    def _get_local_region_tags(self, file_path):
+        """
+        Returns the region tags found in the file by the local index, or an
+        empty list if the index is disabled or unavailable.
+        """
+        if self.region_tag_index is None:
+            return []
+        try:
+            return self.region_tag_index.region_tags_for_file(file_path)
+        except Exception as e:
+            logger.warning(f"Could not read region tags for {file_path}: {e}")
+            return []
+
+    def _call_analysis_api(self, github_link, code, language, mode=None):
         """
         Calls the external analysis API.
 
         This method sends the code and its GitHub link to the configured API endpoint
         and returns the JSON response. It includes error handling for network
-        issues and non-successful HTTP status codes.
+        issues and non-successful HTTP status codes. Concurrent requests for
+        identical code share one API call (see `SingleFlight`).
 
         Args:
             github_link (str): The URL of the file on GitHub.
             code (str): The raw source code of the file.
             language (str): The programming language of the file.
+            mode (str): Optional request mode. `"categorize"` asks the API for
+                product categorization and region tags only, skipping the full
+                quality evaluation.
 
         Returns:
             dict: The JSON response from the API.
 
         Raises:
             APIError: If the API call fails.
+            CircuitOpenError: If the API has been down for longer than
+                BREAKER_MAX_OUTAGE_SECONDS.
         """
-        headers = {"Content-Type": "application/json"}
         data = {"github_link": github_link, "code": code, "language": language}
+        if mode:
+            data["mode"] = mode
         try:
-            logger.info(f"Calling analysis API for {github_link}...")
-            timeout = getattr(self.settings, "API_TIMEOUT", 90)
-            response = self.session.post(
-                self.api_url, headers=headers, json=data, timeout=timeout
-            )
-            logger.info(f"API returned status {response.status_code} for {github_link}")
-            response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
-            return response.json()
-        except requests.exceptions.Timeout:
+            if self.single_flight is not None:
+                return self.single_flight.do(
+                    self._analysis_key(code, language, mode),
+                    self._request_analysis,
+                    github_link,
+                    data,
+                )
+            return self._request_analysis(github_link, data)
+        except requests.exceptions.Timeout as e:
             logger.error(f"API call timed out for {github_link}")
-            raise APIError(f"API call timed out for {github_link}")
+            raise APIError(f"API call timed out for {github_link}") from e
         except requests.exceptions.RequestException as e:
             logger.error(f"API call failed for {github_link}: {e}")
-            raise APIError(f"API call failed for {github_link}: {e}")
+            raise APIError(f"API call failed for {github_link}: {e}") from e
+
+    def _analysis_key(self, code, language, mode):
+        # The API's analysis depends only on the code, language and mode, so
+        # the same content under different links shares a key.
+        digest = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        return (digest, language, mode)
+
+    def _request_analysis(self, github_link, data):
+        # Waits here until the request fits the model quota.
+        admission = self.token_budget.admit(
+            self._estimated_tokens(data), kind=data.get("mode", "analysis")
+        )
+        logger.info(f"Calling analysis API for {github_link}...")
+        # Waits here while the API's circuit breaker is open.
+        api_response = self.api_breaker.call(
+            self.hedger.call, self._post_analysis, github_link, data
+        )
+        self.token_budget.settle(admission, _reported_tokens(api_response))
+        return api_response
+
+    def _estimated_tokens(self, data):
+        return self.token_budget.estimate(
+            self.prompt_overhead_chars + 2 * len(data["code"]),
+            self.output_tokens_estimate,
+        )
+
+    def _admit_hedge(self, github_link, data):
+        # A hedge is a second request against the quota; it is only sent if
+        # the bucket can take it now, never while callers wait on a deficit.
+        return (
+            self.token_budget.try_admit(
+                self._estimated_tokens(data), kind=data.get("mode", "analysis")
+            )
+            is not None
+        )
+
+    def _post_analysis(self, github_link, data):
+        timeout = getattr(self.settings, "API_TIMEOUT", 90)
+        started = time.monotonic()
+        response = self.api_client.post_json(self.api_url, data, timeout)
+        logger.info(f"API returned status {response.status_code} for {github_link}")
+        # The session re-sends requests answered with 429 or 5xx; those
+        # attempts reached the model too, so they are charged to the quota.
+        for _ in range(_retried_attempts(response)):
+            self.token_budget.charge(
+                self._estimated_tokens(data), kind=data.get("mode", "analysis")
+            )
+        response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
+        self.latency_history.record(
+            data["language"], time.monotonic() - started, len(data["code"])
+        )
+        return response.json()
 
     def _build_bigquery_row(self, analysis_result, file_path, code, gen=False):
         """
         Maps the combined analysis results and Git metadata into a flat dictionary
         that matches the BigQuery table schema.
-        
-        This method transforms semi-structured evaluation data (JSON) into a 
+
+        This method transforms semi-structured evaluation data (JSON) into a
         format suitable for unnesting in the BigQuery view.
         """
         git_info = analysis_result.get("git_info", {})
@@ -197,7 +613,7 @@ class CodeProcessor:
                 f"API response for {git_info.get('github_link')} is missing the 'assessment' object."
             )
 
-        return {
+        row = {
             "github_link": git_info.get("github_link"),
             "file_path": file_path,
             "github_owner": git_info.get("github_owner"),
@@ -207,7 +623,8 @@ class CodeProcessor:
             "language": api_analysis.get("language"),
             "overall_compliance_score": assessment_data.get("overall_compliance_score"),
             "evaluation_data": json.dumps(assessment_data),
-            "region_tags": api_analysis.get("region_tags"),
+            "region_tags": analysis_result.get("local_region_tags")
+            or api_analysis.get("region_tags"),
             "raw_code": code,
             "evaluation_date": datetime.now().isoformat(),
             "last_updated": git_info.get("last_updated"),
@@ -217,6 +634,41 @@ class CodeProcessor:
             "validation_details": json.dumps(analysis_result.get("validation_history")),
             "Generated": gen,
         }
+        # Only region-level rows carry a region hash; whole-file rows omit the
+        # column so they can still be written to tables created before it.
+        if analysis_result.get("region_hash"):
+            row["region_hash"] = analysis_result["region_hash"]
+        # Likewise, a table not yet migrated with --migrate-schema has no typed
+        # criteria column. The criteria stay in evaluation_data, and the
+        # migration backfills the column from it.
+        if self._table_has_column("criteria_breakdown"):
+            row["criteria_breakdown"] = self._flatten_criteria(assessment_data)
+        return row
+
+    def _table_has_column(self, name):
+        if self.bigquery_repo is None:
+            return True
+        return self.bigquery_breaker.call(self.bigquery_repo.has_column, name)
+
+    def _flatten_criteria(self, assessment_data):
+        """
+        Extracts `criteria_breakdown` from the assessment into the typed
+        ARRAY<STRUCT<criterion_name, score, weight, assessment>> column, so the
+        view reads typed columns instead of re-parsing `evaluation_data`.
+        """
+        criteria = []
+        for criterion in assessment_data.get("criteria_breakdown") or []:
+            if not isinstance(criterion, dict):
+                continue
+            criteria.append(
+                {
+                    "criterion_name": criterion.get("criterion_name"),
+                    "score": _to_number(criterion.get("score"), int),
+                    "weight": _to_number(criterion.get("weight"), float),
+                    "assessment": criterion.get("assessment"),
+                }
+            )
+        return criteria
 
     def _analyze_file(self, file_path, git_info, code):
         _, file_extension = os.path.splitext(file_path)
@@ -230,29 +682,53 @@ class CodeProcessor:
             logger.info(f"Skipping file {github_link}: {error_message}")
             return None
 
-        # Combine git_info with the API response to pass to build_bigquery_row
-        combined_result = {"git_info": git_info, **api_response}
+        # Combine git_info and the locally indexed region tags with the API
+        # response to pass to build_bigquery_row
+        combined_result = {
+            "git_info": git_info,
+            "local_region_tags": self._get_local_region_tags(file_path),
+            **api_response,
+        }
         return combined_result
 
     def _read_raw_code(self, file_path):
-        try:
-            with open(file_path, "r") as f:
-                return f.read()
-        except Exception as e:
-            return f"Error reading file: {e}"
+        """
+        Reads the file as text (see `utils.file_reader.read_source_file`).
+
+        Raises:
+            FileReadError: If the file is too large, binary or unreadable.
+        """
+        return read_source_file(file_path, self.max_file_bytes)
 
     def _save_result(self, row):
-        self.bigquery_repo.create(row)
+        self.bigquery_breaker.call(self.bigquery_repo.create, row)
 
     def close(self):
         """
-        No-op method for backward compatibility.
-        
-        The BigQuery connection is now managed externally and shared across
-        all CodeProcessor instances. This method is kept for compatibility
-        but does not close the connection.
+        Releases run-scoped resources owned by the processor.
+
+        The BigQuery connection is managed externally and shared across
+        all CodeProcessor instances, so it is not closed here. The prompt
+        cache, if the evaluator was used, is released and its hit/miss counts
+        are logged. The CPU worker processes, if started, are shut down, the
+        API connection, hedging, request-collapsing and model quota
+        statistics are logged, and the API latency history is saved.
         """
-        pass
+        if self.single_flight is not None and self.single_flight.collapsed:
+            logger.info(
+                f"Shared {self.single_flight.collapsed} of "
+                f"{self.single_flight.calls} analysis requests with an identical "
+                f"request already in flight."
+            )
+        self.token_budget.log_summary()
+        self.latency_history.save()
+        self.hedger.close()
+        self.api_client.close()
+        if self._prompt_cache is not None:
+            self._prompt_cache.close()
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown()
+            self._cpu_pool = None
 
     def analyze_file_only(self, file_path):
         """
@@ -266,15 +742,20 @@ class CodeProcessor:
 
         git_info = self._get_git_info(file_path)
         github_link = git_info["github_link"]
-        code = self._read_raw_code(file_path)
-        if "Error reading file" in code:
-            logger.error(f"Could not read file {file_path} for analysis.")
+        try:
+            code = self._read_raw_code(file_path)
+        except FileReadError as e:
+            logger.error(f"Could not read file {file_path} for analysis: {e}")
             return None
         return self._call_analysis_api(github_link, code, language)
 
     def categorize_file_only(self, file_path):
         """
         Analyzes a single file for product categorization only.
+
+        Files whose region tags and imports agree on a single product are
+        classified locally without an API call. Everything else is sent to the
+        API in the lightweight `categorize` mode.
         """
         _, file_extension = os.path.splitext(file_path)
         language = FILE_EXTENSION_MAP.get(file_extension)
@@ -282,21 +763,51 @@ class CodeProcessor:
         if not language or language == "Unknown":
             return None
 
+        self.api_breaker.check()
+        try:
+            check_source_file(file_path, self.max_file_bytes)
+        except FileReadError as e:
+            logger.warning(f"Skipping {file_path}: {e}")
+            return None
+
         git_info = self._get_git_info(file_path)
         github_link = git_info["github_link"]
-        code = self._read_raw_code(file_path)
-        if "Error reading file" in code:
-            logger.error(f"Could not read file {file_path} for categorization.")
+        try:
+            code = self._read_raw_code(file_path)
+        except FileReadError as e:
+            logger.error(f"Could not read file {file_path} for categorization: {e}")
             return None
-        api_response = self._call_analysis_api(github_link, code, language)
+
+        local_result = (
+            self.product_classifier.classify(code) if self.product_classifier else None
+        )
+        if local_result:
+            logger.info(f"Categorized {github_link} locally, skipping API call.")
+            return {
+                "indexed_source_url": github_link,
+                "region_tag": local_result["region_tag"],
+                "repository_name": git_info.get("github_repo"),
+                "product_category": local_result["product_category"],
+                "product_name": local_result["product_name"],
+                "llm_determined": False,
+                "file_path": os.path.abspath(file_path),
+            }
+
+        api_response = self._call_analysis_api(
+            github_link, code, language, mode="categorize"
+        )
 
         api_analysis = api_response.get("analysis", {})
+        region_tags = self._get_local_region_tags(file_path) or api_analysis.get(
+            "region_tags"
+        )
 
         return {
             "indexed_source_url": github_link,
-            "region_tag": api_analysis.get("region_tags", [None])[0],
+            "region_tag": (region_tags or [None])[0],
             "repository_name": git_info.get("github_repo"),
             "product_category": api_analysis.get("product_category"),
             "product_name": api_analysis.get("product_name"),
-            "llm_determined": True,  # This is now always determined by the API
+            "llm_determined": True,
+            "file_path": os.path.abspath(file_path),
         }
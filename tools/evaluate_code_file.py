@@ -3,7 +3,10 @@ import re
 import time
 from google.genai import types
 from google.genai.types import Tool, GoogleSearch
+from tools.prompt_cache import is_stale_cache_error
+from utils.admission import text_chars
 from utils.exceptions import CodeEvaluatorError
+from utils.logger import logger
 
 
 class CodeEvaluator(BaseTool):
@@ -23,12 +26,18 @@ class CodeEvaluator(BaseTool):
         system_instructions,
         consolidated_eval_prompt,
         json_conversion_prompt,
+        prompt_cache=None,
+        token_budget=None,
+        output_tokens_estimate=2000,
     ):
         self.config = config
         self.client = client
         self.system_instructions = system_instructions
         self.consolidated_eval_prompt = consolidated_eval_prompt
         self.json_conversion_prompt = json_conversion_prompt
+        self.prompt_cache = prompt_cache
+        self.token_budget = token_budget
+        self.output_tokens_estimate = output_tokens_estimate
 
     def execute(self, code, language, region_tag, github_link):
         """
@@ -46,17 +55,12 @@ class CodeEvaluator(BaseTool):
         # The first LLM call uses Google Search as a grounding tool to ensure the
         # analysis is based on the most current and accurate information.
         grounding_tool = Tool(google_search=GoogleSearch())
-        grounding_generation_config = types.GenerateContentConfig(
-            temperature=0.0,
-            system_instruction=self.system_instructions,
-            tools=[grounding_tool],
-        )
-
         try:
-            response = self.client.models.generate_content(
-                model=self.config.VERTEXAI_MODEL_NAME,
+            response = self._generate_content(
+                cache_key="grounding",
                 contents=prompt,
-                config=grounding_generation_config,
+                tools=[grounding_tool],
+                temperature=0.0,
             )
             analysis_text = response.text
             time.sleep(1)
@@ -70,24 +74,80 @@ class CodeEvaluator(BaseTool):
         )
 
         # Grounding is not needed for this second, simpler formatting task.
-        json_generation_config = types.GenerateContentConfig(
-            temperature=0.0,
-            top_p=0.9,
-            seed=5,
-            system_instruction=self.system_instructions,
-        )
-
         try:
-            response = self.client.models.generate_content(
-                model=self.config.VERTEXAI_MODEL_NAME,
+            response = self._generate_content(
+                cache_key="json_conversion",
                 contents=json_prompt,
-                config=json_generation_config,
+                temperature=0.0,
+                top_p=0.9,
+                seed=5,
             )
             time.sleep(1)
             return response.text
         except Exception as e:
             raise CodeEvaluatorError(f"Error converting analysis to JSON: {e}")
 
+    def _generate_content(self, cache_key, contents, tools=None, **config_kwargs):
+        """
+        Calls the model within the token budget, if one is set.
+
+        The call waits until its estimated tokens fit the TPM/RPM quota, and
+        the usage the model reports is settled against the estimate.
+        """
+        if self.token_budget is None:
+            return self._call_model(cache_key, contents, tools, **config_kwargs)
+        admission = self.token_budget.admit(
+            self.token_budget.estimate(
+                text_chars(self.system_instructions) + text_chars(contents),
+                self.output_tokens_estimate,
+            ),
+            kind=cache_key,
+        )
+        response = self._call_model(cache_key, contents, tools, **config_kwargs)
+        used = getattr(
+            getattr(response, "usage_metadata", None), "total_token_count", None
+        )
+        self.token_budget.settle(admission, used if isinstance(used, int) else None)
+        return response
+
+    def _call_model(self, cache_key, contents, tools=None, **config_kwargs):
+        """
+        Calls the model, referencing the cached system instructions when available.
+
+        Cached content already carries the system instructions and tools, so
+        they are only attached to the request when falling back to an uncached
+        call. If the cache entry turned out to be missing or expired, it is
+        invalidated and the request is retried inline once; any other error
+        is raised, so throttling does not double the requests.
+        """
+        cached_content = (
+            self.prompt_cache.get(cache_key, tools=tools) if self.prompt_cache else None
+        )
+        if cached_content:
+            try:
+                return self.client.models.generate_content(
+                    model=self.config.VERTEXAI_MODEL_NAME,
+                    contents=contents,
+                    config=types.GenerateContentConfig(
+                        cached_content=cached_content, **config_kwargs
+                    ),
+                )
+            except Exception as e:
+                if not is_stale_cache_error(e):
+                    raise
+                logger.warning(f"Cached content is gone, retrying inline: {e}")
+                self.prompt_cache.invalidate(cache_key, cached_content)
+
+        return self.client.models.generate_content(
+            model=self.config.VERTEXAI_MODEL_NAME,
+            contents=contents,
+            config=types.GenerateContentConfig(
+                system_instruction=self.system_instructions,
+                tools=tools,
+                **config_kwargs,
+            ),
+        )
+
     def _fill_prompt_placeholders(
         self,
         prompt_template_string: str,
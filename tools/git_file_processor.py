@@ -69,6 +69,65 @@ class GitFileProcessor(BaseTool):
         except Exception as e:
             raise GitProcessorError(str(e))
 
+    def deleted_file_info(self, repo_root, relative_path):
+        """
+        Returns Git metadata for a file that has been deleted from the checkout
+        at `repo_root`, in the same shape as `execute`. `last_updated` is the
+        date of the commit that deleted it.
+
+        Raises:
+            GitProcessorError: If the Git commands fail.
+        """
+        # The helpers run git in the directory of the path they are given,
+        # which for a deleted file may no longer exist, so they are anchored
+        # at the repository root.
+        anchor = os.path.join(repo_root, ".git")
+        try:
+            owner, repo = self._get_github_owner_repo(anchor)
+            branch_name = self._get_branch_name(anchor)
+            deleting_commit = (
+                subprocess.check_output(
+                    ["git", "log", "-1", "--format=%H%x00%ad", "--", relative_path],
+                    cwd=repo_root,
+                )
+                .decode("utf-8")
+                .strip()
+            )
+        except (subprocess.CalledProcessError, OSError) as e:
+            raise GitProcessorError(f"Error reading history of {relative_path}: {e}")
+
+        commit_hash, _, date = deleting_commit.partition("\x00")
+        return {
+            "github_owner": owner,
+            "github_repo": repo,
+            "github_link": f"https://github.com/{owner}/{repo}/blob/{branch_name}/{relative_path}"
+            if owner and repo and branch_name
+            else None,
+            "branch_name": branch_name,
+            "last_updated": datetime.strptime(date, "%a %b %d %H:%M:%S %Y %z").strftime(
+                "%Y-%m-%d"
+            )
+            if date
+            else None,
+            "commit_history": [{"hash": commit_hash, "date": date}]
+            if commit_hash
+            else [],
+            "metadata": {"deleted": True},
+        }
+
+    def github_link_prefix(self, repo_root):
+        """
+        Returns the GitHub link of the checkout at `repo_root` that its files'
+        relative paths are appended to, as in `execute`, or None if it has no
+        GitHub remote or branch.
+        """
+        anchor = os.path.join(repo_root, ".git")
+        owner, repo = self._get_github_owner_repo(anchor)
+        branch_name = self._get_branch_name(anchor)
+        if not owner or not repo or not branch_name:
+            return None
+        return f"https://github.com/{owner}/{repo}/blob/{branch_name}/"
+
     def _get_github_owner_repo(self, file_path):
         """
         Gets the GitHub owner and repository name from the remote URL.
@@ -183,3 +242,11 @@ class GitFileProcessor(BaseTool):
             return commits
         except subprocess.CalledProcessError as e:
             raise GitProcessorError(f"Error getting commit history: {e}")
+
+
+def extract_git_info(file_path):
+    """
+    Runs `GitFileProcessor.execute` as a module-level function, so it can be
+    submitted to a process pool with only the file path pickled.
+    """
+    return GitFileProcessor().execute(file_path)
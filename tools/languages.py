@@ -0,0 +1,30 @@
+from typing import Dict
+
+# The language sent to the analysis API for each supported file extension.
+# Files whose language is "Unknown" are indexed for region tags but not
+# analyzed.
+FILE_EXTENSION_MAP: Dict[str, str] = {
+    ".py": "Python",
+    ".java": "Java",
+    ".groovy": "Java",
+    ".kt": "Java",
+    ".scala": "Java",
+    ".go": "Go",
+    ".rb": "Ruby",
+    ".rs": "Rust",
+    ".cs": "C#",
+    ".cpp": "C++",
+    ".cc": "C++",
+    ".h": "C++",
+    ".c": "C++",
+    ".hpp": "C++",
+    ".php": "PHP",
+    ".tf": "Terraform",
+    ".js": "JavaScript",
+    ".ts": "JavaScript",  # TypeScript is normalized to Javascript.
+    ".jsx": "JavaScript",
+    ".tsx": "JavaScript",
+    ".sh": "Unknown",
+    ".yaml": "Unknown",
+    ".xml": "Unknown",
+}
@@ -0,0 +1,128 @@
+import functools
+import os
+import re
+import yaml
+from tools.region_tag_index import REGION_TAG_PATTERN
+
+HIERARCHY_PATH = os.path.join(os.path.dirname(__file__), "product_hierarchy.yaml")
+
+# Module references in import-like statements across the supported languages.
+IMPORT_PATTERNS = [
+    re.compile(
+        r"^\s*((?:from\s+[\w.]+\s+)?import\s+(?:static\s+)?[\w., ]+)", re.MULTILINE
+    ),
+    re.compile(r"^\s*using\s+(?:static\s+)?([\w.]+)\s*;", re.MULTILINE),
+    re.compile(r"^\s*use\s+([\w\\]+)", re.MULTILINE),
+    re.compile(r"""require(?:_relative)?\s*\(?\s*['"]([^'"]+)['"]"""),
+    re.compile(r"""from\s+['"]([^'"]+)['"]"""),
+    re.compile(r""""((?:cloud\.google\.com|google\.golang\.org)/[^"]+)\""""),
+]
+
+# Path segments that identify a Google package but not a specific product.
+GENERIC_SEGMENTS = {
+    "",
+    "from",
+    "import",
+    "static",
+    "as",
+    "google",
+    "googlecloud",
+    "cloud",
+    "com",
+    "go",
+    "golang",
+    "org",
+    "api",
+    "apis",
+}
+
+
+def _normalize(token):
+    token = re.sub(r"[-_]", "", token.lower())
+    # Drop API version suffixes such as `spanner_v1` or `tasks_v2beta3`.
+    return re.sub(r"v\d+(?:(?:alpha|beta)\d*)?$", "", token)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_keywords(hierarchy_path):
+    """
+    Maps each normalized keyword in the hierarchy to its (category, product).
+    The file is parsed once per process and the mapping is shared, read-only,
+    by every classifier.
+    """
+    with open(hierarchy_path, "r") as f:
+        hierarchy = yaml.safe_load(f)
+
+    keyword_to_product = {}
+    for category in hierarchy:
+        for product in category["products"]:
+            for keyword in product.get("keywords") or []:
+                keyword_to_product[_normalize(keyword)] = (
+                    category["category"],
+                    product["product"],
+                )
+    return keyword_to_product
+
+
+class ProductClassifier:
+    """
+    A local, heuristic product classifier for code samples.
+
+    Region tag prefixes (e.g. `spanner` in `[START spanner_query]`) and Google
+    client library imports are matched against the keywords in
+    `product_hierarchy.yaml`. A classification is only returned when both
+    signals agree on a single product, so anything ambiguous is left for the
+    analysis API.
+    """
+
+    def __init__(self, hierarchy_path=HIERARCHY_PATH):
+        self._keyword_to_product = _load_keywords(hierarchy_path)
+
+    def classify(self, code):
+        """
+        Classifies a code sample from its region tags and imports.
+
+        Returns:
+            dict: `product_category`, `product_name` and `region_tag` when the
+            classification is high-confidence, otherwise None.
+        """
+        region_tags = REGION_TAG_PATTERN.findall(code)
+        if not region_tags:
+            return None
+
+        tag_products = {self._match_region_tag(tag) for tag in region_tags} - {None}
+        import_products = self._match_imports(code)
+        if len(tag_products) != 1 or tag_products != import_products:
+            return None
+
+        category, product = tag_products.pop()
+        return {
+            "product_category": category,
+            "product_name": product,
+            "region_tag": region_tags[0],
+        }
+
+    def _match_region_tag(self, region_tag):
+        # Try the longest underscore-delimited prefix first, so that
+        # `cloud_sql_connect` resolves via `cloudsql` rather than `cloud`.
+        segments = region_tag.split("_")
+        for length in range(min(len(segments), 3), 0, -1):
+            match = self._keyword_to_product.get(_normalize("".join(segments[:length])))
+            if match:
+                return match
+        return None
+
+    def _match_imports(self, code):
+        products = set()
+        for pattern in IMPORT_PATTERNS:
+            for module in pattern.findall(code):
+                if "google" not in module.lower():
+                    continue
+                for segment in re.split(r"[./\\:@\s,]+", module):
+                    normalized = _normalize(segment)
+                    if normalized in GENERIC_SEGMENTS:
+                        continue
+                    match = self._keyword_to_product.get(normalized)
+                    if match:
+                        products.add(match)
+        return products
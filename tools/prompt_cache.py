@@ -0,0 +1,156 @@
+import threading
+import time
+from concurrent.futures import Future
+from google.genai import types
+from utils.logger import logger
+
+
+class PromptCache:
+    """
+    Registers the static system instructions as Vertex AI cached content.
+
+    The auditor persona in `prompts/system_instructions.txt` is identical for
+    every file, so instead of resending it on every `generate_content` call it
+    is uploaded once per run and referenced by name. A separate cache entry is
+    kept for each tool configuration because cached content cannot be combined
+    with request-level `system_instruction` or `tools`.
+
+    If caching is disabled, unsupported by the model, or the prompt is below the
+    model's minimum cacheable size, `get` returns None and callers fall back to
+    sending the system instructions inline.
+    """
+
+    def __init__(self, config, client, system_instructions):
+        self.config = config
+        self.client = client
+        self.system_instructions = system_instructions
+        self.enabled = getattr(config, "PROMPT_CACHE_ENABLED", True)
+        self.ttl_seconds = getattr(config, "PROMPT_CACHE_TTL_SECONDS", 3600)
+        # Entries are refreshed a little before expiry so in-flight requests
+        # never reference content the service has already evicted. The margin
+        # is capped at a tenth of the TTL so short TTLs are still reused.
+        self.refresh_margin = min(60, self.ttl_seconds / 10)
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        # Keys whose cache is being created, mapped to a Future of its name.
+        self._creating = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, tools=None):
+        """
+        Returns the cached content name for the given tool configuration.
+
+        The entry is created on first use and recreated shortly before its TTL
+        expires, after which the superseded cache is deleted. Creation runs
+        outside the lock; threads asking for the same key meanwhile wait for
+        it. Returns None (and counts a miss) when caching is unavailable.
+        """
+        with self._lock:
+            if not self.enabled:
+                self.misses += 1
+                return None
+
+            entry = self._entries.get(key)
+            if entry and time.monotonic() < entry["expires_at"] - self.refresh_margin:
+                self.hits += 1
+                return entry["name"]
+
+            future = self._creating.get(key)
+            creator = future is None
+            if creator:
+                future = self._creating[key] = Future()
+
+        if not creator:
+            name = future.result()
+            with self._lock:
+                if name:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            return name
+
+        name = self._create(key, tools)
+        with self._lock:
+            self._creating.pop(key)
+            superseded = self._entries.get(key)
+            if name:
+                self._entries[key] = {
+                    "name": name,
+                    "expires_at": time.monotonic() + self.ttl_seconds,
+                }
+                # The request that triggers creation is the first to read it.
+                self.hits += 1
+            else:
+                self.misses += 1
+        future.set_result(name)
+        if name and superseded:
+            self._delete(superseded["name"])
+        return name
+
+    def _create(self, key, tools):
+        try:
+            cache = self.client.caches.create(
+                model=self.config.VERTEXAI_MODEL_NAME,
+                config=types.CreateCachedContentConfig(
+                    display_name=f"jsrepoanalysis-{key}",
+                    system_instruction=self.system_instructions,
+                    tools=tools,
+                    ttl=f"{self.ttl_seconds}s",
+                ),
+            )
+        except Exception as e:
+            logger.warning(
+                f"Prompt caching unavailable, sending system instructions inline: {e}"
+            )
+            self.enabled = False
+            return None
+        logger.info(f"Registered cached system instructions '{cache.name}'.")
+        return cache.name
+
+    def invalidate(self, key, name=None):
+        """
+        Drops a cache entry after the service reported it missing or expired,
+        so the next request registers a fresh one. With `name`, the entry is
+        only dropped if it is still that cache, not one another thread has
+        registered since.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and (name is None or entry["name"] == name):
+                del self._entries[key]
+            self.hits -= 1
+            self.misses += 1
+
+    def _delete(self, name):
+        try:
+            self.client.caches.delete(name=name)
+        except Exception as e:
+            logger.warning(f"Could not delete cached content {name}: {e}")
+
+    def close(self):
+        """
+        Logs cache hit/miss counts and deletes the cached content for this run.
+        """
+        if self.hits or self.misses:
+            logger.info(f"Prompt cache stats: {self.hits} hits, {self.misses} misses.")
+        with self._lock:
+            names = [entry["name"] for entry in self._entries.values()]
+            self._entries.clear()
+        for name in names:
+            self._delete(name)
+
+
+def is_stale_cache_error(error):
+    """
+    Whether a failed request was rejected because the cached content it
+    referenced is gone (deleted, expired or never found). Other failures,
+    such as 429 or 5xx, say nothing about the cache.
+    """
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    message = str(error).lower()
+    if code == 404:
+        return True
+    return "cache" in message and any(
+        phrase in message for phrase in ("not found", "expired", "does not exist")
+    )
@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+from tools.languages import FILE_EXTENSION_MAP
+from utils.exceptions import FileReadError
+from utils.file_reader import check_source_file
+from utils.logger import logger
+
+REGION_TAG_PATTERN = re.compile(r"\[START\s+([\w-]+)\]")
+REGION_TAG_MARKER_PATTERN = re.compile(r"\[(START|END)\s+([\w-]+)\]")
+
+INDEX_FILENAME = "jsrepoanalysis-region-tags.json"
+INDEX_VERSION = 2
+
+# Directories never walked when indexing: git metadata and vendored or
+# installed dependencies, which hold no samples of their own.
+SKIPPED_DIRECTORIES = {
+    ".git",
+    ".venv",
+    "venv",
+    "__pycache__",
+    "node_modules",
+    "bower_components",
+    "vendor",
+    "third_party",
+}
+
+
+def scan_region_tags(lines):
+    """
+    Scans an iterable of lines for `[START x]` / `[END x]` region tag markers.
+
+    The body of each region (the lines strictly between its markers) is hashed
+    as it streams past, so the input is read exactly once. Nested and repeated
+    regions are supported; a START without a matching END is ignored.
+
+    Args:
+        lines: Any iterable of text lines, such as an open file.
+
+    Returns:
+        list: One dict per region with `tag`, `start_line`, `end_line`
+        (1-based marker lines) and `hash` (sha256 of the region body).
+    """
+    regions = []
+    open_regions = {}
+    for line_number, line in enumerate(lines, start=1):
+        started = []
+        for kind, tag in REGION_TAG_MARKER_PATTERN.findall(line):
+            if kind == "START":
+                digest = hashlib.sha256()
+                open_regions.setdefault(tag, []).append((line_number, digest))
+                started.append(digest)
+            elif open_regions.get(tag):
+                start_line, digest = open_regions[tag].pop()
+                regions.append(
+                    {
+                        "tag": tag,
+                        "start_line": start_line,
+                        "end_line": line_number,
+                        "hash": digest.hexdigest(),
+                    }
+                )
+        # Every region still open includes this line, except those whose START
+        # marker is on it. Nested markers are part of the enclosing region.
+        encoded = line.encode("utf-8", errors="replace")
+        for stack in open_regions.values():
+            for _, digest in stack:
+                if digest not in started:
+                    digest.update(encoded)
+    regions.sort(key=lambda region: (region["start_line"], region["tag"]))
+    return regions
+
+
+def find_repo_root(path):
+    """Returns the nearest ancestor directory of `path` containing `.git`."""
+    current = os.path.dirname(os.path.realpath(path))
+    while True:
+        if os.path.exists(os.path.join(current, ".git")):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+class RegionTagIndex:
+    """
+    An index of every region tag in a git repository.
+
+    The index is built in a single pass over the working tree and persisted
+    under the repository's `.git` directory, keyed by the HEAD commit, so it is
+    only rebuilt when the checkout changes. Files edited since the index was
+    built are detected by modification time and rescanned on lookup. Lookups
+    by file and by tag name are dictionary reads.
+    """
+
+    def __init__(
+        self, repo_root, head=None, regions=None, mtimes=None, max_file_bytes=0
+    ):
+        self.repo_root = repo_root
+        self.max_file_bytes = max_file_bytes
+        self.head = head
+        self.by_file = {}
+        self.by_tag = {}
+        self.mtimes = mtimes or {}
+        self._lock = threading.Lock()
+        for region in regions or []:
+            self._add(region)
+
+    def _add(self, region):
+        self.by_file.setdefault(region["file"], []).append(region)
+        self.by_tag.setdefault(region["tag"], []).append(region)
+
+    def _scan_file(self, path, relative_path):
+        try:
+            mtime = os.stat(path).st_mtime
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                regions = scan_region_tags(f)
+        except OSError:
+            return
+        self.mtimes[relative_path] = mtime
+        for region in regions:
+            self._add({"file": relative_path, **region})
+
+    def _rescan_file(self, path, relative_path):
+        for region in self.by_file.pop(relative_path, []):
+            self.by_tag[region["tag"]].remove(region)
+        self._scan_file(path, relative_path)
+
+    @property
+    def index_path(self):
+        return os.path.join(self.repo_root, ".git", INDEX_FILENAME)
+
+    @classmethod
+    def load_or_build(cls, repo_root, max_file_bytes=0):
+        """
+        Loads the persisted index for `repo_root`, rebuilding and saving it if
+        it is missing or was built for a different HEAD commit.
+        """
+        head = _get_head(repo_root)
+        index = cls(repo_root, head, max_file_bytes=max_file_bytes)
+        try:
+            with open(index.index_path, "r") as f:
+                data = json.load(f)
+            if (
+                data.get("version") == INDEX_VERSION
+                and head
+                and data.get("head") == head
+            ):
+                return cls(
+                    repo_root,
+                    head,
+                    data["regions"],
+                    data["mtimes"],
+                    max_file_bytes=max_file_bytes,
+                )
+        except (OSError, ValueError):
+            pass
+
+        index.build()
+        index.save()
+        return index
+
+    def build(self):
+        """
+        Walks the working tree and indexes every region tag.
+
+        Only files with an extension in `FILE_EXTENSION_MAP` are read, and
+        dependency directories (`SKIPPED_DIRECTORIES`) are not entered. Binary
+        files and files over `max_file_bytes` are skipped.
+        """
+        self.by_file = {}
+        self.by_tag = {}
+        self.mtimes = {}
+        for root, dirs, files in os.walk(self.repo_root):
+            dirs[:] = [d for d in dirs if d not in SKIPPED_DIRECTORIES]
+            for name in files:
+                if os.path.splitext(name)[1] not in FILE_EXTENSION_MAP:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    check_source_file(path, self.max_file_bytes)
+                except FileReadError:
+                    continue
+                relative_path = os.path.relpath(path, self.repo_root).replace(
+                    os.sep, "/"
+                )
+                self._scan_file(path, relative_path)
+        logger.info(
+            f"Indexed {len(self.by_tag)} region tags in {len(self.by_file)} files "
+            f"under {self.repo_root}."
+        )
+
+    def save(self):
+        regions = [region for regions in self.by_file.values() for region in regions]
+        try:
+            with open(self.index_path, "w") as f:
+                json.dump(
+                    {
+                        "version": INDEX_VERSION,
+                        "head": self.head,
+                        "regions": regions,
+                        "mtimes": self.mtimes,
+                    },
+                    f,
+                )
+        except OSError as e:
+            logger.warning(f"Could not persist region tag index {self.index_path}: {e}")
+
+    def regions_for_file(self, file_path):
+        """Returns the indexed regions for a file, in order of appearance."""
+        relative_path = os.path.relpath(
+            os.path.realpath(file_path), os.path.realpath(self.repo_root)
+        ).replace(os.sep, "/")
+        with self._lock:
+            try:
+                if os.stat(file_path).st_mtime != self.mtimes.get(relative_path):
+                    self._rescan_file(file_path, relative_path)
+            except OSError:
+                pass
+            return list(self.by_file.get(relative_path, []))
+
+    def lookup(self, tag):
+        """Returns every region with the given tag name across the repository."""
+        with self._lock:
+            return list(self.by_tag.get(tag, []))
+
+
+class RegionTagIndexCache:
+    """
+    Shares one RegionTagIndex per repository across worker threads, building
+    each index at most once per run.
+    """
+
+    def __init__(self, max_file_bytes=0):
+        self.max_file_bytes = max_file_bytes
+        self._indexes = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, file_path):
+        """Returns the index for the repository containing `file_path`."""
+        repo_root = find_repo_root(file_path)
+        if repo_root is None:
+            return None
+        with self._lock:
+            repo_lock = self._locks.setdefault(repo_root, threading.Lock())
+        with repo_lock:
+            if repo_root not in self._indexes:
+                self._indexes[repo_root] = RegionTagIndex.load_or_build(
+                    repo_root, self.max_file_bytes
+                )
+            return self._indexes[repo_root]
+
+    def regions_for_file(self, file_path):
+        """Returns the indexed regions for a file, in order of appearance."""
+        index = self.get(file_path)
+        if index is None:
+            return []
+        return index.regions_for_file(file_path)
+
+    def region_tags_for_file(self, file_path):
+        """Returns the distinct region tag names in a file, in order."""
+        return list(dict.fromkeys(r["tag"] for r in self.regions_for_file(file_path)))
+
+
+def _get_head(repo_root):
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "HEAD"], cwd=repo_root, stderr=subprocess.DEVNULL
+            )
+            .decode("utf-8")
+            .strip()
+        )
+    except (subprocess.CalledProcessError, OSError):
+        return None
@@ -0,0 +1,197 @@
+import json
+import os
+import subprocess
+from tools.region_tag_index import _get_head, find_repo_root
+from utils.exceptions import GitProcessorError
+from utils.logger import logger
+
+STATE_FILENAME = "jsrepoanalysis-delta.json"
+STATE_VERSION = 1
+
+
+def changes_between(repo_root, base, head):
+    """
+    Lists what changed in a repository between two commits with
+    `git diff --name-status`.
+
+    Renames count as a deletion of the old path and an addition of the new
+    one; copies as an addition.
+
+    Returns:
+        tuple: (changed, deleted) sets of paths relative to `repo_root`.
+
+    Raises:
+        GitProcessorError: If the diff cannot be computed, e.g. because `base`
+            is no longer in the history after a force push.
+    """
+    try:
+        output = subprocess.check_output(
+            ["git", "diff", "--name-status", "-z", "-M", base, head],
+            cwd=repo_root,
+            stderr=subprocess.PIPE,
+        ).decode("utf-8")
+    except (subprocess.CalledProcessError, OSError) as e:
+        raise GitProcessorError(f"Could not diff {base}..{head} in {repo_root}: {e}")
+
+    changed, deleted = set(), set()
+    fields = iter(output.split("\0"))
+    for status in fields:
+        if not status:
+            continue
+        path = next(fields)
+        if status[0] in "RC":
+            new_path = next(fields)
+            if status[0] == "R":
+                deleted.add(path)
+            changed.add(new_path)
+        elif status[0] == "D":
+            deleted.add(path)
+        else:
+            # Added, modified, type changed.
+            changed.add(path)
+    return changed, deleted
+
+
+class DeltaState:
+    """
+    The last fully analysed commit of a repository, per BigQuery table.
+
+    Persisted under the repository's `.git` directory, like the region tag
+    index, so it travels with the clone and is simply absent (meaning "analyse
+    everything") for a fresh clone. Alongside the commit it keeps the files
+    that were covered at that commit, so files newly added to an inventory
+    are picked up even if the repository did not change.
+    """
+
+    def __init__(self, repo_root):
+        self.repo_root = repo_root
+        self.tables = {}
+
+    @property
+    def path(self):
+        return os.path.join(self.repo_root, ".git", STATE_FILENAME)
+
+    @classmethod
+    def load(cls, repo_root):
+        state = cls(repo_root)
+        try:
+            with open(state.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == STATE_VERSION:
+                state.tables = data["tables"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return state
+
+    def get(self, table_id):
+        """Returns (sha, covered files) for `table_id`, or (None, empty set)."""
+        entry = self.tables.get(table_id) or {}
+        return entry.get("sha"), set(entry.get("files", []))
+
+    def set(self, table_id, sha, files):
+        self.tables[table_id] = {"sha": sha, "files": sorted(files)}
+
+    def save(self):
+        try:
+            with open(self.path, "w") as f:
+                json.dump({"version": STATE_VERSION, "tables": self.tables}, f)
+        except OSError as e:
+            logger.warning(f"Could not persist delta state {self.path}: {e}")
+
+
+class RepoPlan:
+    """What a delta run does for one repository."""
+
+    def __init__(self, repo_root, base, head, files, deleted, covered):
+        self.repo_root = repo_root
+        self.base = base
+        self.head = head
+        # Absolute paths of the input files in this repository.
+        self.files = files
+        # Relative paths deleted since `base`, to be recorded as tombstones.
+        self.deleted = deleted
+        # Relative paths covered by `base`.
+        self.covered = covered
+
+
+def plan_delta(files, table_id):
+    """
+    Narrows `files` to those that changed since each repository's last fully
+    analysed commit for `table_id`.
+
+    For a repository with no recorded commit (or one whose commit cannot be
+    diffed against), every input file is kept. Otherwise only files added,
+    modified or renamed since that commit, plus input files that were not
+    covered by it, are kept, and deleted files are listed for tombstones.
+    Files outside any git repository are always kept.
+
+    Returns:
+        tuple: (files to process, list of RepoPlan).
+    """
+    by_repo = {}
+    to_process = []
+    for file_path in files:
+        repo_root = find_repo_root(file_path)
+        if repo_root is None:
+            to_process.append(file_path)
+        else:
+            by_repo.setdefault(repo_root, []).append(file_path)
+
+    plans = []
+    for repo_root, repo_files in by_repo.items():
+        head = _get_head(repo_root)
+        base, covered = DeltaState.load(repo_root).get(table_id)
+        relative = {
+            file_path: os.path.relpath(
+                os.path.realpath(file_path), os.path.realpath(repo_root)
+            ).replace(os.sep, "/")
+            for file_path in repo_files
+        }
+        deleted = set()
+        if head is None or base is None:
+            selected = repo_files
+        elif base == head:
+            selected = [f for f in repo_files if relative[f] not in covered]
+        else:
+            try:
+                changed, deleted = changes_between(repo_root, base, head)
+            except GitProcessorError as e:
+                logger.warning(f"{e}; analysing every file in {repo_root}.")
+                changed, deleted, covered = None, set(), set()
+            selected = [
+                f
+                for f in repo_files
+                if changed is None
+                or relative[f] in changed
+                or relative[f] not in covered
+            ]
+        # Only files the previous runs covered are tombstoned.
+        deleted &= covered
+        logger.info(
+            f"Delta for {repo_root} ({base or 'no previous run'}..{head}): "
+            f"{len(selected)} of {len(repo_files)} files to analyse, "
+            f"{len(deleted)} deleted."
+        )
+        to_process.extend(selected)
+        plans.append(
+            RepoPlan(repo_root, base, head, repo_files, sorted(deleted), covered)
+        )
+    return to_process, plans
+
+
+def record_delta(plan, table_id):
+    """
+    Records `plan.head` as the last fully analysed commit of the repository.
+    Only call this once every file and deletion in the plan succeeded.
+    """
+    if plan.head is None:
+        return
+    covered = (plan.covered - set(plan.deleted)) | {
+        os.path.relpath(
+            os.path.realpath(file_path), os.path.realpath(plan.repo_root)
+        ).replace(os.sep, "/")
+        for file_path in plan.files
+    }
+    state = DeltaState.load(plan.repo_root)
+    state.set(table_id, plan.head, covered)
+    state.save()
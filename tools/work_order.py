@@ -0,0 +1,105 @@
+import os
+from datetime import datetime, timezone
+from tools.git_file_processor import GitFileProcessor
+from tools.languages import FILE_EXTENSION_MAP
+from tools.region_tag_index import find_repo_root
+from utils.exceptions import BigQueryError
+from utils.logger import logger
+from utils.scheduling import longest_first
+
+DISCOVERY = "discovery"
+LONGEST_FIRST = "longest-first"
+STALEST_FIRST = "stalest-first"
+ORDERS = (DISCOVERY, LONGEST_FIRST, STALEST_FIRST)
+
+# Sorts files that were never evaluated before everything else.
+_NEVER_EVALUATED = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def estimated_seconds(file_path, latency_history):
+    """
+    How long the analysis API is expected to take for `file_path`: its size
+    times the observed seconds per byte for its language.
+    """
+    _, file_extension = os.path.splitext(file_path)
+    try:
+        size = os.path.getsize(file_path)
+    except OSError:
+        size = 0
+    return latency_history.estimate(FILE_EXTENSION_MAP.get(file_extension), size)
+
+
+def stalest_first(files, bigquery_repo):
+    """
+    Returns `files` ordered by their last evaluation in `bigquery_repo`,
+    oldest first, with files that were never evaluated at the front. Ties keep
+    their original order.
+
+    Each file's GitHub link is built from its repository's remote and branch,
+    read once per repository, and the evaluations are fetched with one
+    query per repository. Files outside a GitHub checkout count as never evaluated.
+
+    Raises:
+        BigQueryError: If the evaluations cannot be read.
+    """
+    git_processor = GitFileProcessor()
+    prefixes = {}
+    links = {}
+    for file_path in files:
+        repo_root = find_repo_root(file_path)
+        if repo_root is None:
+            continue
+        if repo_root not in prefixes:
+            prefixes[repo_root] = git_processor.github_link_prefix(repo_root)
+        if prefixes[repo_root] is not None:
+            links[file_path] = prefixes[repo_root] + os.path.relpath(
+                os.path.realpath(file_path), os.path.realpath(repo_root)
+            )
+
+    evaluated = bigquery_repo.last_evaluations(links.values())
+
+    def last_evaluated(file_path):
+        evaluation_date = evaluated.get(links.get(file_path))
+        if evaluation_date is None:
+            return _NEVER_EVALUATED
+        if evaluation_date.tzinfo is None:
+            evaluation_date = evaluation_date.replace(tzinfo=timezone.utc)
+        return evaluation_date
+
+    ordered = sorted(files, key=last_evaluated)
+    logger.info(
+        f"{len(files) - sum(link in evaluated for link in links.values())} of "
+        f"{len(files)} files have never been evaluated; they are processed first."
+    )
+    return ordered
+
+
+def order_files(files, order, bigquery_repo=None, latency_history=None):
+    """
+    Orders `files` for processing.
+
+    Args:
+        files (list): The files in discovery order.
+        order (str): One of `ORDERS`. `"discovery"` keeps the order;
+            `"longest-first"` starts the files with the longest estimated API
+            time first, which shortens the run's tail; `"stalest-first"`
+            starts the files whose last evaluation is oldest, so a partial
+            run refreshes the most out-of-date results.
+        bigquery_repo: The BigQueryRepository, for `"stalest-first"`.
+        latency_history: A `utils.scheduling.LatencyHistory`, for
+            `"longest-first"`.
+
+    Returns:
+        list: The files in processing order. If the evaluations cannot be read
+        for `"stalest-first"`, the discovery order is kept.
+    """
+    if order == LONGEST_FIRST:
+        return longest_first(
+            files, lambda file_path: estimated_seconds(file_path, latency_history)
+        )
+    if order == STALEST_FIRST:
+        try:
+            return stalest_first(files, bigquery_repo)
+        except BigQueryError as e:
+            logger.warning(f"{e}; keeping the discovery order.")
+    return list(files)
@@ -0,0 +1,209 @@
+import math
+import threading
+import time
+from utils.logger import logger
+
+
+def text_chars(text):
+    """
+    The characters in `text`, a string or a list of lines (the system
+    instructions are loaded as `splitlines()`), counting a newline per line.
+    """
+    if isinstance(text, str):
+        return len(text)
+    return sum(len(line) + 1 for line in text)
+
+
+class Admission:
+    """One request admitted by a `TokenBudget`."""
+
+    def __init__(self, kind, estimated, charged, waited):
+        self.kind = kind
+        # The caller's raw estimate, and the calibrated amount taken from the
+        # bucket for it.
+        self.estimated = estimated
+        self.charged = charged
+        self.waited = waited
+
+
+class TokenBudget:
+    """
+    Token-bucket admission control for a model's tokens-per-minute (TPM) and
+    requests-per-minute (RPM) quota.
+
+    Before a request is sent, its tokens are estimated from its size and
+    `admit` takes them, and one request, from buckets that refill at the
+    per-minute rates. A caller that would overdraw either bucket waits until
+    it has refilled enough. Callers reserve in arrival order and then sleep,
+    so a large request is not starved by smaller ones.
+
+    Once the request has finished, `settle` corrects the bucket by the
+    difference between the charge and the tokens actually used, when those
+    are reported. It also adjusts a per-kind calibration factor applied to
+    later estimates. The sum admitted therefore tracks the quota itself
+    rather than the estimate. Requests sent on top of an admitted one, such
+    as hedges and retries, go through `try_admit` or `charge` so the buckets
+    account for them too. With both limits at 0 nothing waits, but usage is
+    still tracked for `stats`. Thread-safe.
+    """
+
+    # Weight of each reported request in the calibration factors.
+    ALPHA = 0.1
+
+    def __init__(self, tokens_per_minute=0, requests_per_minute=0, chars_per_token=4.0):
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.chars_per_token = chars_per_token
+        self.requests = 0
+        self.estimated_tokens = 0
+        self.charged_tokens = 0
+        self.reported_requests = 0
+        # Charged and actual tokens of the requests that reported usage.
+        self.reported_charged_tokens = 0
+        self.actual_tokens = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self._factors = {}
+        # Bucket levels; negative while callers are waiting on a reservation.
+        self._tokens = float(tokens_per_minute)
+        self._request_slots = float(requests_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def estimate(self, chars, output_tokens=0):
+        """Estimated tokens for `chars` characters of prompt plus the output."""
+        return math.ceil(chars / self.chars_per_token) + output_tokens
+
+    def admit(self, tokens, kind=None):
+        """
+        Blocks until a request of `tokens` estimated tokens fits the quota,
+        then returns its `Admission`.
+
+        Args:
+            tokens (int): The raw estimate, e.g. from `estimate`.
+            kind: Requests of the same kind share a calibration factor.
+        """
+        with self._lock:
+            self._refill()
+            admission = self._take(tokens, kind)
+            if admission.waited:
+                self.waits += 1
+                self.wait_seconds += admission.waited
+        if admission.waited:
+            time.sleep(admission.waited)
+        return admission
+
+    def try_admit(self, tokens, kind=None):
+        """
+        Like `admit`, but only if the request fits the quota right away.
+
+        Returns:
+            Admission: The admission, or None (and nothing is taken) if the
+            request would have to wait, e.g. while the bucket is in deficit.
+        """
+        with self._lock:
+            self._refill()
+            if (
+                self.tokens_per_minute
+                and self._tokens < self._factors.get(kind, 1.0) * tokens
+            ) or (self.requests_per_minute and self._request_slots < 1):
+                return None
+            return self._take(tokens, kind)
+
+    def charge(self, tokens, kind=None):
+        """
+        Takes a request that was sent without admission, such as a retry,
+        from the buckets without waiting. The buckets may go into deficit,
+        which later admissions wait out.
+        """
+        with self._lock:
+            self._refill()
+            return self._take(tokens, kind)
+
+    def _take(self, tokens, kind):
+        charged = max(1, math.ceil(tokens * self._factors.get(kind, 1.0)))
+        self._tokens -= charged
+        self._request_slots -= 1
+        wait = max(
+            -self._tokens * 60 / self.tokens_per_minute
+            if self.tokens_per_minute
+            else 0,
+            -self._request_slots * 60 / self.requests_per_minute
+            if self.requests_per_minute
+            else 0,
+            0,
+        )
+        self.requests += 1
+        self.estimated_tokens += tokens
+        self.charged_tokens += charged
+        return Admission(kind, tokens, charged, wait)
+
+    def settle(self, admission, actual_tokens):
+        """
+        Records the tokens `admission` actually used, or does nothing if
+        `actual_tokens` is None (usage not reported).
+        """
+        if actual_tokens is None or admission.estimated <= 0:
+            return
+        with self._lock:
+            self.reported_requests += 1
+            self.reported_charged_tokens += admission.charged
+            self.actual_tokens += actual_tokens
+            # Refunds an overestimate or takes the rest of an underestimate.
+            self._tokens = min(
+                self._tokens + admission.charged - actual_tokens,
+                float(self.tokens_per_minute),
+            )
+            factor = self._factors.get(admission.kind, 1.0)
+            self._factors[admission.kind] = factor + self.ALPHA * (
+                actual_tokens / admission.estimated - factor
+            )
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(
+            self._tokens + elapsed * self.tokens_per_minute / 60,
+            float(self.tokens_per_minute),
+        )
+        self._request_slots = min(
+            self._request_slots + elapsed * self.requests_per_minute / 60,
+            float(self.requests_per_minute),
+        )
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "estimated_tokens": self.estimated_tokens,
+                "charged_tokens": self.charged_tokens,
+                "reported_requests": self.reported_requests,
+                "reported_charged_tokens": self.reported_charged_tokens,
+                "actual_tokens": self.actual_tokens,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 1),
+                "calibration": {
+                    kind or "default": round(factor, 3)
+                    for kind, factor in self._factors.items()
+                },
+            }
+
+    def log_summary(self):
+        """Logs estimated against actual usage, if anything was admitted."""
+        stats = self.stats()
+        if not stats["requests"]:
+            return
+        summary = (
+            f"Model quota: admitted {stats['requests']} requests, "
+            f"{stats['charged_tokens']} tokens estimated; waited "
+            f"{stats['waits']} times for {stats['wait_seconds']}s."
+        )
+        if stats["reported_requests"]:
+            summary += (
+                f" {stats['reported_requests']} requests reported "
+                f"{stats['actual_tokens']} tokens used against "
+                f"{stats['reported_charged_tokens']} estimated "
+                f"(calibration {stats['calibration']})."
+            )
+        logger.info(summary)
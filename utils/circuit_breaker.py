@@ -0,0 +1,177 @@
+import threading
+import time
+from utils.exceptions import CircuitOpenError
+from utils.logger import logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker around one external dependency (the analysis API or
+    BigQuery).
+
+    While closed, calls go straight through. After `failure_threshold`
+    consecutive failures the breaker opens and callers block instead of
+    hammering a dependency that is down. Once `reset_timeout` seconds have
+    passed, a single caller is let through as a probe (half-open): if it
+    succeeds the breaker closes and every waiting caller resumes; if it fails
+    the breaker opens again for another `reset_timeout`. If the dependency is
+    still down `max_outage` seconds after the breaker first opened, the
+    breaker gives up and every call raises `CircuitOpenError`, so the run can
+    wind down and record what is left.
+
+    Only exceptions for which `is_failure` returns True count against the
+    dependency; anything else (a 400 for one bad request, say) shows that the
+    dependency answered and counts as a success. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        name,
+        failure_threshold=20,
+        reset_timeout=30.0,
+        max_outage=1800.0,
+        is_failure=None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_outage = max_outage
+        self.is_failure = is_failure or (lambda e: True)
+        self.state = CLOSED
+        self.gave_up = False
+        self.transitions = 0
+        self._failures = 0
+        self._opened_at = None
+        self._probe_at = None
+        self._changed_at = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _transition(self, state, now):
+        # Called with the condition held. Logged in key=value form so state
+        # changes can be picked out of the run log as metrics.
+        logger.warning(
+            f"circuit_breaker dependency={self.name} from={self.state} to={state} "
+            f"consecutive_failures={self._failures} "
+            f"seconds_in_previous_state={now - self._changed_at:.1f}"
+        )
+        self.state = state
+        self.transitions += 1
+        self._changed_at = now
+        self._condition.notify_all()
+
+    def _give_up(self, now):
+        self.gave_up = True
+        logger.error(
+            f"circuit_breaker dependency={self.name} gave_up=true "
+            f"outage_seconds={now - self._opened_at:.1f}"
+        )
+        self._condition.notify_all()
+
+    def check(self):
+        """
+        Raises:
+            CircuitOpenError: If the breaker has given up on the dependency.
+        """
+        if self.gave_up:
+            raise CircuitOpenError(
+                f"{self.name} has been unavailable for over {self.max_outage:.0f}s"
+            )
+
+    def before_call(self):
+        """
+        Waits until a call may be made.
+
+        Returns:
+            bool: True if the caller is the half-open probe.
+
+        Raises:
+            CircuitOpenError: If the breaker has given up on the dependency.
+        """
+        with self._condition:
+            while True:
+                self.check()
+                if self.state == CLOSED:
+                    return False
+                now = time.monotonic()
+                give_up_at = self._opened_at + self.max_outage
+                if now >= give_up_at:
+                    self._give_up(now)
+                    continue
+                if self.state == OPEN and now >= self._probe_at:
+                    self._transition(HALF_OPEN, now)
+                    return True
+                # A half-open breaker is woken by the probe's outcome.
+                wake_at = give_up_at if self.state == HALF_OPEN else self._probe_at
+                self._condition.wait(min(wake_at, give_up_at) - now)
+
+    def record_success(self, probe=False):
+        """Records that the dependency answered, closing the breaker."""
+        with self._condition:
+            self._failures = 0
+            if self.state != CLOSED and not self.gave_up:
+                self._opened_at = None
+                self._transition(CLOSED, time.monotonic())
+
+    def record_failure(self, probe=False):
+        """Records a failed call, opening or re-opening the breaker."""
+        with self._condition:
+            now = time.monotonic()
+            if self.state == CLOSED:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._opened_at = now
+                    self._probe_at = now + self.reset_timeout
+                    self._transition(OPEN, now)
+            elif self.state == HALF_OPEN and probe:
+                self._failures += 1
+                self._probe_at = now + self.reset_timeout
+                self._transition(OPEN, now)
+            # Failures of calls already in flight when the breaker opened add
+            # nothing.
+
+    def _release_probe(self):
+        # The probe ended without an outcome (e.g. KeyboardInterrupt); let
+        # another caller probe straight away.
+        with self._condition:
+            if self.state == HALF_OPEN:
+                now = time.monotonic()
+                self._probe_at = now
+                self._transition(OPEN, now)
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Calls `fn(*args, **kwargs)` through the breaker, waiting while it is
+        open.
+
+        Raises:
+            CircuitOpenError: If the breaker has given up on the dependency.
+            Exception: Whatever `fn` raises.
+        """
+        probe = self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure(probe)
+            else:
+                self.record_success(probe)
+            raise
+        except BaseException:
+            if probe:
+                self._release_probe()
+            raise
+        self.record_success(probe)
+        return result
+
+    def stats(self):
+        """Returns the breaker's state and how often it changed."""
+        with self._condition:
+            return {
+                "state": self.state,
+                "transitions": self.transitions,
+                "gave_up": self.gave_up,
+            }
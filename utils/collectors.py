@@ -0,0 +1,235 @@
+import csv
+import os
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+from utils.logger import logger
+
+
+class RunStats:
+    """
+    Per-status, per-extension counters that worker threads can update without
+    contending on a shared lock.
+
+    Each thread increments its own private counters; the only synchronisation
+    is a one-time registration the first time a thread records anything. The
+    per-thread counters are merged when `totals` is called at the end of a run.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._thread_counters = []
+        self._register_lock = threading.Lock()
+
+    def _counters(self):
+        counters = getattr(self._local, "counters", None)
+        if counters is None:
+            counters = defaultdict(Counter)
+            self._local.counters = counters
+            with self._register_lock:
+                self._thread_counters.append(counters)
+        return counters
+
+    def increment(self, status, file_extension):
+        """Records one file with the given status ('processed', 'skipped', ...)."""
+        self._counters()[status][file_extension] += 1
+
+    def totals(self):
+        """
+        Merges every thread's counters.
+
+        Returns:
+            dict: A mapping of status to a Counter of file extension -> count.
+        """
+        merged = defaultdict(Counter)
+        with self._register_lock:
+            for counters in self._thread_counters:
+                for status, by_extension in counters.items():
+                    merged[status].update(by_extension)
+        return merged
+
+
+class StreamingCsvWriter:
+    """
+    A `csv.DictWriter`-style writer whose rows are written by a single
+    dedicated thread and made durable as the run progresses.
+
+    Worker threads call `writerow`, which only enqueues the row, so rows are
+    never interleaved regardless of the number of workers and the hot path
+    never waits on file I/O. The writer thread flushes and fsyncs every
+    `flush_rows` rows or `flush_interval` seconds, whichever comes first, so a
+    killed run loses at most one batch.
+
+    Files are opened in append mode and the header is only written to new
+    files, which lets a re-run continue an existing output. An existing file
+    whose header differs from `fieldnames` is refused rather than appended to.
+    When `shard_by` is set, `output_path` is a directory and each distinct
+    value of that column is written to its own `<value>.csv` file.
+
+    If the writer thread fails (a header mismatch, a full disk), it stops and
+    the error is raised from the next `writerow` and from `close`, so rows are
+    never dropped silently.
+    """
+
+    _SENTINEL = object()
+
+    def __init__(
+        self,
+        output_path,
+        fieldnames,
+        shard_by=None,
+        flush_rows=100,
+        flush_interval=5.0,
+    ):
+        self.output_path = output_path
+        self.fieldnames = fieldnames
+        self.shard_by = shard_by
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._files = {}
+        self._error = None
+        # Existing outputs are checked up front, before any work is done.
+        if shard_by:
+            if os.path.isdir(output_path):
+                for name in os.listdir(output_path):
+                    if name.endswith(".csv"):
+                        self._check_header(os.path.join(output_path, name))
+        else:
+            self._check_header(output_path)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="csv-writer", daemon=True
+        )
+        self._thread.start()
+
+    def writerow(self, row):
+        """
+        Queues `row` for writing.
+
+        Raises:
+            Exception: The error that stopped the writer thread, if any.
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put(row)
+
+    def _check_header(self, path):
+        """
+        Raises ValueError if `path` exists with a header other than
+        `fieldnames`.
+        """
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+        with open(path, "r", newline="") as f:
+            header = next(csv.reader(f), [])
+        if header != list(self.fieldnames):
+            raise ValueError(
+                f"Existing output {path} has columns {header}, expected "
+                f"{list(self.fieldnames)}; write to a new output instead."
+            )
+
+    def _shard_path(self, row):
+        if not self.shard_by:
+            return self.output_path
+        shard = str(row.get(self.shard_by) or "unknown").replace(os.sep, "_")
+        return os.path.join(self.output_path, f"{shard}.csv")
+
+    def _writer_for(self, row):
+        path = self._shard_path(row)
+        if path not in self._files:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+            if not is_new:
+                self._check_header(path)
+            csvfile = open(path, "a", newline="")
+            writer = csv.DictWriter(csvfile, fieldnames=self.fieldnames)
+            if is_new:
+                writer.writeheader()
+            self._files[path] = (csvfile, writer)
+        return self._files[path][1]
+
+    def _flush(self):
+        for csvfile, _ in self._files.values():
+            csvfile.flush()
+            os.fsync(csvfile.fileno())
+
+    def _run(self):
+        try:
+            self._write_rows()
+        except Exception as e:
+            logger.error(f"CSV writer stopped: {e}")
+            self._error = e
+        finally:
+            for csvfile, _ in self._files.values():
+                try:
+                    csvfile.close()
+                except OSError:
+                    pass
+
+    def _write_rows(self):
+        pending = 0
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, last_flush + self.flush_interval - time.monotonic())
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                row = None
+
+            if row is self._SENTINEL:
+                self._flush()
+                return
+
+            if row is not None:
+                self._writer_for(row).writerow(row)
+                pending += 1
+
+            if (
+                pending >= self.flush_rows
+                or time.monotonic() - last_flush >= self.flush_interval
+            ):
+                if pending:
+                    self._flush()
+                    pending = 0
+                last_flush = time.monotonic()
+
+    def close(self):
+        """
+        Writes and fsyncs any queued rows, then stops the writer thread.
+
+        Raises:
+            Exception: The error that stopped the writer thread, if any.
+        """
+        self._queue.put(self._SENTINEL)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+def read_completed(output_path, column):
+    """
+    Returns the set of values in `column` across an existing CSV output (or,
+    for sharded output, every `.csv` file in the directory). Used to skip
+    already-written work when a run is resumed.
+    """
+    if os.path.isdir(output_path):
+        paths = [
+            os.path.join(output_path, name)
+            for name in os.listdir(output_path)
+            if name.endswith(".csv")
+        ]
+    elif os.path.isfile(output_path):
+        paths = [output_path]
+    else:
+        return set()
+
+    completed = set()
+    for path in paths:
+        with open(path, "r", newline="") as f:
+            for row in csv.DictReader(f):
+                if row.get(column):
+                    completed.add(row[column])
+    return completed
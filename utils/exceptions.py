@@ -16,6 +16,30 @@ class APIError(CodeProcessorError):
     pass
 
 
+class FileReadError(CodeProcessorError):
+    """Raised when a source file cannot be read as text."""
+
+    pass
+
+
+class BinaryFileError(FileReadError):
+    """Raised when a source file looks binary."""
+
+    pass
+
+
+class FileTooLargeError(FileReadError):
+    """Raised when a source file exceeds the configured size limit."""
+
+    pass
+
+
+class CircuitOpenError(CodeProcessorError):
+    """Raised when a dependency's circuit breaker has given up on it."""
+
+    pass
+
+
 class BigQueryError(Exception):
     """Base class for exceptions in the BigQuery repository."""
 
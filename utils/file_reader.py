@@ -0,0 +1,105 @@
+import codecs
+import mmap
+import os
+from utils.exceptions import BinaryFileError, FileReadError, FileTooLargeError
+
+# Bytes inspected when deciding whether a file is binary, as git does.
+SNIFF_BYTES = 8000
+
+# Files at least this large are decoded straight from a memory map instead of
+# being read into an intermediate bytes object first.
+MMAP_THRESHOLD_BYTES = 256 * 1024
+
+# Byte order marks, longest first so UTF-32 LE is not mistaken for UTF-16 LE.
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+# Tried in order for files without a BOM. latin-1 maps every byte, so it
+# always succeeds.
+FALLBACK_ENCODINGS = ["utf-8", "cp1252", "latin-1"]
+
+
+def _bom_encoding(head):
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    return None
+
+
+def _check_head(file_path, head):
+    if _bom_encoding(head) is None and b"\0" in head:
+        raise BinaryFileError(f"{file_path} appears to be a binary file.")
+
+
+def check_source_file(file_path, max_bytes):
+    """
+    Rejects files that are too large or binary, reading at most the first
+    `SNIFF_BYTES` bytes, so they can be skipped before any git or API work.
+
+    I/O errors are left for `read_source_file` to report.
+
+    Raises:
+        FileTooLargeError: If the file is larger than `max_bytes`.
+        BinaryFileError: If the start of the file contains a NUL byte.
+    """
+    try:
+        size = os.stat(file_path).st_size
+        if max_bytes and size > max_bytes:
+            raise FileTooLargeError(
+                f"{file_path} is {size} bytes, over the {max_bytes} byte limit."
+            )
+        with open(file_path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+    except OSError:
+        return
+    _check_head(file_path, head)
+
+
+def read_source_file(file_path, max_bytes=None):
+    """
+    Reads a source file as text.
+
+    The size limit and binary check are applied before the contents are
+    read. The encoding is taken from a byte order mark if there is one,
+    otherwise the first of `FALLBACK_ENCODINGS` that decodes the file is used.
+    Line endings are normalized to `\\n`, as text-mode `open` does.
+
+    Raises:
+        FileTooLargeError: If the file is larger than `max_bytes`.
+        BinaryFileError: If the start of the file contains a NUL byte.
+        FileReadError: If the file cannot be opened or read.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if max_bytes and size > max_bytes:
+                raise FileTooLargeError(
+                    f"{file_path} is {size} bytes, over the {max_bytes} byte limit."
+                )
+            if size >= MMAP_THRESHOLD_BYTES:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    _check_head(file_path, mapped[:SNIFF_BYTES])
+                    text = _decode(memoryview(mapped), mapped[:4])
+            else:
+                data = f.read()
+                _check_head(file_path, data[:SNIFF_BYTES])
+                text = _decode(data, data[:4])
+    except OSError as e:
+        raise FileReadError(f"Error reading file {file_path}: {e}")
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _decode(buffer, head):
+    encoding = _bom_encoding(head)
+    if encoding:
+        return str(buffer, encoding)
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            return str(buffer, encoding)
+        except UnicodeDecodeError:
+            continue
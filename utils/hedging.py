@@ -0,0 +1,137 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from utils.logger import logger
+
+
+class Hedger:
+    """
+    Sends a duplicate ("hedge") of a slow call and keeps whichever finishes
+    first.
+
+    The latencies of successful calls are kept in a rolling window. Once
+    `min_samples` have been seen, a call still running after the window's
+    `percentile` latency gets a second attempt. The first attempt to succeed
+    wins; if one fails, the other is still waited for. At most `budget` (a
+    fraction of all calls) are hedged, so the extra load stays small even
+    when the service slows down across the board. If `admit_hedge` is given,
+    it is called with the call's arguments before a hedge is sent, and the
+    hedge is skipped when it returns False (e.g. no quota left for it).
+
+    Both attempts run on a shared thread pool while the caller waits. A
+    blocking HTTP call cannot be interrupted, so the losing attempt is
+    abandoned rather than cancelled: its result is discarded when it
+    finishes. With `percentile` at 0, `call` runs the function directly.
+    """
+
+    def __init__(
+        self,
+        percentile=0,
+        budget=0.05,
+        min_samples=50,
+        window=1000,
+        max_workers=20,
+        admit_hedge=None,
+    ):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.admit_hedge = admit_hedge
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = (
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+            if percentile
+            else None
+        )
+
+    def threshold(self):
+        """The latency after which a call is hedged, or None until enough samples."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(
+            len(ordered) - 1, math.ceil(self.percentile / 100 * len(ordered)) - 1
+        )
+        return ordered[max(index, 0)]
+
+    def _take_hedge(self, args, kwargs):
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.calls:
+                return False
+            self.hedges += 1
+        if self.admit_hedge is None or self.admit_hedge(*args, **kwargs):
+            return True
+        with self._lock:
+            self.hedges -= 1
+        return False
+
+    def _timed(self, fn, args, kwargs):
+        start = time.monotonic()
+        result = fn(*args, **kwargs)
+        with self._lock:
+            self._latencies.append(time.monotonic() - start)
+        return result
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Calls `fn(*args, **kwargs)`, hedging it if it runs long.
+
+        Raises:
+            Exception: What `fn` raised, if every attempt failed.
+        """
+        if self._executor is None:
+            return fn(*args, **kwargs)
+        with self._lock:
+            self.calls += 1
+        threshold = self.threshold()
+        primary = self._executor.submit(self._timed, fn, args, kwargs)
+        if threshold is None:
+            return primary.result()
+
+        done, _ = wait([primary], timeout=threshold)
+        if done or not self._take_hedge(args, kwargs):
+            return primary.result()
+
+        hedge = self._executor.submit(self._timed, fn, args, kwargs)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    # The other attempt, if still running, is abandoned.
+                    return future.result()
+        return primary.result()
+
+    def stats(self):
+        """Returns call, hedge and hedge-win counts."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+            }
+
+    def close(self, wait=False):
+        """
+        Logs the hedge counts and stops the thread pool. By default abandoned
+        attempts are not waited for.
+        """
+        if self._executor is None:
+            return
+        stats = self.stats()
+        if stats["hedges"]:
+            logger.info(
+                f"Hedged {stats['hedges']} of {stats['calls']} calls; "
+                f"the hedge finished first {stats['hedge_wins']} times."
+            )
+        self._executor.shutdown(wait=wait, cancel_futures=True)
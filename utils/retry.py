@@ -0,0 +1,192 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from utils.exceptions import (
+    APIError,
+    BigQueryError,
+    CircuitOpenError,
+    FileReadError,
+    GitProcessorError,
+    GitRepositoryError,
+)
+
+# Reason codes recorded in the error log. Transient reasons are retried in-run.
+API_TIMEOUT = "api_timeout"
+API_CONNECTION = "api_connection"
+API_RATE_LIMITED = "api_rate_limited"
+API_SERVER_ERROR = "api_server_error"
+API_CLIENT_ERROR = "api_client_error"
+API_INVALID_RESPONSE = "api_invalid_response"
+BIGQUERY_QUOTA = "bigquery_quota"
+BIGQUERY_UNAVAILABLE = "bigquery_unavailable"
+BIGQUERY_ERROR = "bigquery_error"
+GIT_ERROR = "git_error"
+FILE_READ_ERROR = "file_read_error"
+CIRCUIT_OPEN = "circuit_open"
+UNEXPECTED = "unexpected"
+
+TRANSIENT_REASONS = {
+    API_TIMEOUT,
+    API_CONNECTION,
+    API_RATE_LIMITED,
+    API_SERVER_ERROR,
+    BIGQUERY_QUOTA,
+    BIGQUERY_UNAVAILABLE,
+}
+
+
+def _exception_chain(exc):
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+
+def _classify_http_status(status):
+    if status == 429:
+        return API_RATE_LIMITED
+    if status >= 500:
+        return API_SERVER_ERROR
+    return API_CLIENT_ERROR
+
+
+def _classify_google_error(exc):
+    # google.api_core exceptions carry the HTTP status as `code`.
+    code = getattr(exc, "code", None)
+    if not isinstance(code, int):
+        return None
+    message = str(exc).lower()
+    if code == 429 or (code == 403 and ("quota" in message or "rate" in message)):
+        return BIGQUERY_QUOTA
+    if code >= 500:
+        return BIGQUERY_UNAVAILABLE
+    return BIGQUERY_ERROR
+
+
+def classify_failure(exc):
+    """
+    Maps an exception raised while processing a file to a reason code.
+
+    The wrapped cause (`__cause__`/`__context__`) is inspected, so an
+    `APIError` raised from a `requests` timeout is reported as `api_timeout`,
+    as is the bare `requests` timeout.
+
+    Returns:
+        tuple: (reason code, True if the failure is transient).
+    """
+    import requests
+
+    chain = list(_exception_chain(exc))
+    reason = UNEXPECTED
+    if isinstance(exc, CircuitOpenError):
+        reason = CIRCUIT_OPEN
+    elif any(
+        isinstance(e, (APIError, requests.exceptions.RequestException)) for e in chain
+    ):
+        reason = API_INVALID_RESPONSE
+        for e in chain:
+            if isinstance(e, requests.exceptions.JSONDecodeError):
+                reason = API_INVALID_RESPONSE
+            elif isinstance(e, requests.exceptions.Timeout):
+                reason = API_TIMEOUT
+            elif isinstance(e, requests.exceptions.ConnectionError):
+                reason = API_CONNECTION
+            elif isinstance(e, requests.exceptions.RetryError):
+                # urllib3 already retried a 429/5xx status and gave up.
+                reason = API_SERVER_ERROR
+            elif (
+                isinstance(e, requests.exceptions.HTTPError) and e.response is not None
+            ):
+                reason = _classify_http_status(e.response.status_code)
+            else:
+                continue
+            break
+    elif any(isinstance(e, BigQueryError) for e in chain):
+        reason = BIGQUERY_ERROR
+        for e in chain:
+            google_reason = _classify_google_error(e)
+            if google_reason:
+                reason = google_reason
+                break
+    elif any(isinstance(e, (GitProcessorError, GitRepositoryError)) for e in chain):
+        reason = GIT_ERROR
+    elif any(isinstance(e, FileReadError) for e in chain):
+        reason = FILE_READ_ERROR
+    return reason, reason in TRANSIENT_REASONS
+
+
+def is_transient(exc):
+    """True if `exc` is a transient failure of the API or BigQuery."""
+    return classify_failure(exc)[1]
+
+
+class RetryQueue:
+    """
+    A delayed queue of items to retry later in the same run.
+
+    Each item may be retried up to `max_attempts` times, and at most `budget`
+    retries are granted in total, so a systemic failure cannot turn into an
+    unbounded retry storm. Delays use exponential backoff with full jitter,
+    spreading retries out rather than sending them back in a burst.
+    Thread-safe; `schedule` is called from worker threads and `pop_ready` by
+    the submitting thread.
+    """
+
+    def __init__(self, max_attempts=3, budget=500, base_delay=5.0, max_delay=120.0):
+        self.max_attempts = max_attempts
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries_granted = 0
+        self._attempts = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def schedule(self, item, reason):
+        """
+        Queues `item` for a later retry.
+
+        Returns:
+            float: The delay in seconds, or None if the item's attempts or the
+            run's retry budget are used up.
+        """
+        with self._lock:
+            attempts = self._attempts.get(item, 0)
+            if attempts >= self.max_attempts or self.retries_granted >= self.budget:
+                return None
+            self._attempts[item] = attempts + 1
+            self.retries_granted += 1
+            delay = random.uniform(
+                0, min(self.max_delay, self.base_delay * 2**attempts)
+            )
+            heapq.heappush(
+                self._heap, (time.monotonic() + delay, next(self._counter), item)
+            )
+            return delay
+
+    def attempts(self, item):
+        """The number of retries already granted to `item`."""
+        with self._lock:
+            return self._attempts.get(item, 0)
+
+    def pop_ready(self):
+        """Returns an item whose delay has elapsed, or None."""
+        with self._lock:
+            if self._heap and self._heap[0][0] <= time.monotonic():
+                return heapq.heappop(self._heap)[2]
+            return None
+
+    def next_ready_in(self):
+        """Seconds until the next item is due (0 if overdue), or None if empty."""
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
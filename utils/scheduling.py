@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from utils.logger import logger
+
+# A file's code is held in memory roughly three times while it is in flight:
+# as read, inside the JSON request body, and in the BigQuery row. The API
+# response is of the same order, so file size is a fair proxy for the memory a
+# file holds.
+IN_MEMORY_COPIES = 3
+
+
+def file_cost(file_path):
+    """The estimated bytes a file holds in memory while it is processed."""
+    try:
+        return os.path.getsize(file_path) * IN_MEMORY_COPIES
+    except OSError:
+        return 0
+
+
+class LatencyHistory:
+    """
+    The analysis API's observed latency per language, as a moving average of
+    seconds per byte of code sent.
+
+    Used to estimate how long a file will take before it is processed, so the
+    longest files can be started first. It is persisted as JSON between runs,
+    since the estimates are needed before the current run has made any calls.
+    Thread-safe.
+    """
+
+    # Weight of each new observation in the moving averages.
+    ALPHA = 0.05
+
+    def __init__(self, path=None, rates=None):
+        self.path = path
+        self._rates = dict(rates or {})
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Loads the history at `path`, or starts an empty one."""
+        try:
+            with open(path, "r") as f:
+                rates = {
+                    language or None: float(rate)
+                    for language, rate in json.load(f).items()
+                }
+        except (OSError, ValueError, TypeError, AttributeError):
+            rates = {}
+        return cls(path, rates)
+
+    def record(self, language, seconds, size):
+        """Adds one call that sent `size` bytes of `language` in `seconds`."""
+        if size <= 0 or seconds < 0:
+            return
+        rate = seconds / size
+        with self._lock:
+            for key in (language, None):
+                previous = self._rates.get(key)
+                self._rates[key] = (
+                    rate
+                    if previous is None
+                    else previous + self.ALPHA * (rate - previous)
+                )
+
+    def seconds_per_byte(self, language):
+        """
+        The average for `language`, else across all languages, else None
+        when nothing has been recorded.
+        """
+        with self._lock:
+            return self._rates.get(language, self._rates.get(None))
+
+    def estimate(self, language, size):
+        """
+        The expected seconds for `size` bytes of `language`. Without any
+        history this is just `size`, which orders files the same way.
+        """
+        rate = self.seconds_per_byte(language)
+        return size * rate if rate is not None else float(size)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            # JSON keys are strings; the all-languages average is stored as "".
+            rates = {key or "": rate for key, rate in self._rates.items()}
+        if not rates:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w") as f:
+                json.dump(rates, f, indent=2, sort_keys=True)
+        except OSError as e:
+            logger.warning(f"Could not persist API latency history {self.path}: {e}")
+
+
+def longest_first(items, estimate):
+    """
+    Returns `items` sorted by `estimate(item)`, largest first. Ties keep their
+    original order.
+
+    Starting the longest jobs first keeps one large file from starting last
+    and running alone at the end of a run, which shortens the makespan.
+    """
+    return sorted(items, key=estimate, reverse=True)
+
+
+def bounded_as_completed(
+    executor, fn, items, max_in_flight, max_bytes=None, cost=None, retries=None
+):
+    """
+    Submits `fn(item)` to `executor` for each item, keeping at most
+    `max_in_flight` items and `max_bytes` of estimated cost in flight, and
+    yields the futures as they complete.
+
+    Unlike submitting everything up front, only the window's worth of futures
+    and their arguments exist at any time, so memory stays flat regardless of
+    how many items there are. New items are admitted only as earlier ones
+    finish. An item whose cost alone exceeds `max_bytes` is run by itself.
+
+    Args:
+        executor: A `concurrent.futures.Executor`.
+        fn: Called with each item.
+        items: Any iterable; it is consumed lazily.
+        max_in_flight (int): The most items submitted but not yet yielded.
+        max_bytes (int): Optional budget for the sum of `cost(item)`.
+        cost: Returns an item's cost in bytes. Required with `max_bytes`.
+        retries: Optional `utils.retry.RetryQueue`. Items that become due in
+            it are admitted ahead of new items, and the generator keeps
+            running until it is empty.
+    """
+    items = iter(items)
+    pending = {}
+    in_flight_bytes = 0
+    exhausted = False
+
+    def drain(timeout=None):
+        nonlocal in_flight_bytes
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            in_flight_bytes -= pending.pop(future)
+        return done
+
+    while True:
+        item = retries.pop_ready() if retries is not None else None
+        if item is None and not exhausted:
+            item = next(items, _EXHAUSTED)
+            if item is _EXHAUSTED:
+                exhausted = True
+                item = None
+
+        if item is None:
+            retry_in = retries.next_ready_in() if retries is not None else None
+            if pending:
+                # Wake up for whichever comes first: a completion or a retry
+                # falling due.
+                yield from drain(timeout=retry_in)
+            elif retry_in is not None:
+                time.sleep(retry_in)
+            else:
+                return
+            continue
+
+        item_cost = cost(item) if max_bytes else 0
+        while pending and (
+            len(pending) >= max_in_flight
+            or (max_bytes and in_flight_bytes + item_cost > max_bytes)
+        ):
+            yield from drain()
+        pending[executor.submit(fn, item)] = item_cost
+        in_flight_bytes += item_cost
+
+
+_EXHAUSTED = object()
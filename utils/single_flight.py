@@ -0,0 +1,62 @@
+import copy
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive with the same key while it is running wait for it and receive a
+    deep copy of its result, or its exception. Nothing is kept once the call
+    finishes, so a later call with the same key runs again. Thread-safe.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.collapsed = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Returns `fn(*args, **kwargs)`, sharing one call among concurrent
+        callers with the same `key`.
+
+        Raises:
+            Exception: What `fn` raised, in the leader and every follower.
+        """
+        with self._lock:
+            self.calls += 1
+            entry = self._in_flight.get(key)
+            if entry is None:
+                entry = self._in_flight[key] = [Future(), 0]
+                leader = True
+            else:
+                entry[1] += 1
+                self.collapsed += 1
+                leader = False
+        future = entry[0]
+
+        if not leader:
+            # Each follower gets its own copy, so nothing one caller changes
+            # leaks into another's result.
+            return copy.deepcopy(future.result())
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        followers = self._finish(key)
+        # Followers copy from a snapshot taken before the leader can change
+        # the result.
+        future.set_result(copy.deepcopy(result) if followers else result)
+        return result
+
+    def _finish(self, key):
+        # Callers arriving from here on start a new call.
+        with self._lock:
+            return self._in_flight.pop(key)[1]
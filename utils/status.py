@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class RunStatus:
+    """
+    Queue depth and throughput of a long-running (watch mode) process,
+    updated by the run loop and worker threads and read by `StatusServer`.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.state = "starting"
+        self.cycles = 0
+        self.queued = 0
+        self.completed = 0
+        self.statuses = Counter()
+        self.last_cycle = None
+        self._cycle_started = None
+        self._cycle_files = 0
+        self._lock = threading.Lock()
+
+    def start_cycle(self, files):
+        with self._lock:
+            self.state = "running"
+            self.queued = files
+            self._cycle_files = files
+            self._cycle_started = time.time()
+
+    def file_done(self, status):
+        with self._lock:
+            self.queued = max(self.queued - 1, 0)
+            self.completed += 1
+            self.statuses[status] += 1
+
+    def end_cycle(self):
+        with self._lock:
+            seconds = time.time() - self._cycle_started
+            self.cycles += 1
+            self.state = "idle"
+            self.queued = 0
+            self.last_cycle = {
+                "started_at": self._cycle_started,
+                "seconds": round(seconds, 1),
+                "files": self._cycle_files,
+                "files_per_minute": round(self._cycle_files / seconds * 60, 1)
+                if seconds
+                else None,
+            }
+
+    def idle_cycle(self):
+        with self._lock:
+            self.cycles += 1
+            self.state = "idle"
+
+    def snapshot(self):
+        """Returns the status as a JSON-serializable dict."""
+        with self._lock:
+            uptime = time.time() - self.started_at
+            snapshot = {
+                "state": self.state,
+                "uptime_seconds": round(uptime),
+                "cycles": self.cycles,
+                "queue_depth": self.queued,
+                "files_completed": self.completed,
+                "files_by_status": dict(self.statuses),
+                "files_per_minute": round(self.completed / uptime * 60, 1)
+                if uptime
+                else 0.0,
+                "last_cycle": self.last_cycle,
+            }
+            if self.state == "running":
+                elapsed = time.time() - self._cycle_started
+                done = self._cycle_files - self.queued
+                snapshot["current_cycle"] = {
+                    "seconds": round(elapsed, 1),
+                    "files_done": done,
+                    "files_per_minute": round(done / elapsed * 60, 1)
+                    if elapsed
+                    else 0.0,
+                }
+            return snapshot
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path not in ("/", "/status"):
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.snapshot()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StatusServer:
+    """
+    Serves `snapshot()` as JSON at http://127.0.0.1:<port>/status from a
+    background thread. Binds to localhost only; port 0 picks a free port.
+    """
+
+    def __init__(self, port, snapshot):
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _StatusHandler)
+        self._server.daemon_threads = True
+        self._server.snapshot = snapshot
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="status-server", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/status"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,359 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from utils.logger import logger
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class WorkItem:
+    """A leased unit of work: one file path and its optional payload."""
+
+    def __init__(self, item_id, file_path, payload=None, attempts=0):
+        self.id = item_id
+        self.file_path = file_path
+        self.payload = payload or {}
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"WorkItem({self.id}, {self.file_path!r}, attempts={self.attempts})"
+
+
+class WorkQueue:
+    """
+    The interface shared by work queue backends.
+
+    A coordinator `enqueue`s the discovered files once. Workers, in any number
+    of processes, `lease` items for a fixed time, `heartbeat` to extend the
+    leases they still hold, and `complete` or `fail` each item. An item whose
+    lease expires (because its worker died or stalled) becomes leasable again,
+    until it has been attempted `max_attempts` times. `complete`, `fail` and
+    `heartbeat` only apply to leases the caller still holds, so a worker that
+    lost its lease cannot overwrite the result of the worker that took over.
+    """
+
+    def enqueue(self, file_paths, payloads=None):
+        raise NotImplementedError
+
+    def lease(self, worker_id, lease_seconds, limit=1):
+        raise NotImplementedError
+
+    def heartbeat(self, worker_id, item_ids, lease_seconds):
+        raise NotImplementedError
+
+    def complete(self, worker_id, item_id):
+        raise NotImplementedError
+
+    def fail(self, worker_id, item_id, error):
+        raise NotImplementedError
+
+    def counts(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def is_drained(self):
+        """True once no item is pending or leased."""
+        counts = self.counts()
+        return not counts.get(PENDING) and not counts.get(LEASED)
+
+
+class SqliteWorkQueue(WorkQueue):
+    """
+    A durable work queue in a local SQLite file.
+
+    Every state change is a single short transaction, and `lease` takes the
+    write lock up front (`BEGIN IMMEDIATE`), so any number of processes on
+    the same host can share one file. SQLite locking is not reliable over
+    network file systems; workers on other hosts need a server-backed
+    implementation of `WorkQueue` registered in `QUEUE_BACKENDS`.
+    """
+
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS work_items (
+                    id INTEGER PRIMARY KEY,
+                    file_path TEXT NOT NULL UNIQUE,
+                    payload TEXT,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    worker_id TEXT,
+                    lease_expires_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    updated_at REAL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS work_items_state ON work_items (state, id)"
+            )
+
+    def _connection(self):
+        # sqlite3 connections must not be shared across threads, so each
+        # thread gets its own. Autocommit mode; transactions are explicit.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=60000")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, file_paths, payloads=None):
+        """
+        Adds files to the queue. Files already queued (in any state) are left
+        untouched, so re-running the coordinator resumes rather than restarts.
+
+        Returns:
+            int: The number of newly queued files.
+        """
+        payloads = payloads or {}
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO work_items (file_path, payload, updated_at)
+                VALUES (?, ?, ?)
+                """,
+                [
+                    (
+                        file_path,
+                        json.dumps(payloads[file_path])
+                        if payloads.get(file_path)
+                        else None,
+                        now,
+                    )
+                    for file_path in file_paths
+                ],
+            )
+            added = conn.total_changes - before
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def lease(self, worker_id, lease_seconds, limit=1):
+        """
+        Leases up to `limit` pending or expired items to `worker_id`.
+
+        Returns:
+            list[WorkItem]: The leased items, oldest first.
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases that have used up their attempts are given up on
+            # rather than handed out again.
+            conn.execute(
+                """
+                UPDATE work_items
+                SET state = 'failed', worker_id = NULL, updated_at = ?,
+                    last_error = COALESCE(last_error, 'lease expired')
+                WHERE state = 'leased' AND lease_expires_at < ? AND attempts >= ?
+                """,
+                (now, now, self.max_attempts),
+            )
+            rows = conn.execute(
+                """
+                SELECT id, file_path, payload, attempts FROM work_items
+                WHERE state = 'pending'
+                    OR (state = 'leased' AND lease_expires_at < ?)
+                ORDER BY id
+                LIMIT ?
+                """,
+                (now, limit),
+            ).fetchall()
+            conn.executemany(
+                """
+                UPDATE work_items
+                SET state = 'leased', worker_id = ?, lease_expires_at = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE id = ?
+                """,
+                [(worker_id, now + lease_seconds, now, row[0]) for row in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [
+            WorkItem(
+                item_id,
+                file_path,
+                json.loads(payload) if payload else None,
+                attempts + 1,
+            )
+            for item_id, file_path, payload, attempts in rows
+        ]
+
+    def heartbeat(self, worker_id, item_ids, lease_seconds):
+        """
+        Extends the leases `worker_id` still holds on `item_ids`.
+
+        Returns:
+            set: The ids whose lease was extended. Any others were lost.
+        """
+        if not item_ids:
+            return set()
+        now = time.time()
+        conn = self._connection()
+        extended = set()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for item_id in item_ids:
+                cursor = conn.execute(
+                    """
+                    UPDATE work_items SET lease_expires_at = ?, updated_at = ?
+                    WHERE id = ? AND worker_id = ? AND state = 'leased'
+                    """,
+                    (now + lease_seconds, now, item_id, worker_id),
+                )
+                if cursor.rowcount:
+                    extended.add(item_id)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return extended
+
+    def _finish(self, worker_id, item_id, state, error=None):
+        cursor = self._connection().execute(
+            """
+            UPDATE work_items
+            SET state = ?, worker_id = NULL, lease_expires_at = NULL,
+                last_error = ?, updated_at = ?
+            WHERE id = ? AND worker_id = ? AND state = 'leased'
+            """,
+            (state, error, time.time(), item_id, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def complete(self, worker_id, item_id):
+        """Marks an item done. Returns False if the lease had been lost."""
+        return self._finish(worker_id, item_id, DONE)
+
+    def fail(self, worker_id, item_id, error):
+        """
+        Records a failed attempt. The item is queued again until it has been
+        attempted `max_attempts` times, then marked failed. Returns False if
+        the lease had been lost.
+        """
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT attempts FROM work_items WHERE id = ?", (item_id,)
+        ).fetchone()
+        state = FAILED if row and row[0] >= self.max_attempts else PENDING
+        return self._finish(worker_id, item_id, state, str(error))
+
+    def counts(self):
+        """Returns a mapping of state to number of items."""
+        rows = (
+            self._connection()
+            .execute("SELECT state, COUNT(*) FROM work_items GROUP BY state")
+            .fetchall()
+        )
+        return dict(rows)
+
+    def failed_items(self):
+        """Returns (file_path, last_error) for every item given up on."""
+        return (
+            self._connection()
+            .execute(
+                "SELECT file_path, last_error FROM work_items WHERE state = 'failed'"
+            )
+            .fetchall()
+        )
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# URL scheme -> WorkQueue implementation, constructed with the rest of the URL.
+QUEUE_BACKENDS = {"sqlite": SqliteWorkQueue}
+
+
+def open_queue(url, max_attempts=3):
+    """
+    Opens the work queue at `url`: a path to a SQLite file, `sqlite://<path>`,
+    or `<scheme>://<location>` for any backend registered in `QUEUE_BACKENDS`.
+    """
+    scheme, separator, location = url.partition("://")
+    if not separator:
+        return SqliteWorkQueue(url, max_attempts=max_attempts)
+    backend = QUEUE_BACKENDS.get(scheme)
+    if backend is None:
+        raise ValueError(f"Unknown work queue backend '{scheme}' in {url}")
+    return backend(location, max_attempts=max_attempts)
+
+
+class LeaseHeartbeat:
+    """
+    Keeps the leases of in-progress items alive from a background thread.
+
+    Workers `track` an item when they start it and `untrack` it when they
+    finish. Every `lease_seconds / 3` the tracked leases are extended, so an
+    item is only re-leased to another worker if this process stops
+    heartbeating for a full lease period.
+    """
+
+    def __init__(self, queue, worker_id, lease_seconds):
+        self.queue = queue
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self._items = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="lease-heartbeat", daemon=True
+        )
+        self._thread.start()
+
+    def track(self, item_id):
+        with self._lock:
+            self._items.add(item_id)
+
+    def untrack(self, item_id):
+        with self._lock:
+            self._items.discard(item_id)
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._lock:
+                item_ids = set(self._items)
+            try:
+                lost = item_ids - self.queue.heartbeat(
+                    self.worker_id, item_ids, self.lease_seconds
+                )
+            except Exception as e:
+                logger.warning(f"Work queue heartbeat failed: {e}")
+                continue
+            for item_id in lost:
+                logger.warning(
+                    f"Lost the lease on work item {item_id}; another worker may retry it."
+                )
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()